@@ -0,0 +1,343 @@
+import bz2
+import gzip
+import json
+import lzma
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, TextIO
+
+import click
+
+# Roughly the ids Twitter gave out in 2021
+_FIRST_TWEET_ID = 1_350_000_000_000_000_000
+_FIRST_USER_ID = 1_000_000_000
+_FIRST_TIME = datetime(2021, 1, 1, tzinfo=timezone.utc)
+
+_WORDS = (
+    "the of and to in is for on that with this data social media research digital "
+    "observatory twitter tweet science australia open analysis community news people "
+    "new today week study method network climate health policy election sport music"
+).split()
+_REFERENCE_TYPES = ["retweeted", "quoted", "replied_to"]
+_SOURCES = ["Twitter Web App", "Twitter for iPhone", "Twitter for Android", "TweetDeck"]
+_LANGS = ["en", "en", "en", "es", "fr", "de", "ja", "und"]
+
+
+def _timestamp(time: datetime) -> str:
+    # As formatted by the Twitter API
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class PageGenerator:
+    """
+    Generates synthetic pages of twarc2 search results, shaped like real pages (see
+    tests/data/ObservatoryTeam.jsonl) but with made up contents.
+
+    Pages are generated one at a time, so any number of tweets can be generated in
+    bounded memory. The same seed always generates the same pages.
+    """
+
+    def __init__(
+        self,
+        tweets_per_page: int = 100,
+        users: int = 10_000,
+        reference_fraction: float = 0.5,
+        media_fraction: float = 0.1,
+        hashtags_per_tweet: float = 1.0,
+        mentions_per_tweet: float = 1.0,
+        urls_per_tweet: float = 0.3,
+        hashtags: int = 1_000,
+        seed: int = 0,
+    ):
+        """
+        :param tweets_per_page: The number of tweets in the data of each page
+        :param users: The number of distinct users tweets are written by. Some users
+        write many more tweets than others, so users are repeated across pages.
+        :param reference_fraction: The fraction of tweets which retweet, quote or
+        reply to another tweet, which is then included in the page
+        :param media_fraction: The fraction of tweets with a photo or video
+        :param hashtags_per_tweet: The average number of hashtags in a tweet
+        :param mentions_per_tweet: The average number of mentions in a tweet
+        :param urls_per_tweet: The average number of links in a tweet
+        :param hashtags: The number of distinct hashtags
+        :param seed: Seed for the random choices
+        """
+        self.tweets_per_page = tweets_per_page
+        self.users = users
+        self.reference_fraction = reference_fraction
+        self.media_fraction = media_fraction
+        self.hashtags_per_tweet = hashtags_per_tweet
+        self.mentions_per_tweet = mentions_per_tweet
+        self.urls_per_tweet = urls_per_tweet
+        self.hashtags = [
+            f"{random.Random(i).choice(_WORDS)}{i}" for i in range(hashtags)
+        ]
+        self.random = random.Random(seed)
+        self._next_tweet = 0
+        self._next_media = 0
+
+    def _count(self, mean: float) -> int:
+        # Mostly 0 to 2 times the mean, so counts vary between tweets
+        return int(self.random.random() * 2 * mean + 0.5)
+
+    def _user_index(self) -> int:
+        # Log-uniform, so a few users write many of the tweets and most write few
+        return int(self.users ** self.random.random()) - 1
+
+    def _include_user(self, includes: Dict[str, Dict], index: int) -> Dict:
+        if index not in includes["users"]:
+            includes["users"][index] = self.user(index)
+        return includes["users"][index]
+
+    def user(self, index: int) -> Dict:
+        """
+        The profile of a user, which is the same every time it is included.
+        """
+        user_random = random.Random(index)
+        username = f"{user_random.choice(_WORDS)}_{index}"
+        user = {
+            "public_metrics": {
+                "followers_count": user_random.randrange(100_000),
+                "following_count": user_random.randrange(5_000),
+                "tweet_count": user_random.randrange(100_000),
+                "listed_count": user_random.randrange(100),
+            },
+            "created_at": _timestamp(
+                _FIRST_TIME - timedelta(days=user_random.randrange(5_000))
+            ),
+            "profile_image_url": f"https://pbs.twimg.com/profile_images/{index}.png",
+            "protected": False,
+            "name": username.replace("_", " ").title(),
+            "id": str(_FIRST_USER_ID + index),
+            "location": user_random.choice(["Brisbane", "Sydney", "", "Earth"]),
+            "url": "",
+            "description": " ".join(user_random.choices(_WORDS, k=12)),
+            "verified": user_random.random() < 0.01,
+            "username": username,
+        }
+        if user_random.random() < 0.3:
+            user["entities"] = {
+                "description": {
+                    "hashtags": [
+                        {
+                            "start": 0,
+                            "end": 10,
+                            "tag": user_random.choice(self.hashtags),
+                        }
+                    ]
+                }
+            }
+        return user
+
+    def _tweet(self, time: datetime, includes: Dict[str, Dict]) -> Dict:
+        tweet_id = str(_FIRST_TWEET_ID + self._next_tweet * 1_000_003)
+        self._next_tweet = self._next_tweet + 1
+        author = self._user_index()
+        self._include_user(includes, author)
+
+        words = self.random.choices(_WORDS, k=self.random.randrange(5, 30))
+        entities = {}
+        hashtags = [
+            self.random.choice(self.hashtags)
+            for _ in range(self._count(self.hashtags_per_tweet))
+        ]
+        if hashtags:
+            entities["hashtags"] = [
+                {"start": 0, "end": len(tag) + 1, "tag": tag} for tag in hashtags
+            ]
+            words.extend("#" + tag for tag in hashtags)
+        mentioned = [
+            self._user_index() for _ in range(self._count(self.mentions_per_tweet))
+        ]
+        if mentioned:
+            entities["mentions"] = []
+            for index in mentioned:
+                user = self._include_user(includes, index)
+                entities["mentions"].append(
+                    {
+                        "start": 0,
+                        "end": len(user["username"]) + 1,
+                        "username": user["username"],
+                        "id": user["id"],
+                    }
+                )
+                words.insert(0, "@" + user["username"])
+        urls = self._count(self.urls_per_tweet)
+        if urls:
+            entities["urls"] = []
+            for i in range(urls):
+                short = f"https://t.co/{tweet_id[-8:]}{i}"
+                entities["urls"].append(
+                    {
+                        "start": 0,
+                        "end": 23,
+                        "url": short,
+                        "expanded_url": f"https://example.com/{tweet_id}/{i}",
+                        "display_url": f"example.com/{tweet_id}/{i}",
+                    }
+                )
+                words.append(short)
+
+        tweet = {
+            "source": self.random.choice(_SOURCES),
+            "public_metrics": {
+                "retweet_count": self._count(5),
+                "reply_count": self._count(1),
+                "like_count": self._count(20),
+                "quote_count": self._count(0.5),
+            },
+            "possibly_sensitive": False,
+            "lang": self.random.choice(_LANGS),
+            "created_at": _timestamp(time),
+            "reply_settings": "everyone",
+            "id": tweet_id,
+            "author_id": str(_FIRST_USER_ID + author),
+            "text": " ".join(words),
+            "conversation_id": tweet_id,
+        }
+        if entities:
+            tweet["entities"] = entities
+
+        if self.random.random() < self.media_fraction:
+            media_key = f"3_{self._next_media}"
+            self._next_media = self._next_media + 1
+            tweet["attachments"] = {"media_keys": [media_key]}
+            media_type = self.random.choice(["photo", "photo", "video"])
+            media = {
+                "media_key": media_key,
+                "type": media_type,
+                "height": 1080,
+                "width": 1920,
+            }
+            if media_type == "photo":
+                media["url"] = f"https://pbs.twimg.com/media/{media_key}.jpg"
+            else:
+                media["preview_image_url"] = (
+                    f"https://pbs.twimg.com/media/{media_key}_preview.jpg"
+                )
+                media["duration_ms"] = self.random.randrange(1_000, 120_000)
+                media["public_metrics"] = {"view_count": self._count(1_000)}
+            includes["media"][media_key] = media
+
+        return tweet
+
+    def page(self, time: datetime) -> Dict:
+        """
+        Generates the next page of results, of tweets created up to `time`.
+        """
+        includes = {"users": {}, "tweets": {}, "media": {}}
+        data = []
+        for i in range(self.tweets_per_page):
+            tweet_time = time - timedelta(seconds=i)
+            tweet = self._tweet(tweet_time, includes)
+            if self.random.random() < self.reference_fraction:
+                referenced = self._tweet(tweet_time - timedelta(days=1), includes)
+                includes["tweets"][referenced["id"]] = referenced
+                reference_type = self.random.choice(_REFERENCE_TYPES)
+                tweet["referenced_tweets"] = [
+                    {"type": reference_type, "id": referenced["id"]}
+                ]
+                if reference_type == "replied_to":
+                    tweet["in_reply_to_user_id"] = referenced["author_id"]
+                    tweet["conversation_id"] = referenced["conversation_id"]
+                elif reference_type == "retweeted":
+                    tweet["text"] = "RT " + referenced["text"][:120]
+            data.append(tweet)
+
+        ids = [int(tweet["id"]) for tweet in data]
+        page = {
+            "data": data,
+            "includes": {
+                name: list(objects.values())
+                for name, objects in includes.items()
+                if objects
+            },
+            "meta": {
+                "newest_id": str(max(ids)),
+                "oldest_id": str(min(ids)),
+                "result_count": len(data),
+                "next_token": f"token{self._next_tweet}",
+            },
+            "__twarc": {
+                "url": "https://api.twitter.com/2/tweets/search/all?query=synthetic",
+                "version": "2.10.4",
+                "retrieved_at": time.isoformat(),
+            },
+        }
+        return page
+
+    def pages(self, tweets: int) -> Iterator[Dict]:
+        """
+        Generates pages until there are at least `tweets` tweets in their data.
+        """
+        time = _FIRST_TIME
+        for _ in range(0, tweets, self.tweets_per_page):
+            yield self.page(time)
+            time = time + timedelta(seconds=self.tweets_per_page)
+
+
+def open_output(filename: str) -> TextIO:
+    """
+    Opens a file to write json to, compressed if its name ends in .gz, .bz2 or .xz.
+    """
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "wt", encoding="utf-8")
+    elif filename.endswith(".bz2"):
+        return bz2.open(filename, "wt", encoding="utf-8")
+    elif filename.endswith(".xz"):
+        return lzma.open(filename, "wt", encoding="utf-8")
+    return open(filename, "w", encoding="utf-8")
+
+
+def write_pages(filename: str, tweets: int, generator: PageGenerator) -> List[int]:
+    """
+    Writes generated pages to a newline delimited json file, as twarc2 does.
+
+    :return: The number of pages and tweets (including referenced tweets) written
+    """
+    pages = 0
+    all_tweets = 0
+    with open_output(filename) as output:
+        for page in generator.pages(tweets):
+            output.write(json.dumps(page) + "\n")
+            pages = pages + 1
+            all_tweets = (
+                all_tweets + len(page["data"]) + len(page["includes"].get("tweets", []))
+            )
+    return [pages, all_tweets]
+
+
+@click.command()
+@click.argument("output_file", type=click.Path(dir_okay=False))
+@click.option(
+    "--tweets",
+    type=click.IntRange(min=1),
+    default=100_000,
+    help="Number of tweets to generate, not counting referenced tweets (defaults to "
+    "100,000).",
+)
+@click.option("--tweets_per_page", type=click.IntRange(min=1), default=100)
+@click.option(
+    "--users",
+    type=click.IntRange(min=1),
+    default=10_000,
+    help="Number of distinct users, who are repeated across pages.",
+)
+@click.option("--reference_fraction", type=click.FloatRange(0, 1), default=0.5)
+@click.option("--media_fraction", type=click.FloatRange(0, 1), default=0.1)
+@click.option("--hashtags_per_tweet", type=click.FloatRange(min=0), default=1.0)
+@click.option("--mentions_per_tweet", type=click.FloatRange(min=0), default=1.0)
+@click.option("--urls_per_tweet", type=click.FloatRange(min=0), default=0.3)
+@click.option("--seed", type=int, default=0)
+def generate(output_file, tweets, seed, **options):
+    """
+    Generates a twarc2 style json file of synthetic Twitter results, for
+    benchmarking. OUTPUT_FILE is compressed if its name ends in .gz, .bz2 or .xz.
+    """
+    generator = PageGenerator(seed=seed, **options)
+    pages, all_tweets = write_pages(output_file, tweets, generator)
+    click.echo(f"Wrote {pages} pages with {all_tweets} tweets to {output_file}")
+
+
+if __name__ == "__main__":
+    generate()
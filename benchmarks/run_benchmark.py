@@ -0,0 +1,212 @@
+import json
+import os
+import platform
+import shlex
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import click
+
+from tidy_tweet.reading import open_json_lines
+from tidy_tweet.tweet_mapping import columns_by_table
+from generate_pages import PageGenerator, write_pages
+
+try:
+    from tidy_tweet._version import version as tidy_tweet_version
+except ImportError:
+    tidy_tweet_version = "unspecified"
+
+
+# Tables of loading progress rather than of Twitter data
+_BOOKKEEPING_TABLES = ["load_checkpoint", "loaded_file"]
+
+# Run in a fresh process, so peak memory use is that of loading alone
+_LIBRARY_SCRIPT = """
+import sys
+from tidy_tweet import initialise_sqlite, load_twarc_json_to_sqlite
+
+initialise_sqlite(sys.argv[1])
+for json_file in sys.argv[2:]:
+    load_twarc_json_to_sqlite(json_file, sys.argv[1])
+"""
+
+
+def _run(command: List[str]) -> Dict:
+    """
+    Runs a command, timing it and measuring its peak resident memory. With worker
+    processes, this is the peak of the largest single process.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    # Prevents Popen trying to wait for the process again. Negative for a signal,
+    # as Popen reports it.
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    if process.returncode != 0:
+        raise click.ClickException(f"{shlex.join(command)} failed")
+
+    # ru_maxrss is in KiB on Linux but bytes on macOS
+    peak_rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return {"seconds": seconds, "peak_rss_bytes": peak_rss}
+
+
+def _database_size(db_name: Path) -> int:
+    return sum(
+        path.stat().st_size
+        for path in [db_name, Path(f"{db_name}-wal")]
+        if path.exists()
+    )
+
+
+def _count_rows(db_name: Path) -> Dict[str, int]:
+    with sqlite3.connect(db_name) as conn:
+        return {
+            table: conn.execute(f"select count(*) from {table}").fetchone()[0]
+            for table in columns_by_table
+            if table not in _BOOKKEEPING_TABLES
+        }
+
+
+def run_case(
+    name: str, json_files: List[str], cli_args: Optional[str], directory: Path
+) -> Dict:
+    """
+    Loads the json files into a new database, through the library if `cli_args` is
+    None or otherwise through the command line interface with those arguments, and
+    returns the measurements.
+    """
+    db_name = directory / f"{name}.db"
+    if cli_args is None:
+        command = [sys.executable, "-c", _LIBRARY_SCRIPT, str(db_name), *json_files]
+        description = "load_twarc_json_to_sqlite"
+    else:
+        command = [
+            sys.executable,
+            "-m",
+            "tidy_tweet",
+            *shlex.split(cli_args),
+            str(db_name),
+            *json_files,
+        ]
+        description = f"tidy_tweet {cli_args}".strip()
+
+    result = {"name": name, "command": description}
+    result.update(_run(command))
+    rows = _count_rows(db_name)
+    result["pages"] = rows["results_page"]
+    result["rows"] = sum(rows.values())
+    result["rows_by_table"] = rows
+    result["pages_per_second"] = result["pages"] / result["seconds"]
+    result["rows_per_second"] = result["rows"] / result["seconds"]
+    result["database_bytes"] = _database_size(db_name)
+    for path in directory.glob(f"{name}.db*"):
+        path.unlink()
+    return result
+
+
+def _describe_input(json_files: List[str]) -> Dict:
+    pages = 0
+    for json_file in json_files:
+        with open_json_lines(json_file) as lines:
+            pages = pages + sum(1 for _ in lines)
+    return {
+        "files": json_files,
+        "bytes": sum(os.path.getsize(json_file) for json_file in json_files),
+        "pages": pages,
+    }
+
+
+@click.command()
+@click.argument("json_files", type=click.Path(exists=True, dir_okay=False), nargs=-1)
+@click.option(
+    "--tweets",
+    type=click.IntRange(min=1),
+    default=100_000,
+    help="If no JSON_FILES are given, benchmark loading a file of this many "
+    "synthetic tweets (defaults to 100,000), see generate_pages.py.",
+)
+@click.option(
+    "--cli",
+    "cli_cases",
+    multiple=True,
+    metavar="OPTIONS",
+    help="Also benchmark the command line interface with these options, e.g. "
+    "--cli '--profile bulk --workers 4'. Can be given more than once. Use --cli '' "
+    "for the default options.",
+)
+@click.option(
+    "--library/--no_library",
+    default=True,
+    help="Benchmark load_twarc_json_to_sqlite (defaults to yes).",
+)
+@click.option(
+    "--repeat",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of times to run each benchmark.",
+)
+@click.option(
+    "--output",
+    type=click.File("w"),
+    default="-",
+    help="File to write the results to as json (defaults to standard output).",
+)
+def benchmark(json_files, tweets, cli_cases, library, repeat, output):
+    """
+    Benchmarks loading JSON_FILES (or a synthetic file) into a new tidy_tweet
+    database, reporting pages and rows loaded per second, peak memory use and
+    database size as json.
+
+    Each benchmark runs in a fresh process, through the same library function and
+    command line interface users run.
+    """
+    cases = []
+    if library:
+        cases.append(("library", None))
+    for i, cli_args in enumerate(cli_cases):
+        cases.append((f"cli_{i}", cli_args))
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        synthetic_tweets = None
+        if not json_files:
+            synthetic_tweets = tweets
+            json_file = directory / "synthetic.jsonl"
+            click.echo(f"Generating {tweets} synthetic tweets", err=True)
+            write_pages(str(json_file), tweets, PageGenerator())
+            json_files = [str(json_file)]
+
+        results = []
+        for name, cli_args in cases:
+            for run in range(repeat):
+                click.echo(f"Running {name} ({run + 1} of {repeat})", err=True)
+                result = run_case(name, list(json_files), cli_args, directory)
+                result["run"] = run + 1
+                results.append(result)
+
+        report = {
+            "tidy_tweet_version": tidy_tweet_version,
+            "python_version": platform.python_version(),
+            "sqlite_version": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "input": _describe_input(list(json_files)),
+            "synthetic_tweets": synthetic_tweets,
+            "results": results,
+        }
+
+    json.dump(report, output, indent=2)
+    output.write("\n")
+
+
+if __name__ == "__main__":
+    benchmark()
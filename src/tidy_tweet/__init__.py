@@ -1,8 +1,11 @@
 # flake8: noqa F401
-from tidy_tweet.processing import load_twarc_json_to_sqlite
+from tidy_tweet.processing import load_twarc_json_to_sqlite, Loader, iter_tidy_rows
+from tidy_tweet.async_loader import AsyncLoader
 from tidy_tweet.database import (
     initialise_sqlite,
     check_database_version,
+    build_indexes,
+    drop_indexes,
     SchemaVersionMismatchError,
     LibraryVersionMismatchWarning,
 )
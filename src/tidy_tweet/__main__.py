@@ -1,12 +1,24 @@
+import io
+import json
 import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
 from logging import basicConfig, getLogger
 import click
 from typing import Union, Collection
 from os import PathLike
 from pathlib import Path
 
-from tidy_tweet.processing import load_twarc_json_to_sqlite
+from tidy_tweet.metrics import LoadProgress, MetricsReporter
+from tidy_tweet.processing import Loader
+from tidy_tweet.reading import JSON_DECODERS, file_fingerprint
+from tidy_tweet.sinks import Sink
 import tidy_tweet.database as db
+import tidy_tweet.network as network
+import tidy_tweet.shards as shards
 
 
 basicConfig()
@@ -15,15 +27,159 @@ basicConfig()
 logger = getLogger(__name__)
 
 
-@click.command()
+def _open_sink(
+    database: Path, engine: str = "sqlite", profile: str = None, shard_by: str = None
+) -> Sink:
+    """
+    Opens a database with the chosen engine, see `tidy_tweet.sinks.Sink`. SQLite
+    databases are opened as sharded databases if they already are, or if `shard_by`
+    is given.
+    """
+    if engine == "duckdb":
+        try:
+            from tidy_tweet.duckdb_database import DuckDBSink
+        except ImportError as e:
+            raise click.UsageError(
+                "DuckDB databases need the duckdb package, which can be installed "
+                "with pip install tidy_tweet[duckdb]"
+            ) from e
+        return DuckDBSink(database)
+    if shard_by is not None or (database.exists() and shards.is_sharded(database)):
+        return shards.ShardedSQLiteSink(database, shard_by, profile)
+    return db.SQLiteSink(database, profile)
+
+
+def _check_existing_database(database: Path, engine: str = "sqlite"):
+    """
+    Checks an existing database can be used with this version of tidy_tweet,
+    converting any problems into click errors.
+    """
+    database_errors = (sqlite3.DatabaseError,)
+    if engine == "duckdb":
+        import duckdb
+
+        database_errors = (duckdb.Error,)
+
+    try:
+        with _open_sink(database, engine) as sink:
+            sink.check_version()
+    except db.SchemaVersionMismatchError as e:
+        raise click.UsageError(e.message()) from e
+    except database_errors as e:
+        raise click.BadParameter(
+            f"{database} is not a database file.", param_hint="database"
+        ) from e
+    except Exception as e:
+        raise e
+
+
+def _larger_than_database(
+    database: Path, json_files: Collection[Union[str, PathLike]], sharded: bool
+) -> bool:
+    """
+    Whether the files to be loaded are larger than the data already in a database,
+    in which case dropping its indexes and rebuilding them after loading is faster
+    than updating them row by row. Standard input isn't counted, as its size isn't
+    known.
+    """
+    paths = [database]
+    if sharded:
+        paths.extend(shards.shard_paths(database).values())
+    database_size = sum(
+        wal_or_db.stat().st_size
+        for path in paths
+        for wal_or_db in [Path(path), Path(f"{path}-wal")]
+        if wal_or_db.exists()
+    )
+    files_size = sum(Path(file).stat().st_size for file in json_files if file != "-")
+    return files_size > database_size
+
+
+class _DefaultCommandGroup(click.Group):
+    """
+    A command group which runs `default_command` when the first argument is not the
+    name of a command, so `tidy_tweet DATABASE JSON_FILES` keeps working alongside
+    subcommands such as `tidy_tweet index DATABASE`.
+    """
+
+    def __init__(self, *args, default_command: str, **kwargs):
+        self.default_command = default_command
+        super().__init__(*args, **kwargs)
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] != "--help":
+            args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=_DefaultCommandGroup, default_command="load")
+def cli():
+    """
+    Tidies Twitter json collected with Twarc into relational tables.
+
+    Run `tidy_tweet DATABASE JSON_FILES...` (short for `tidy_tweet load DATABASE
+    JSON_FILES...`) to load files into a database. See `tidy_tweet load --help` for
+    details.
+
+    Full documentation: https://github.com/QUT-Digital-Observatory/tidy_tweet
+    """
+
+
+@cli.command("load")
 @click.argument("database", type=click.Path(path_type=Path), required=True)
-@click.argument("json_files", type=click.Path(exists=True), nargs=-1)
+@click.argument("json_files", type=click.Path(exists=True, allow_dash=True), nargs=-1)
+@click.option(
+    "--engine",
+    type=click.Choice(["sqlite", "duckdb"]),
+    default="sqlite",
+    help="Database engine to store the tables in (defaults to sqlite). DuckDB "
+    "databases are much faster for analytical queries over large tables, and need "
+    "the duckdb package.",
+)
 @click.option(
     "--strict/--no_strict",
     default=True,
     help="Should the SQLite tables be created in strict mode (defaults to yes)? "
     "Irrelevant if adding files to an existing database.",
 )
+@click.option(
+    "--materialise/--no_materialise",
+    default=False,
+    help="Should the tweet and user views be created as tables which are updated as "
+    "each page is loaded (defaults to no)? This makes loading slower but queries on "
+    "large databases much faster. Irrelevant if adding files to an existing database.",
+)
+@click.option(
+    "--snapshots/--no_snapshots",
+    default=False,
+    help="Should tweets and users only be stored again when they have changed since "
+    "the last page they were seen on (defaults to no)? This makes databases much "
+    "smaller when the same users and tweets appear on many pages, but only the "
+    "first and last page each version was seen on are kept. Irrelevant if adding "
+    "files to an existing database.",
+)
+@click.option(
+    "--rollups/--no_rollups",
+    default=False,
+    help="Should tables of the number of tweets per day by author, language, hashtag "
+    "and mentioned user be created and updated as each page is loaded (defaults to "
+    "no)? Irrelevant if adding files to an existing database.",
+)
+@click.option(
+    "--full_text_search/--no_full_text_search",
+    default=False,
+    help="Should full text search indexes of tweet text and user descriptions be "
+    "created (defaults to no)? These are updated as each load is committed. "
+    "Irrelevant if adding files to an existing database, see tidy_tweet index "
+    "--full_text_search.",
+)
+@click.option(
+    "--stdin_label",
+    type=str,
+    default="stdin",
+    help="The file name to record for pages read from standard input, when - is "
+    "given as a JSON_FILE (defaults to stdin).",
+)
 @click.option(
     "--json_encoding",
     type=str,
@@ -32,14 +188,147 @@ logger = getLogger(__name__)
     "encoding. If you don't know what this means and you're not getting any "
     "decoding errors using tidy_tweet, you're all good!",
 )
+@click.option(
+    "--json_decoder",
+    type=click.Choice(["auto", *JSON_DECODERS]),
+    default="auto",
+    help="Library to decode json with. The default, auto, uses msgspec or orjson if "
+    "either is installed as they are much faster, otherwise Python's json module. "
+    "All give the same results.",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes to decode and map pages with (defaults to 1, "
+    "which processes everything in the main process). The database is always "
+    "written by a single process.",
+)
+@click.option(
+    "--profile",
+    type=click.Choice(sorted(db.SQLITE_PROFILES)),
+    default="safe",
+    help="SQLite settings to load with. 'safe' (the default) is durable, 'bulk' is "
+    "faster but the database may be corrupted if the computer crashes or loses power "
+    "during loading.",
+)
+@click.option(
+    "--commit_pages",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Commit to the database every this many pages, rather than once per file. "
+    "If loading is interrupted, committed pages can be kept with --resume.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Continue loading files that were partly loaded into DATABASE before being "
+    "interrupted, from the page after the last page committed.",
+)
+@click.option(
+    "--follow",
+    is_flag=True,
+    default=False,
+    help="Keep loading pages as they are written to a single JSON_FILE which is "
+    "still being written, such as the output of twarc2 stream, until stopped with "
+    "Ctrl-C. Loading continues from the last page committed, and pages are committed "
+    "whenever loading catches up with the file.",
+)
+@click.option(
+    "--poll_interval",
+    type=click.FloatRange(min=0, min_open=True),
+    default=1.0,
+    help="With --follow, seconds to wait between checks for new pages (defaults to "
+    "1).",
+)
+@click.option(
+    "--idle_timeout",
+    type=click.FloatRange(min=0),
+    default=None,
+    help="With --follow, stop once no new pages have been written for this many "
+    "seconds.",
+)
+@click.option(
+    "--shard_by",
+    type=click.Choice(list(shards.SHARD_KEYS)),
+    default=None,
+    help="Create DATABASE as a catalogue of SQLite databases, one for each month or "
+    "year of when pages were retrieved or when tweets were created. SQLite can "
+    "usually attach at most 10 of them at once, so queries and network exports of "
+    "more months or years than that need a range of dates. Irrelevant if adding "
+    "files to an existing database.",
+)
+@click.option(
+    "--index/--no_index",
+    default=True,
+    help="Build secondary indexes and update query statistics after loading "
+    "(defaults to yes). With the bulk profile, existing indexes are dropped before "
+    "loading and rebuilt afterwards if the files are larger than DATABASE.",
+)
+@click.option(
+    "--stats",
+    "stats_file",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    default=None,
+    help="Write a json report of the time spent reading, decoding, mapping and "
+    "writing, and the rows loaded into each table, per file and in total, to this "
+    "file (use - for standard output, in which case progress messages are written "
+    "to standard error).",
+)
+@click.option(
+    "--metrics_file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="While loading, regularly write progress metrics (pages loaded, rows per "
+    "table, the current file and estimated time remaining) to this file in the "
+    "Prometheus text format.",
+)
+@click.option(
+    "--metrics_port",
+    type=click.IntRange(min=1, max=65535),
+    default=None,
+    help="While loading, serve the same metrics as --metrics_file at "
+    "http://localhost:PORT/metrics.",
+)
+@click.option(
+    "--metrics_interval",
+    type=click.FloatRange(min=0, min_open=True),
+    default=15,
+    help="Seconds between writes of --metrics_file (defaults to 15).",
+)
 def tidy_twarc_jsons(
-    database: Path, json_files: Collection[Union[str, PathLike]], strict, json_encoding
+    database: Path,
+    json_files: Collection[Union[str, PathLike]],
+    engine,
+    strict,
+    materialise,
+    snapshots,
+    rollups,
+    full_text_search,
+    stdin_label,
+    json_encoding,
+    json_decoder,
+    workers,
+    profile,
+    commit_pages,
+    resume,
+    follow,
+    poll_interval,
+    idle_timeout,
+    shard_by,
+    index,
+    stats_file,
+    metrics_file,
+    metrics_port,
+    metrics_interval,
 ):
     """
     Tidies Twitter json collected with Twarc into relational tables.
 
     Can take one or more JSON_FILES (produced by Twarc) as input, tidies the
-    tweet data within those files, and stores the date in DATABASE.
+    tweet data within those files, and stores the date in DATABASE. Give - as a
+    JSON_FILE to read from standard input, for example from twarc2 directly.
 
     DATABASE is the filename for the tidy data database (should end in .db), for
     example: my_dataset.db . This will be created as an SQLite database file.
@@ -53,42 +342,405 @@ def tidy_twarc_jsons(
     Full documentation: https://github.com/QUT-Digital-Observatory/tidy_tweet
 
     """
+    if follow and (len(json_files) != 1 or json_files[0] == "-"):
+        raise click.UsageError("--follow needs exactly one JSON_FILE")
+    if list(json_files).count("-") > 1:
+        raise click.UsageError("Standard input can only be read once")
+    if materialise and snapshots:
+        raise click.UsageError("--materialise can't be used with --snapshots")
+
+    # Progress messages go to standard error if the stats report is written to
+    # standard output, so that the report can be parsed
+    echo = partial(click.echo, err=stats_file == "-")
+
     # Check database
+    new_database = not database.exists()
     if database.exists():
         # If database does exist, check the schema version
-        try:
-            db.check_database_version(database)
-        except db.SchemaVersionMismatchError as e:
-            raise click.UsageError(e.message()) from e
-        except sqlite3.DatabaseError as e:
-            raise click.BadParameter(
-                f"{database} is not a database file.", param_hint="database"
-            ) from e
-        except Exception as e:
-            raise e
-
-        click.echo("Using existing tidy tweet database: " + str(database))
+        _check_existing_database(database, engine)
+        echo("Using existing tidy tweet database: " + str(database))
+    elif engine == "duckdb":
+        if materialise:
+            raise click.UsageError(
+                "--materialise is not supported for DuckDB databases, which have no "
+                "triggers"
+            )
+        if snapshots:
+            raise click.UsageError(
+                "--snapshots is not supported for DuckDB databases, which have no "
+                "triggers"
+            )
+        if rollups:
+            raise click.UsageError(
+                "--rollups is not supported for DuckDB databases, which have no "
+                "triggers"
+            )
+        if full_text_search:
+            raise click.UsageError(
+                "--full_text_search is not supported for DuckDB databases"
+            )
+        echo("Creating new tidy tweet DuckDB database: " + str(database))
+        with _open_sink(database, engine) as sink:
+            sink.create_schema()
+    elif shard_by is not None:
+        if materialise:
+            raise click.UsageError(
+                "--materialise is not supported for sharded databases"
+            )
+        if snapshots:
+            raise click.UsageError("--snapshots is not supported for sharded databases")
+        if rollups:
+            raise click.UsageError("--rollups is not supported for sharded databases")
+        if full_text_search:
+            raise click.UsageError(
+                "--full_text_search is not supported for sharded databases"
+            )
+        echo(f"Creating new sharded tidy tweet database: {database}")
+        with _open_sink(database, engine, shard_by=shard_by) as sink:
+            sink.create_schema(strict_mode=strict)
     else:
         # If database doesn't exist, initialise it
-        click.echo("Creating new tidy tweet database: " + str(database))
-        db.initialise_sqlite(database, strict_mode=strict)
+        echo("Creating new tidy tweet database: " + str(database))
+        db.initialise_sqlite(
+            database,
+            strict_mode=strict,
+            materialised=materialise,
+            snapshots=snapshots,
+            rollups=rollups,
+            full_text_search=full_text_search,
+        )
+
+    # Indexes and profiles are SQLite settings
+    index = index and engine == "sqlite"
+    sharded = engine == "sqlite" and shards.is_sharded(database)
+    if (
+        index
+        and profile == "bulk"
+        and not follow
+        and not new_database
+        and _larger_than_database(database, json_files, sharded)
+    ):
+        # Rebuilt in one pass after loading rather than updated row by row. Small
+        # additions to a large database are faster to add to the existing indexes.
+        if sharded:
+            shards.drop_indexes(database)
+        else:
+            db.drop_indexes(database)
 
     # Load files into database
+    start = time.perf_counter()
     num_files = len(json_files)
     n = 0
     total_pages = 0
-    for file in json_files:
-        n = n + 1  # Count files for user messaging only
-        click.echo(f"Loading {file} (file {n} of {num_files}) into {database}")
-        p = load_twarc_json_to_sqlite(file, database, json_encoding=json_encoding)
-        total_pages = total_pages + p
-        click.echo(f"{p} pages of Twitter results loaded from {file}")
+    skipped = []
+    use_pool = workers > 1 and num_files > 0
+    use_metrics = metrics_file is not None or metrics_port is not None
+    with ProcessPoolExecutor(workers) if use_pool else nullcontext() as executor:
+        with Loader(
+            _open_sink(database, engine, profile),
+            json_encoding=json_encoding,
+            executor=executor,
+            json_decoder=json_decoder,
+            commit_pages=commit_pages,
+            stats=stats_file is not None or use_metrics,
+        ) as loader:
+            progress = None
+            reporter = nullcontext()
+            if use_metrics:
+                # The size of standard input is not known
+                progress = LoadProgress(
+                    loader.stats, [file for file in json_files if file != "-"]
+                )
+                reporter = MetricsReporter(
+                    progress, metrics_file, metrics_port, metrics_interval
+                )
+            with reporter:
+                for file in json_files:
+                    n = n + 1  # Count files for user messaging only
+                    if follow:
+                        echo(f"Following {file} into {database}, press Ctrl-C to stop")
+                        if progress is not None:
+                            progress.start_file(file)
+                        try:
+                            p = loader.follow_file(file, poll_interval, idle_timeout)
+                        except KeyboardInterrupt:
+                            echo(
+                                f"Stopped following {file}. Pages committed before "
+                                f"stopping have been kept."
+                            )
+                            loader.rollback()
+                            break
+                        total_pages = total_pages + p
+                        echo(f"{p} pages of Twitter results loaded from {file}")
+                        continue
+                    if file == "-":
+                        echo(
+                            f"Loading standard input (file {n} of {num_files}) into "
+                            f"{database} as {stdin_label}"
+                        )
+                        p = loader.load_stream(sys.stdin.buffer, stdin_label)
+                        total_pages = total_pages + p
+                        echo(f"{p} pages of Twitter results loaded from stdin")
+                        continue
+                    # Fingerprinted once, for both checking and recording the file
+                    fingerprint = file_fingerprint(file)
+                    loaded_as = loader.find_loaded_file(file, fingerprint)
+                    if loaded_as is not None:
+                        echo(
+                            f"Skipping {file} (file {n} of {num_files}), the same "
+                            f"file has already been loaded into {database} as "
+                            f"{loaded_as}"
+                        )
+                        skipped.append(file)
+                        if progress is not None:
+                            progress.skip_file(file)
+                        continue
+                    echo(f"Loading {file} (file {n} of {num_files}) into {database}")
+                    if progress is not None:
+                        progress.start_file(file)
+                    p = loader.load_file(file, resume=resume, fingerprint=fingerprint)
+                    if progress is not None:
+                        progress.finish_file(file)
+                    total_pages = total_pages + p
+                    echo(f"{p} pages of Twitter results loaded from {file}")
+
+    load_seconds = time.perf_counter() - start
+
+    if index:
+        echo(f"Building indexes for {database}")
+        if sharded:
+            shards.build_indexes(database)
+        else:
+            db.build_indexes(database)
+
+    echo(
+        f"All done! {total_pages} pages of tweets loaded into {database} from "
+        f"{n - len(skipped)} files."
+    )
+    if skipped:
+        echo(
+            f"Skipped {len(skipped)} files which had already been loaded: "
+            + ", ".join(str(file) for file in skipped)
+        )
+
+    if stats_file is not None:
+        report = loader.stats.as_dict()
+        report["elapsed_seconds"] = {
+            "load": load_seconds,
+            "index": time.perf_counter() - start - load_seconds,
+        }
+        with click.open_file(stats_file, "w") as fh:
+            json.dump(report, fh, indent=2)
+            fh.write("\n")
+
+
+@cli.command("parquet")
+@click.argument("directory", type=click.Path(file_okay=False, path_type=Path))
+@click.argument("json_files", type=click.Path(exists=True), nargs=-1)
+@click.option(
+    "--partition_by",
+    type=click.Choice(["source_file", "retrieved_month", "created_month", "none"]),
+    default="source_file",
+    help="Split each table into a directory per json file (source_file, the "
+    "default), per month the pages were retrieved (retrieved_month), or per month "
+    "tweets were created (created_month, with other tables split by retrieved "
+    "month), or don't split tables (none).",
+)
+@click.option(
+    "--row_group_size",
+    type=click.IntRange(min=1),
+    default=100_000,
+    help="Number of rows in each Parquet row group (defaults to 100,000).",
+)
+@click.option(
+    "--json_encoding",
+    type=str,
+    default=None,
+    help="If the json file/s you wish to load are encoded other than UTF-8, specify "
+    "encoding.",
+)
+@click.option(
+    "--json_decoder",
+    type=click.Choice(["auto", *JSON_DECODERS]),
+    default="auto",
+    help="Library to decode json with (defaults to auto, see tidy_tweet load --help).",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes to decode and map pages with (defaults to 1).",
+)
+def tidy_twarc_jsons_to_parquet(
+    directory: Path,
+    json_files: Collection[Union[str, PathLike]],
+    partition_by,
+    row_group_size,
+    json_encoding,
+    json_decoder,
+    workers,
+):
+    """
+    Tidies Twitter json collected with Twarc into a Parquet dataset.
+
+    Tidies the tweet data in one or more JSON_FILES (produced by Twarc) into the same
+    tables as `tidy_tweet load`, stored as a directory of Parquet files for each
+    table in DIRECTORY. Files can be added to an existing DIRECTORY.
+
+    Needs the pyarrow package: pip install tidy_tweet[parquet]
+    """
+    try:
+        from tidy_tweet.parquet import ParquetLoader
+    except ImportError as e:
+        raise click.UsageError(
+            "Writing Parquet needs the pyarrow package, which can be installed with "
+            "pip install tidy_tweet[parquet]"
+        ) from e
+
+    num_files = len(json_files)
+    total_pages = 0
+    use_pool = workers > 1 and num_files > 0
+    with ProcessPoolExecutor(workers) if use_pool else nullcontext() as executor:
+        with ParquetLoader(
+            directory,
+            partition_by=None if partition_by == "none" else partition_by,
+            row_group_size=row_group_size,
+            json_encoding=json_encoding,
+            executor=executor,
+            json_decoder=json_decoder,
+        ) as loader:
+            for n, file in enumerate(json_files, start=1):
+                click.echo(f"Loading {file} (file {n} of {num_files}) into {directory}")
+                p = loader.load_file(file)
+                total_pages = total_pages + p
+                click.echo(f"{p} pages of Twitter results loaded from {file}")
 
     click.echo(
-        f"All done! {total_pages} pages of tweets loaded into {database} from {n} "
-        f"files."
+        f"All done! {total_pages} pages of tweets loaded into {directory} from "
+        f"{num_files} files."
     )
 
 
+@cli.command("index")
+@click.argument("database", type=click.Path(exists=True, path_type=Path))
+@click.option(
+    "--full_text_search",
+    is_flag=True,
+    default=False,
+    help="Add full text search indexes of tweet text and user descriptions, if "
+    "DATABASE doesn't have them already.",
+)
+def index_database(database: Path, full_text_search):
+    """
+    Builds secondary indexes on an existing tidy_tweet DATABASE, adds any tweets and
+    users not yet in its full text search indexes if it has them, and updates the
+    statistics SQLite uses to plan queries.
+
+    Loading files with `tidy_tweet DATABASE JSON_FILES...` does this automatically,
+    unless --no_index is given.
+    """
+    _check_existing_database(database)
+    click.echo(f"Building indexes for {database}")
+    if shards.is_sharded(database):
+        if full_text_search:
+            raise click.UsageError(
+                "--full_text_search is not supported for sharded databases"
+            )
+        shards.build_indexes(database)
+    else:
+        db.build_indexes(database, full_text_search=full_text_search)
+    click.echo("All done!")
+
+
+@cli.command("network")
+@click.argument("database", type=click.Path(exists=True, path_type=Path))
+@click.argument("output", type=click.Path(dir_okay=False, allow_dash=True))
+@click.option(
+    "--format",
+    "file_format",
+    type=click.Choice(["csv", "parquet"]),
+    default=None,
+    help="Format to write OUTPUT in (defaults to parquet if OUTPUT ends in .parquet, "
+    "otherwise csv).",
+)
+@click.option(
+    "--interaction",
+    "interactions",
+    type=click.Choice(network.INTERACTIONS),
+    multiple=True,
+    help="Type of interaction to export edges for. Can be given more than once "
+    "(defaults to all of them).",
+)
+@click.option(
+    "--start",
+    type=str,
+    default=None,
+    help="Only include tweets created on or after this ISO 8601 date, or part of one "
+    "such as 2021-10.",
+)
+@click.option(
+    "--end",
+    type=str,
+    default=None,
+    help="Only include tweets created on or before this ISO 8601 date, or part of one "
+    "such as 2021-12.",
+)
+@click.option(
+    "--window",
+    type=click.Choice(list(network.WINDOWS)),
+    default=None,
+    help="Count interactions separately for each day, month or year that tweets were "
+    "created in, rather than over the whole time.",
+)
+def export_network(
+    database: Path, output: str, file_format, interactions, start, end, window
+):
+    """
+    Exports the retweet, quote, reply and mention networks in a tidy_tweet DATABASE
+    as a weighted edge list, to OUTPUT (use - for standard output).
+
+    Each edge is from the author of tweets to the user they retweeted, quoted,
+    replied to or mentioned, with user ids and usernames, weighted by the number of
+    tweets. Writing Parquet needs the pyarrow package: pip install tidy_tweet[parquet]
+    """
+    _check_existing_database(database)
+    if file_format is None:
+        file_format = "parquet" if output.endswith(".parquet") else "csv"
+    if file_format == "parquet":
+        if output == "-":
+            raise click.UsageError("Parquet can't be written to standard output")
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise click.UsageError(
+                "Writing Parquet needs the pyarrow package, which can be installed "
+                "with pip install tidy_tweet[parquet]"
+            ) from e
+
+    try:
+        edges = network.iter_edges(
+            database,
+            interactions=interactions or network.INTERACTIONS,
+            start=start,
+            end=end,
+            window=window,
+        )
+    except ValueError as e:
+        # Too many shards of a sharded database to attach at once
+        raise click.UsageError(f"{e} Use --start and --end.") from e
+    # The csv module writes its own line endings, so they mustn't be translated
+    if file_format == "parquet":
+        n = network.write_parquet(edges, output)
+    elif output == "-":
+        with click.open_file(output, "wb") as stdout:
+            fh = io.TextIOWrapper(stdout, encoding="utf-8", newline="")
+            n = network.write_csv(edges, fh)
+            fh.detach()  # Flushes, leaving standard output open
+    else:
+        with open(output, "w", newline="", encoding="utf-8") as fh:
+            n = network.write_csv(edges, fh)
+    click.echo(f"All done! {n} edges exported from {database}", err=output == "-")
+
+
 if __name__ == "__main__":
-    tidy_twarc_jsons()
+    cli()
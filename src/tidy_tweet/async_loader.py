@@ -0,0 +1,212 @@
+"""
+Loads pages of Twitter API results from asyncio programs, such as collectors which
+receive pages from the Twitter API in memory, without blocking the event loop on
+database writes.
+"""
+
+import asyncio
+import queue
+import threading
+from logging import getLogger
+from os import PathLike
+from typing import Any, Callable, Dict, Mapping, Optional, Union
+
+from tidy_tweet.processing import Loader, PageParsingError, _map_page
+from tidy_tweet.sinks import Sink
+
+logger = getLogger(__name__)
+
+
+def _resolve(future: asyncio.Future, result: Any = None, error: Exception = None):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class AsyncLoader:
+    """
+    A `tidy_tweet.Loader` for asyncio programs.
+
+    Pages are mapped to rows in the event loop as they are put, then handed through
+    a queue of at most `max_queued_pages` pages to a thread which writes them to the
+    database with a `Loader`. Once the queue is full, `put` waits for the writer to
+    catch up, without blocking the event loop.
+
+    Use as an asynchronous context manager, which commits everything put once the
+    block ends, or discards everything not yet committed if there is an error::
+
+        async with AsyncLoader("my_dataset.db") as loader:
+            async for page in collector:
+                await loader.put(page, "my_collection")
+
+    An error writing to the database is raised by the next call to `put`, `commit`
+    or `close`.
+    """
+
+    def __init__(
+        self,
+        db_name: Union[str, PathLike, Sink],
+        max_queued_pages: int = 100,
+        **loader_options,
+    ):
+        """
+        :param db_name: The path to an existing sqlite database to load the data
+        into, or a `tidy_tweet.sinks.Sink`. SQLite connections can only be used by
+        the thread which opened them, so SQLite databases should be given as a path.
+        :param max_queued_pages: The number of pages which can wait to be written
+        :param loader_options: Options for the `tidy_tweet.Loader` which writes the
+        pages, such as `batch_pages` or `commit_pages`
+        """
+        self.db_name = db_name
+        self.loader_options = loader_options
+        self._queue: "queue.Queue" = queue.Queue(max_queued_pages)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._writer: Optional[threading.Thread] = None
+        self._error: Optional[Exception] = None
+        # The last page number put, and the file id, for each file name
+        self._last_pages: Dict[str, int] = {}
+        self._file_ids: Dict[str, int] = {}
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close(commit=exc_type is None)
+
+    def start(self):
+        """
+        Starts the writer thread. Must be called from the event loop.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._writer = threading.Thread(
+            target=self._write, name="tidy_tweet-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _write(self):
+        """
+        Writes queued pages until told to stop. After an error, the queue is still
+        emptied, so nothing waiting to put a page is left blocked.
+        """
+        try:
+            loader = Loader(self.db_name, **self.loader_options)
+        except Exception as e:
+            self._error = e
+            loader = None
+
+        while True:
+            kind, *arguments = self._queue.get()
+            if kind == "stop":
+                (commit,) = arguments
+                if loader is None:
+                    return
+                try:
+                    if commit and self._error is None:
+                        loader.close()
+                    else:
+                        loader.rollback()
+                        loader.sink.close()
+                except Exception as e:
+                    self._error = self._error or e
+                return
+            elif kind == "page":
+                if self._error is None:
+                    try:
+                        loader._add_mappings(*arguments)
+                    except Exception as e:
+                        self._error = e
+            elif kind == "call":
+                function, future = arguments
+                result, error = None, self._error
+                if error is None:
+                    try:
+                        result = function(loader)
+                    except Exception as e:
+                        self._error = error = e
+                self._loop.call_soon_threadsafe(_resolve, future, result, error)
+
+    def _check_error(self):
+        if self._error is not None:
+            raise self._error
+
+    async def _enqueue(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Wait for the writer in another thread, so the event loop keeps running
+            await self._loop.run_in_executor(None, self._queue.put, item)
+
+    async def _call(self, function: Callable[[Loader], Any]) -> Any:
+        """
+        Runs a function with the writer's `Loader` in the writer thread, once the
+        pages queued before it have been written.
+        """
+        self._check_error()
+        future = self._loop.create_future()
+        await self._enqueue(("call", function, future))
+        return await future
+
+    async def put(
+        self,
+        page_json: Mapping,
+        file_name: str = "stream",
+        page_num: Optional[int] = None,
+    ):
+        """
+        Maps a page of twarc Twitter API results and queues it to be written to the
+        database.
+
+        If using this method to parse Twitter data from an object direct from Twarc
+        without saving the JSON Twarc output, we recommend you save the raw data Twarc
+        json output by some other means.
+
+        :param page_json: A dictionary (such as parsed json) of a single page of API
+        results
+        :param file_name: The file name to record as the source of the page
+        :param page_num: The page number to record for the page. By default, pages
+        are numbered on from the last page put with the same file name, or if there
+        is none, from the last page with that file name committed to the database.
+        """
+        self._check_error()
+        if page_num is None:
+            if file_name not in self._last_pages:
+                checkpoint = await self._call(
+                    lambda loader: loader.get_checkpoint(file_name)
+                )
+                self._last_pages[file_name] = 0 if checkpoint is None else checkpoint[0]
+            page_num = self._last_pages[file_name] + 1
+        self._last_pages[file_name] = page_num
+        if file_name not in self._file_ids:
+            self._file_ids[file_name] = await self._call(
+                lambda loader: loader.file_id(file_name)
+            )
+
+        try:
+            page_mappings = _map_page(self._file_ids[file_name], page_num, page_json)
+        except Exception as e:
+            raise PageParsingError(file_name, page_num) from e
+        await self._enqueue(("page", file_name, page_num, None, page_mappings))
+
+    async def commit(self):
+        """
+        Waits for every page put so far to be written, and commits them.
+        """
+        await self._call(Loader.commit)
+
+    async def close(self, commit: bool = True):
+        """
+        Stops the writer thread once every page put so far has been written, and
+        commits them unless `commit` is False, in which case anything not yet
+        committed is discarded and errors writing it are not raised.
+        """
+        if self._writer is None:
+            return
+        await self._enqueue(("stop", commit))
+        await self._loop.run_in_executor(None, self._writer.join)
+        self._writer = None
+        if commit:
+            self._check_error()
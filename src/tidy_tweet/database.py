@@ -1,63 +1,50 @@
 import sqlite3
 from pathlib import Path
-from typing import Union
+from typing import Union, Dict, Any, Optional, Sequence, Tuple
 from os import PathLike
 import tidy_tweet.tweet_mapping as mapping
-from tidy_tweet._version import version as library_version
-from logging import getLogger
-from warnings import warn
+from tidy_tweet.sinks import Sink
 
+# Previously defined here
+from tidy_tweet.sinks import (  # noqa: F401
+    SchemaVersionMismatchError,
+    LibraryVersionMismatchWarning,
+)
+from tidy_tweet.utilities import clean_sql_statement
+from logging import getLogger
 
 logger = getLogger(__name__)
 
 
-class SchemaVersionMismatchError(Exception):
-    def __init__(self, library_schema_version, db_schema_version, db_name, *args):
-        self.library_schema_version = library_schema_version
-        self.db_schema_version = db_schema_version
-        self.db_name = db_name
-        super().__init__(*args)
-
-    def message(self):
-        msg = (
-            f"Database file {self.db_name} is using tidy_tweet database schema "
-            f"version {self.db_schema_version} but the version of tidy_tweet you "
-            f"are running is using tidy_tweet database schema version "
-            f"{self.db_schema_version}. These versions are not compatible. It is "
-            f"recommended to reprocess all your json files into a fresh database."
-        )
-        return msg
-
-    def __str__(self):
-        return "Exception SchemaVersionMismatchError: " + self.message()
-
-
-class LibraryVersionMismatchWarning(Warning):
-    def __init__(self, this_library_version, db_library_version, db_name, *args):
-        self.library_version = this_library_version
-        self.db_library_version = db_library_version
-        self.db_name = db_name
-        super().__init__(*args)
-
-    def message(self):
-        msg = (
-            f"Database file {self.db_name} contains data processed with tidy_tweet "
-            f"version {self.db_library_version}, but the version of tidy_tweet you "
-            f"are currently using is version {self.library_version}. This is not "
-            f"necessarily incompatible, but if you notice any inconsistencies with "
-            f"how the data is parsed, you may wish to reprocess all your json files "
-            f"into a fresh and consistent database."
-        )
-        return msg
-
-    def __str__(self):
-        return "LibraryVersionMismatchWarning: " + self.message()
+# SQLite settings used while loading data, by profile name. Both profiles use
+# write-ahead logging, so that the database can be read while a load is running.
+# - "safe" keeps SQLite's default durability, so a completed commit survives a
+#   power loss or operating system crash.
+# - "bulk" trades that durability for speed: a crash of tidy_tweet itself is still
+#   safe, but a power loss or operating system crash part way through a load may
+#   corrupt the database. Use for loads that can be rerun from scratch.
+SQLITE_PROFILES = {
+    "safe": {"journal_mode": "wal", "synchronous": "full"},
+    "bulk": {
+        "journal_mode": "wal",
+        "synchronous": "off",
+        "cache_size": -262144,  # negative means KiB, so 256MiB
+        "temp_store": "memory",
+        "mmap_size": 2**30,
+    },
+}
+# Settings restored once a load has finished, whichever profile was used
+DURABLE_SETTINGS = {"synchronous": "full", "cache_size": -2000, "mmap_size": 0}
 
 
 def initialise_sqlite(
     db_name: Union[str, PathLike],
     allow_existing_database: bool = False,
     strict_mode: bool = True,
+    materialised: bool = False,
+    snapshots: bool = False,
+    full_text_search: bool = False,
+    rollups: bool = False,
 ):
     """
     Creates and initialises an empty sqlite database for loading tweet data into.
@@ -75,18 +62,91 @@ def initialise_sqlite(
     :param strict_mode: By default, tables are created in SQLite strict mode to help
     catch parsing errors. For compatibility with some tools, you may need to disable
     this.
+    :param materialised: If True, the `tweet` and `user` views are instead created as
+    tables with one row per id, holding the most recently retrieved version of each
+    tweet or user. These are kept up to date as each page is loaded, which makes
+    loading slower but queries on them much faster on large databases.
+    :param snapshots: If True, tweets and users are stored as snapshots, adding a
+    row only when a tweet or user differs from its most recently retrieved version
+    rather than for every page it is seen on. `tweet_by_page` and `user_by_page` are
+    then views of the `tweet_snapshot` and `user_snapshot` tables, with a row per
+    version rather than per page. Each version records the earliest and latest
+    retrieved pages it was seen on and how many pages it was seen on, but not the
+    pages in between.
+    :param full_text_search: If True, full text search indexes of tweet text and user
+    descriptions are created, and newly loaded tweets and users are added to them as
+    each load is committed. See `tidy_tweet.search`.
+    :param rollups: If True, tables of the number of tweets per day by author,
+    language, hashtag and mentioned username are created, and kept up to date as each
+    page is loaded. Each tweet is only counted the first time it is loaded.
     """
     db_name = Path(db_name)
 
     if not allow_existing_database:
         assert not db_name.exists()
 
-    create_table_statements = mapping.get_create_table_statements(strict_mode)
+    with SQLiteSink(db_name) as sink:
+        sink.create_schema(
+            strict_mode,
+            materialised,
+            record_version=not allow_existing_database,
+            snapshots=snapshots,
+            rollups=rollups,
+        )
+        if full_text_search:
+            create_search_tables(sink.connection)
+
+
+class SQLiteSink(Sink):
+    """
+    Stores the tidy_tweet tables in an SQLite database file.
+    """
 
-    with sqlite3.connect(db_name) as db:
-        cursor = db.cursor()
+    def __init__(self, db_name: Union[str, PathLike], profile: Optional[str] = None):
+        """
+        :param db_name: The path to the database file
+        :param profile: One of the `SQLITE_PROFILES` to configure the connection with
+        for loading, in which case durable settings are restored when the sink is
+        closed
+        """
+        self.name = db_name
+        self.profile = profile
+        self.connection = sqlite3.connect(db_name)
+        if profile is not None:
+            try:
+                configure_sqlite_for_loading(self.connection, profile)
+            except Exception:
+                self.connection.close()
+                raise
+
+    def create_schema(
+        self,
+        strict_mode: bool = True,
+        materialised: bool = False,
+        record_version: bool = True,
+        snapshots: bool = False,
+        rollups: bool = False,
+    ):
+        if materialised and snapshots:
+            raise ValueError(
+                "The tweet and user views can't be materialised in a database of "
+                "snapshots"
+            )
+        create_table_statements = mapping.get_create_table_statements(
+            strict_mode, snapshots
+        )
+
+        # Write-ahead logging lets analysis sessions read while data is loaded. This
+        # is stored in the database file, so only needs setting once.
+        self.connection.execute("pragma journal_mode = wal")
+
+        cursor = self.connection.cursor()
         for tbl_stmt in create_table_statements:
             cursor.execute(tbl_stmt)
+        if snapshots:
+            for snapshot_sql in mapping.sql_snapshot_tables.values():
+                cursor.execute(snapshot_sql["view"])
+                cursor.execute(snapshot_sql["trigger"])
 
         # Initialise the schema related metadata first, otherwise if an
         # insert fails we end up with a schema version of null.
@@ -95,7 +155,7 @@ def initialise_sqlite(
         #     mapping.map_tidy_tweet_metadata()["_metadata"],
         # )
 
-        if not allow_existing_database:
+        if record_version:
             # ".tables" only works in the sqlite shell!
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
             created_tables = cursor.fetchall()
@@ -108,11 +168,209 @@ def initialise_sqlite(
             )
 
         # Create views
-        for view_sql in mapping.sql_views.values():
-            cursor.execute(view_sql)
+        for view_name, view_sql in mapping.sql_views.items():
+            if snapshots:
+                view_sql = mapping.sql_snapshot_views.get(view_name, view_sql)
+            if materialised and view_name in mapping.sql_materialised_views:
+                materialised_sql = mapping.sql_materialised_views[view_name]
+                cursor.execute(
+                    clean_sql_statement(
+                        materialised_sql["create"] + (" strict" if strict_mode else "")
+                    )
+                )
+                cursor.execute(materialised_sql["trigger"])
+            else:
+                cursor.execute(view_sql)
+
+        if rollups:
+            strict = " strict" if strict_mode else ""
+            for rollup_sql in mapping.sql_rollup_tables.values():
+                cursor.execute(clean_sql_statement(rollup_sql + strict))
+            for trigger_name, trigger_sql in mapping.sql_rollup_triggers.items():
+                if snapshots:
+                    trigger_sql = mapping.sql_snapshot_rollup_triggers.get(
+                        trigger_name, trigger_sql
+                    )
+                cursor.execute(trigger_sql)
 
         logger.info("The database schema has been initialised")
 
+    def append(self, table: str, rows: Sequence[Tuple]):
+        self.connection.executemany(mapping.sql_by_table[table]["insert"], rows)
+
+    def fetch_one(self, query: str, parameters: Sequence = ()) -> Optional[Tuple]:
+        return self.connection.execute(query, parameters).fetchone()
+
+    def commit(self):
+        # Rows written since the last commit are added to the full text search
+        # indexes in the same transaction, so searches match the committed data
+        update_search_tables(self.connection)
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        if self.profile is not None:
+            restore_durable_sqlite_settings(self.connection)
+        self.connection.close()
+
+
+def apply_sqlite_settings(connection: sqlite3.Connection, settings: Dict[str, Any]):
+    """
+    Sets each of the given pragmas on an SQLite connection.
+    """
+    for pragma, value in settings.items():
+        logger.debug(f"Setting pragma {pragma} to {value}")
+        connection.execute(f"pragma {pragma} = {value}")
+
+
+def configure_sqlite_for_loading(connection: sqlite3.Connection, profile: str = "safe"):
+    """
+    Applies one of the `SQLITE_PROFILES` to a connection about to be used for loading.
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(
+            f"Unknown SQLite profile {profile!r}, expected one of "
+            f"{', '.join(SQLITE_PROFILES)}"
+        )
+    apply_sqlite_settings(connection, SQLITE_PROFILES[profile])
+
+
+def restore_durable_sqlite_settings(connection: sqlite3.Connection):
+    """
+    Restores durable settings after loading and folds the write-ahead log back into
+    the main database file.
+    """
+    apply_sqlite_settings(connection, DURABLE_SETTINGS)
+    connection.execute("pragma wal_checkpoint(truncate)")
+
+
+def build_indexes(db_name: Union[str, PathLike], full_text_search: bool = False):
+    """
+    Builds any of the secondary indexes in `tidy_tweet.tweet_mapping.sql_indexes`
+    which don't already exist, adds any tweets and users not yet in the full text
+    search indexes if the database has them, then updates the statistics SQLite uses
+    to plan queries.
+
+    Indexes are not created when the database is initialised, as it is much faster
+    to build each index in one pass once the data is loaded than to update it for
+    every row inserted.
+
+    :param full_text_search: If True, the full text search indexes are created and
+    filled first if the database doesn't have them yet
+    """
+    conn = sqlite3.connect(db_name)
+    with conn:
+        if full_text_search:
+            create_search_tables(conn)
+        update_search_tables(conn)
+
+        existing = {
+            name
+            for (name,) in conn.execute(
+                "select name from sqlite_master where type = 'index'"
+            )
+        }
+        for index_name, index_sql in _index_sql(conn).items():
+            if index_name in existing:
+                continue
+            logger.info(f"Building index {index_name}")
+            conn.execute(index_sql)
+
+    # Approximate statistics are much faster to gather on large databases and are
+    # good enough for the query planner
+    conn.execute("pragma analysis_limit = 1000")
+    conn.execute("analyze")
+    conn.execute("pragma optimize")
+    conn.close()
+    logger.info(f"Indexes built and statistics updated for {db_name}")
+
+
+def _index_sql(conn: sqlite3.Connection) -> Dict[str, str]:
+    """
+    The secondary indexes of a database, which are on the snapshot tables rather
+    than the by-page tables if it stores snapshots.
+    """
+    if not _has_table(conn, "tweet_snapshot"):
+        return mapping.sql_indexes
+    return {**mapping.sql_indexes, **mapping.sql_snapshot_indexes}
+
+
+def _has_table(conn: sqlite3.Connection, table_name: str) -> bool:
+    result = conn.execute(
+        "select 1 from sqlite_master where type = 'table' and name = ?", (table_name,)
+    ).fetchone()
+    return result is not None
+
+
+def create_search_tables(conn: sqlite3.Connection):
+    """
+    Creates the full text search indexes in
+    `tidy_tweet.tweet_mapping.sql_search_tables`, if the database doesn't already
+    have them. They are empty until filled by `update_search_tables`, which
+    `SQLiteSink.commit` calls whenever a load is committed.
+    """
+    if _has_table(conn, "search_index_progress"):
+        return
+    try:
+        for search_table, search_sql in mapping.sql_search_tables.items():
+            conn.execute(search_sql["create"])
+    except sqlite3.OperationalError as e:
+        raise RuntimeError(
+            "Full text search needs a version of SQLite with the FTS5 extension and "
+            f"{mapping.SEARCH_TOKENIZER} tokenizer (3.34.0 or later), but this is "
+            f"SQLite {sqlite3.sqlite_version}"
+        ) from e
+    conn.execute(mapping.sql_search_progress)
+    conn.executemany(
+        "insert into search_index_progress values (?, 0)",
+        [(search_table,) for search_table in mapping.sql_search_tables],
+    )
+
+
+def update_search_tables(conn: sqlite3.Connection):
+    """
+    Adds the tweets and users with rows loaded since the full text search indexes
+    were last updated to them, replacing the rows of any already indexed with the
+    most recently retrieved version. Does nothing if the database has no full text
+    search indexes.
+    """
+    if not _has_table(conn, "search_index_progress"):
+        return
+    snapshots = _has_table(conn, "tweet_snapshot")
+    for search_table, search_sql in mapping.sql_search_tables.items():
+        source = search_sql["snapshot_source" if snapshots else "source"]
+        (last_rowid,) = conn.execute(
+            "select last_rowid from search_index_progress where search_table = ?",
+            (search_table,),
+        ).fetchone()
+        (max_rowid,) = conn.execute(f"select max(rowid) from {source}").fetchone()
+        if max_rowid is None or max_rowid <= last_rowid:
+            continue
+        logger.info(f"Adding rows after {source} row {last_rowid} to {search_table}")
+        conn.execute(
+            search_sql["snapshot_update" if snapshots else "update"],
+            {"last_rowid": last_rowid},
+        )
+        conn.execute(
+            "update search_index_progress set last_rowid = ? where search_table = ?",
+            (max_rowid, search_table),
+        )
+
+
+def drop_indexes(db_name: Union[str, PathLike]):
+    """
+    Drops the secondary indexes in `tidy_tweet.tweet_mapping.sql_indexes`, so a large
+    load doesn't have to maintain them row by row. Rebuild them afterwards with
+    `build_indexes`.
+    """
+    conn = sqlite3.connect(db_name)
+    with conn:
+        for index_name in mapping.sql_indexes:
+            conn.execute(f"drop index if exists {index_name}")
+    conn.close()
+
 
 def check_database_version(db_name):
     """
@@ -123,33 +381,5 @@ def check_database_version(db_name):
     schema - mismatched database schemas are considered incompatible and file processing
     should be aborted.
     """
-    logger.debug(f"Checking version compatibility of {db_name}...")
-    conn = sqlite3.connect(db_name)
-    with conn:
-        db = conn.cursor()
-        db.execute(
-            """
-            select schema_version from schema_version
-            """
-        )
-        result = db.fetchone() or []
-        db_schema_version = None if len(result) == 0 else result[0]
-        db.execute(
-            """
-            select max(tidy_tweet_version) from results_page
-            """
-        )
-        result = db.fetchone() or []
-        db_library_version = None if len(result) == 0 else result[0]
-    if db_schema_version != mapping.SCHEMA_VERSION:
-        raise SchemaVersionMismatchError(
-            mapping.SCHEMA_VERSION, db_schema_version, db_name
-        )
-    if db_library_version != library_version:
-        warning = LibraryVersionMismatchWarning(
-            library_version, db_library_version, db_name
-        )
-        logger.warning(warning.message())
-        warn(warning)
-    else:
-        logger.info(f"Database {db_name} matches current tidy_tweet version")
+    with SQLiteSink(db_name) as sink:
+        sink.check_version()
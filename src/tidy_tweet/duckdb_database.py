@@ -0,0 +1,230 @@
+"""
+Stores the tidy_tweet tables in a DuckDB database, a columnar database which runs
+analytical queries over large tables much faster than SQLite.
+
+This needs the optional duckdb package: pip install tidy_tweet[duckdb]
+"""
+
+import re
+from typing import Dict, Optional, Sequence, Tuple, Union
+from os import PathLike
+from logging import getLogger
+
+import duckdb
+
+import tidy_tweet.tweet_mapping as mapping
+from tidy_tweet.sinks import Sink
+
+try:
+    import pyarrow as pa
+    from tidy_tweet.parquet import arrow_schema, _to_arrow
+except ImportError:
+    pa = None
+
+
+logger = getLogger(__name__)
+
+
+# DuckDB versions of the views in tweet_mapping.sql_views, as DuckDB can't select
+# columns which are not grouped by alongside max(retrieved_at) as SQLite can
+duckdb_views: Dict[str, str] = {}
+
+duckdb_views["user"] = """
+create view user as
+select
+    user_by_page.id, username, name, url,
+    profile_image_url, description,
+    created_at,
+    protected, verified,
+    location,
+    pinned_tweet_id,
+    retrieved_at
+from user_by_page
+left join results_page on
+    user_by_page.source_page = results_page.page
+    and user_by_page.file_id = results_page.file_id
+qualify row_number() over (
+    partition by user_by_page.id order by retrieved_at desc nulls last
+) = 1
+"""
+
+duckdb_views["tweet"] = """
+create view tweet as
+select
+    tweet_by_page.id, author_id,
+    text, lang, source,
+    possibly_sensitive, reply_settings,
+    created_at,
+    conversation_id,
+    retweeted_tweet_id,
+    quoted_tweet_id,
+    replied_to_tweet_id,
+    in_reply_to_user_id,
+    like_count, quote_count, reply_count, retweet_count,
+    retrieved_at
+from tweet_by_page
+left join results_page on
+    tweet_by_page.source_page = results_page.page
+    and tweet_by_page.file_id = results_page.file_id
+qualify row_number() over (
+    partition by tweet_by_page.id order by retrieved_at desc nulls last
+) = 1
+"""
+
+duckdb_views["results_file"] = """
+create view results_file as
+select
+    results_page.file_id,
+    any_value(file_name) as file_name,
+    min(oldest_id) as oldest_id,  -- oldest tweet id in file
+    max(newest_id) as newest_id,  -- newest tweet id in file
+    sum(result_count) as result_count,  -- count given in API response
+    -- (sum of all page result counts)
+    max(inserted_at) as inserted_at,
+    any_value(twarc_version) as twarc_version,
+    min(retrieved_at) as retrieved_at_min, -- earliest retrieval time for pages in file
+    max(retrieved_at) as retrieved_at_max -- latest retrieval time for pages in file
+from results_page
+left join source_file on results_page.file_id = source_file.file_id
+group by results_page.file_id
+"""
+
+assert duckdb_views.keys() == mapping.sql_views.keys()
+
+
+def _duckdb_create(create: str) -> str:
+    """
+    Converts an SQLite create table statement from tweet_mapping to DuckDB.
+    Foreign keys are left out, as they reference views, as are SQLite's conflict
+    clauses. SQLite integers are 64 bit, which is a bigint in DuckDB.
+    """
+    create = re.sub(r" references \w+ \(\w+\)", "", create)
+    create = create.replace(" on conflict ignore", "")
+    return re.sub(r"\binteger\b", "bigint", create)
+
+
+def _duckdb_insert_verb(table: str) -> str:
+    """
+    The insert verb for a table, with the conflict handling of its SQLite create
+    and insert statements.
+    """
+    verb = mapping.sql_by_table[table]["insert"].split(" into ")[0]
+    if (
+        verb == "insert"
+        and "on conflict ignore" in mapping.sql_by_table[table]["create"]
+    ):
+        verb = "insert or ignore"
+    return verb
+
+
+class DuckDBSink(Sink):
+    """
+    Stores the tidy_tweet tables in a DuckDB database file.
+
+    The tables and views are the same as in SQLite, though DuckDB has no triggers, so
+    `tweet` and `user` can't be materialised. Rows are inserted as Arrow tables if
+    pyarrow is installed, which is much faster than inserting them one by one.
+    """
+
+    def __init__(self, db_name: Union[str, PathLike]):
+        """
+        :param db_name: The path to the database file, which is created if it doesn't
+        exist
+        """
+        self.name = db_name
+        self.connection = duckdb.connect(str(db_name))
+        self.connection.begin()
+
+    def create_schema(
+        self,
+        strict_mode: bool = True,
+        materialised: bool = False,
+        record_version: bool = True,
+        snapshots: bool = False,
+        rollups: bool = False,
+    ):
+        """
+        Creates the tidy_tweet tables and views. DuckDB tables are always strictly
+        typed, so `strict_mode` has no effect.
+        """
+        if materialised:
+            raise ValueError(
+                "The tweet and user views can't be materialised in DuckDB, as DuckDB "
+                "does not support triggers"
+            )
+        if snapshots:
+            raise ValueError(
+                "Snapshots can't be stored in DuckDB, as DuckDB does not support "
+                "triggers"
+            )
+        if rollups:
+            raise ValueError(
+                "Rollup tables can't be kept up to date in DuckDB, as DuckDB does not "
+                "support triggers"
+            )
+
+        for table_sql in mapping.sql_by_table.values():
+            self.connection.execute(_duckdb_create(table_sql["create"]))
+        if record_version:
+            self.connection.execute("create table schema_version (schema_version text)")
+            self.connection.execute(
+                "insert into schema_version values (?)", [mapping.SCHEMA_VERSION]
+            )
+        for view_sql in duckdb_views.values():
+            self.connection.execute(view_sql)
+
+        logger.info("The database schema has been initialised")
+
+    def append(self, table: str, rows: Sequence[Tuple]):
+        if len(rows) == 0:
+            return
+        verb = _duckdb_insert_verb(table)
+        if verb == "insert or replace":
+            # SQLite keeps the last of several rows with the same key in one batch,
+            # but DuckDB keeps the first
+            key = [
+                i
+                for i, column in enumerate(mapping.column_definitions_by_table[table])
+                if "primary key" in column.constraints
+            ]
+            rows = list({tuple(row[i] for i in key): row for row in rows}.values())
+
+        columns = ", ".join(mapping.columns_by_table[table])
+        if pa is None:
+            placeholders = ", ".join("?" for _ in mapping.columns_by_table[table])
+            self.connection.executemany(
+                f"{verb} into {table} ({columns}) values ({placeholders})", rows
+            )
+            return
+
+        # The Python duckdb package has no appender, so batches are inserted as
+        # Arrow tables, which DuckDB reads without copying row by row
+        schema = arrow_schema(table)
+        batch = pa.Table.from_arrays(
+            [
+                _to_arrow(values, field.type)
+                for values, field in zip(zip(*rows), schema)
+            ],
+            schema=schema,
+        )
+        self.connection.register("tidy_tweet_batch", batch)
+        try:
+            self.connection.execute(
+                f"{verb} into {table} ({columns}) select * from tidy_tweet_batch"
+            )
+        finally:
+            self.connection.unregister("tidy_tweet_batch")
+
+    def fetch_one(self, query: str, parameters: Sequence = ()) -> Optional[Tuple]:
+        return self.connection.execute(query, list(parameters)).fetchone()
+
+    def commit(self):
+        self.connection.commit()
+        self.connection.begin()
+
+    def rollback(self):
+        self.connection.rollback()
+        self.connection.begin()
+
+    def close(self):
+        self.connection.close()
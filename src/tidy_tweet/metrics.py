@@ -0,0 +1,360 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+from os import PathLike
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from tidy_tweet.reading import detect_compression
+from tidy_tweet.stats import LoadStats
+
+logger = getLogger(__name__)
+
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class LoadProgress:
+    """
+    Tracks the progress of loading a list of files with a `tidy_tweet.Loader`
+    created with `stats=True`, and renders it along with the loader's stats as
+    Prometheus text format metrics.
+
+    Progress and the estimated time remaining are measured in bytes of the files as
+    stored on disk. The position within a compressed file is not known while it is
+    loading, so a compressed file counts as not started until it has finished.
+
+    The loading thread reports each file with `start_file`, then `finish_file` or
+    `skip_file`. `render` can be called from any thread.
+    """
+
+    def __init__(self, stats: LoadStats, files: Iterable[Union[str, PathLike]]):
+        """
+        :param stats: The stats of the loader loading the files
+        :param files: All of the files to be loaded
+        """
+        self.stats = stats
+        self.sizes: Dict[str, int] = {}
+        self.compressed: Dict[str, bool] = {}
+        for file in files:
+            file_name = str(file)
+            self.sizes[file_name] = os.stat(file).st_size
+            self.compressed[file_name] = detect_compression(file) is not None
+
+        self.started = time.time()
+        self.current_file: Optional[str] = None
+        self.files_finished = 0
+        self.files_skipped = 0
+        # Bytes of finished files, less any part loaded before resuming
+        self._finished_bytes = 0
+        # Bytes of skipped files, and of the parts of files loaded before resuming
+        self._not_loaded_bytes = 0
+        self._last_pages = 0
+        self._last_page_time: Optional[float] = None
+
+    def start_file(self, file: Union[str, PathLike]):
+        self.current_file = str(file)
+
+    def finish_file(self, file: Union[str, PathLike]):
+        file_name = str(file)
+        start_offset = self.stats.file(file_name).start_offset
+        if self.compressed[file_name]:
+            # Offsets in compressed files are in the decompressed json
+            start_offset = 0
+        self._not_loaded_bytes = self._not_loaded_bytes + start_offset
+        self._finished_bytes = (
+            self._finished_bytes + self.sizes[file_name] - start_offset
+        )
+        self.files_finished = self.files_finished + 1
+        self.current_file = None
+
+    def skip_file(self, file: Union[str, PathLike]):
+        self._not_loaded_bytes = self._not_loaded_bytes + self.sizes[str(file)]
+        self.files_skipped = self.files_skipped + 1
+        self.current_file = None
+
+    def _current_offsets(self) -> Tuple[int, Optional[int]]:
+        """
+        The offset loading of the current file started from, and the offset reached,
+        if known.
+        """
+        current_file = self.current_file
+        if current_file is None or current_file not in self.stats.files:
+            return 0, None
+        file_stats = self.stats.files[current_file]
+        return file_stats.start_offset, file_stats.offset
+
+    def render(self) -> str:
+        """
+        The current progress and stats in the Prometheus text format.
+        """
+        now = time.time()
+        current_file = self.current_file
+        total = self.stats.total
+        if total.pages != self._last_pages:
+            self._last_pages = total.pages
+            self._last_page_time = now
+        elapsed = now - self.started
+
+        # Bytes of the files on disk loaded so far, and still to load, in this run
+        loaded = self._finished_bytes
+        start_offset, offset = self._current_offsets()
+        if current_file is not None and not self.compressed[current_file]:
+            loaded = loaded + (offset or start_offset) - start_offset
+            not_loaded = self._not_loaded_bytes + start_offset
+        else:
+            not_loaded = self._not_loaded_bytes
+        remaining = max(sum(self.sizes.values()) - not_loaded - loaded, 0)
+
+        metrics: List[Tuple[str, str, str, List[Tuple[str, float]]]] = [
+            (
+                "tidy_tweet_start_time_seconds",
+                "gauge",
+                "Time loading started, in seconds since the epoch.",
+                [("", self.started)],
+            ),
+            (
+                "tidy_tweet_last_page_time_seconds",
+                "gauge",
+                "Time a page was last seen to be loaded, in seconds since the epoch.",
+                [("", self._last_page_time or self.started)],
+            ),
+            (
+                "tidy_tweet_files",
+                "gauge",
+                "Number of files to load, including finished and skipped files.",
+                [("", len(self.sizes))],
+            ),
+            (
+                "tidy_tweet_files_finished",
+                "gauge",
+                "Number of files completely loaded.",
+                [("", self.files_finished)],
+            ),
+            (
+                "tidy_tweet_files_skipped",
+                "gauge",
+                "Number of files skipped as they had already been loaded.",
+                [("", self.files_skipped)],
+            ),
+            (
+                "tidy_tweet_pages_total",
+                "counter",
+                "Pages of Twitter results loaded.",
+                [("", total.pages)],
+            ),
+            (
+                "tidy_tweet_pages_per_second",
+                "gauge",
+                "Pages loaded per second since loading started.",
+                [("", total.pages / elapsed if elapsed > 0 else 0)],
+            ),
+            (
+                "tidy_tweet_read_bytes_total",
+                "counter",
+                "Bytes of json read, after decompression.",
+                [("", total.bytes_read)],
+            ),
+            (
+                "tidy_tweet_rows_total",
+                "counter",
+                "Rows tidied for each table, including duplicates the database "
+                "ignores.",
+                [
+                    (f'table="{_escape_label(table)}"', rows)
+                    for table, rows in sorted(total.rows.items())
+                ],
+            ),
+            (
+                "tidy_tweet_stage_seconds_total",
+                "counter",
+                "Seconds spent in each stage of loading.",
+                [
+                    (f'stage="{stage}"', seconds)
+                    for stage, seconds in total.seconds.items()
+                ],
+            ),
+            (
+                "tidy_tweet_loaded_bytes",
+                "gauge",
+                "Bytes of the files on disk loaded so far.",
+                [("", loaded)],
+            ),
+            (
+                "tidy_tweet_remaining_bytes",
+                "gauge",
+                "Bytes of the files on disk still to load.",
+                [("", remaining)],
+            ),
+        ]
+        if loaded + remaining > 0:
+            metrics.append(
+                (
+                    "tidy_tweet_progress_ratio",
+                    "gauge",
+                    "Fraction of the bytes to load that have been loaded.",
+                    [("", loaded / (loaded + remaining))],
+                )
+            )
+        if loaded > 0:
+            metrics.append(
+                (
+                    "tidy_tweet_estimated_remaining_seconds",
+                    "gauge",
+                    "Estimated seconds until loading finishes, at the average rate "
+                    "so far.",
+                    [("", remaining * elapsed / loaded)],
+                )
+            )
+        if current_file is not None:
+            file_label = f'file="{_escape_label(current_file)}"'
+            metrics.append(
+                (
+                    "tidy_tweet_current_file_info",
+                    "gauge",
+                    "The file being loaded.",
+                    [(file_label, 1)],
+                )
+            )
+            if offset is not None:
+                metrics.append(
+                    (
+                        "tidy_tweet_current_file_offset_bytes",
+                        "gauge",
+                        "Byte offset reached in the json of the file being loaded.",
+                        [(file_label, offset)],
+                    )
+                )
+            if not self.compressed[current_file]:
+                metrics.append(
+                    (
+                        "tidy_tweet_current_file_size_bytes",
+                        "gauge",
+                        "Size of the file being loaded.",
+                        [(file_label, self.sizes[current_file])],
+                    )
+                )
+
+        lines = []
+        for name, metric_type, help_text, samples in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(
+                    f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+class MetricsReporter:
+    """
+    Publishes the metrics of a `LoadProgress` while loading, by rewriting a file
+    every `interval` seconds (for example for the node_exporter textfile collector)
+    and/or by serving them over HTTP on localhost.
+
+    Use as a context manager around loading::
+
+        with MetricsReporter(progress, path="tidy_tweet.prom", port=9180):
+            ...
+    """
+
+    def __init__(
+        self,
+        progress: LoadProgress,
+        path: Union[str, PathLike, None] = None,
+        port: Optional[int] = None,
+        interval: float = 15,
+    ):
+        """
+        :param progress: The progress to report
+        :param path: A file to write the metrics to
+        :param port: A port to serve the metrics on, at http://localhost:port/metrics
+        :param interval: Seconds between writes of the file
+        """
+        self.progress = progress
+        self.path = path
+        self.port = port
+        self.interval = interval
+        self._stop = threading.Event()
+        self._writer: Optional[threading.Thread] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def write(self):
+        """
+        Writes the metrics file, replacing it in one step so it is never read part
+        written.
+        """
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as fh:
+            fh.write(self.progress.render())
+        os.replace(temp_path, self.path)
+
+    def _write_periodically(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                logger.exception(f"Could not write metrics to {self.path}")
+
+    def start(self):
+        if self.path is not None:
+            self.write()
+            self._writer = threading.Thread(
+                target=self._write_periodically, name="tidy_tweet-metrics", daemon=True
+            )
+            self._writer.start()
+
+        if self.port is not None:
+            progress = self.progress
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ["/", "/metrics"]:
+                        self.send_error(404)
+                        return
+                    body = progress.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    logger.debug(format, *args)
+
+            self._server = ThreadingHTTPServer(("localhost", self.port), MetricsHandler)
+            self._server.daemon_threads = True
+            # The port chosen by the operating system, if port 0 was given
+            self.port = self._server.server_address[1]
+            threading.Thread(
+                target=self._server.serve_forever,
+                name="tidy_tweet-metrics-server",
+                daemon=True,
+            ).start()
+
+    def stop(self):
+        """
+        Stops reporting, writing the metrics file a final time.
+        """
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+            self.write()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
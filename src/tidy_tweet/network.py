@@ -0,0 +1,299 @@
+"""
+Exports the networks of interactions between users in a tidy_tweet database, as
+weighted edge lists for network analysis tools such as Gephi, igraph or networkx.
+
+Edges are aggregated by SQLite, reading tweets through the primary key and
+secondary indexes (see `tidy_tweet.database.build_indexes`), and streamed out in
+batches, so exports of large databases use a bounded amount of memory. Writing
+Parquet needs the optional pyarrow package: pip install tidy_tweet[parquet]
+"""
+
+import csv
+import sqlite3
+from itertools import islice
+from logging import getLogger
+from os import PathLike
+from typing import IO, Iterator, List, Optional, Sequence, Tuple, Union
+
+import tidy_tweet.shards as shards
+
+logger = getLogger(__name__)
+
+
+# Interactions from one user (the author of a tweet) to another:
+#  - retweet: to the author of the retweeted tweet
+#  - quote: to the author of the quoted tweet
+#  - reply: to the user replied to
+#  - mention: to each user mentioned in the tweet's text
+INTERACTIONS = ["retweet", "quote", "reply", "mention"]
+
+# The length of the prefix of an ISO 8601 timestamp giving each time window
+WINDOWS = {"day": 10, "month": 7, "year": 4}
+
+EDGE_COLUMNS = [
+    "interaction",
+    "window",
+    "source_user_id",
+    "source_username",
+    "target_user_id",
+    "target_username",
+    "weight",
+]
+
+
+def _latest_username(user_id: str) -> str:
+    return f"""(
+        select username
+        from user_by_page
+        left join results_page on
+            user_by_page.source_page = results_page.page
+            and user_by_page.file_id = results_page.file_id
+        where user_by_page.id = {user_id}
+        order by retrieved_at desc
+        limit 1
+    )"""
+
+
+# The source user, target user and creation time of each tweet with an interaction,
+# counting each tweet once however many pages it was seen on. Targets which aren't
+# in the database have a null id, and also a null username apart from mentions.
+_referenced_author = """
+select
+    tweet.author_id as source_id,
+    (
+        select author_id from tweet_by_page as referenced
+        where referenced.id = tweet.referenced_id
+    ) as target_id,
+    null as target_username,
+    tweet.created_at
+from (
+    select id, author_id, created_at, {column} as referenced_id
+    from tweet_by_page
+    where {column} is not null
+    group by id
+) as tweet
+"""
+_interaction_sql = {
+    "retweet": _referenced_author.format(column="retweeted_tweet_id"),
+    "quote": _referenced_author.format(column="quoted_tweet_id"),
+    "reply": """
+select
+    author_id as source_id,
+    in_reply_to_user_id as target_id,
+    null as target_username,
+    created_at
+from tweet_by_page
+where in_reply_to_user_id is not null
+group by id
+""",
+    # Usernames are case-insensitive, and the user with a username is the one who
+    # most recently had it
+    "mention": """
+select
+    (
+        select author_id from tweet_by_page where id = mention.tweet_id
+    ) as source_id,
+    (
+        select user_by_page.id
+        from user_by_page
+        left join results_page on
+            user_by_page.source_page = results_page.page
+            and user_by_page.file_id = results_page.file_id
+        where user_by_page.username = mention.username collate nocase
+        order by retrieved_at desc
+        limit 1
+    ) as target_id,
+    mention.username as target_username,
+    (
+        select created_at from tweet_by_page where id = mention.tweet_id
+    ) as created_at
+from (
+    select tweet_id, lower(username) as username
+    from tweet_mention
+    group by tweet_id, lower(username)
+) as mention
+""",
+}
+
+
+def _connect_shards(
+    catalogue: Union[str, PathLike], start: Optional[str], end: Optional[str]
+) -> sqlite3.Connection:
+    """
+    Opens a sharded database with only the shards which can hold tweets created from
+    `start` to `end` attached. Tweets can't be retrieved before they were created, so
+    if pages are sharded by when they were retrieved, that is every shard from
+    `start` on.
+    """
+    if shards.SHARD_KEYS[shards.shard_key(catalogue)][0] == "retrieved":
+        end = None
+    return shards.connect(catalogue, start, end)
+
+
+def _edges_sql(interaction: str, window: Optional[str]) -> str:
+    window_sql = (
+        "null" if window is None else f"substr(created_at, 1, {WINDOWS[window]})"
+    )
+    return f"""
+select
+    '{interaction}',
+    time_window,
+    source_id,
+    {_latest_username("edge.source_id")},
+    target_id,
+    coalesce({_latest_username("edge.target_id")}, target_username),
+    weight
+from (
+    select
+        {window_sql} as time_window,
+        source_id,
+        target_id,
+        target_username,
+        count(*) as weight
+    from ({_interaction_sql[interaction]}) as interaction
+    where
+        source_id is not null
+        and (target_id is not null or target_username is not null)
+        and (:start is null or substr(created_at, 1, length(:start)) >= :start)
+        and (:end is null or substr(created_at, 1, length(:end)) <= :end)
+    group by time_window, source_id, target_id, target_username
+) as edge
+"""
+
+
+def iter_edges(
+    db: Union[str, PathLike, sqlite3.Connection],
+    interactions: Sequence[str] = INTERACTIONS,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    window: Optional[str] = None,
+) -> Iterator[Tuple]:
+    """
+    The edges of the interaction networks in a database, as tuples of the values of
+    `EDGE_COLUMNS`. There is an edge for each interaction type, source user and
+    target user (and time window) which had any interactions, weighted by the number
+    of tweets with that interaction. Edges are grouped by interaction type, in the
+    order given.
+
+    :param db: The path to a tidy_tweet database, which may be sharded, or a
+    connection to one
+    :param interactions: Which of the `INTERACTIONS` to include
+    :param start: Only include tweets created from this ISO 8601 date, or prefix of
+    one such as "2021-10"
+    :param end: Only include tweets created up to and including this ISO 8601 date,
+    or prefix of one
+    :param window: One of the `WINDOWS`, to count interactions per day, month or year
+    of when tweets were created, or None to count them over the whole time
+
+    Only the shards of a sharded database which can hold tweets created from `start`
+    to `end` are read, so give a range if there are more shards than SQLite can
+    attach at once (see `tidy_tweet.shards.connect`). Retweeted and quoted tweets,
+    and users, which are only in other shards have no target id or username.
+
+    Unknown options, and sharded databases with too many shards in the range, raise
+    a ValueError when this is called rather than when the edges are first read.
+    """
+    for interaction in interactions:
+        if interaction not in INTERACTIONS:
+            raise ValueError(
+                f"Unknown interaction {interaction!r}, expected one of "
+                f"{', '.join(INTERACTIONS)}"
+            )
+    if window is not None and window not in WINDOWS:
+        raise ValueError(
+            f"Unknown window {window!r}, expected one of {', '.join(WINDOWS)}"
+        )
+
+    if isinstance(db, sqlite3.Connection):
+        conn = db
+    elif shards.is_sharded(db):
+        conn = _connect_shards(db, start, end)
+    else:
+        conn = sqlite3.connect(db)
+    return _iter_edges(conn, conn is not db, interactions, start, end, window)
+
+
+def _iter_edges(
+    conn: sqlite3.Connection,
+    close: bool,
+    interactions: Sequence[str],
+    start: Optional[str],
+    end: Optional[str],
+    window: Optional[str],
+) -> Iterator[Tuple]:
+    try:
+        for interaction in interactions:
+            logger.info(f"Exporting {interaction} edges")
+            cursor = conn.execute(
+                _edges_sql(interaction, window), {"start": start, "end": end}
+            )
+            yield from cursor
+    finally:
+        if close:
+            conn.close()
+
+
+def write_csv(edges: Iterator[Tuple], fh: IO[str]) -> int:
+    """
+    Writes edges from `iter_edges` to a CSV file opened with newline="", returning
+    the number of edges written.
+    """
+    writer = csv.writer(fh)
+    writer.writerow(EDGE_COLUMNS)
+    n = 0
+    for edge in edges:
+        writer.writerow(edge)
+        n = n + 1
+    return n
+
+
+def write_parquet(
+    edges: Iterator[Tuple], path: Union[str, PathLike], batch_size: int = 100000
+) -> int:
+    """
+    Writes edges from `iter_edges` to a Parquet file, a row group of up to
+    `batch_size` edges at a time, returning the number of edges written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            (name, pa.int64() if name == "weight" else pa.string())
+            for name in EDGE_COLUMNS
+        ]
+    )
+    n = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        while True:
+            batch: List[Tuple] = list(islice(edges, batch_size))
+            if not batch:
+                break
+            columns = [list(column) for column in zip(*batch)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            n = n + len(batch)
+    return n
+
+
+def export_network(
+    db: Union[str, PathLike, sqlite3.Connection],
+    output: Union[str, PathLike],
+    file_format: str = "csv",
+    **edge_options,
+) -> int:
+    """
+    Writes the interaction networks in a database to a CSV or Parquet file of
+    `EDGE_COLUMNS`, returning the number of edges written.
+
+    :param db: The path to a tidy_tweet database, or a connection to one
+    :param output: The file to write
+    :param file_format: "csv" or "parquet"
+    :param edge_options: Which interactions and times to include, see `iter_edges`
+    """
+    edges = iter_edges(db, **edge_options)
+    if file_format == "parquet":
+        return write_parquet(edges, output)
+    elif file_format == "csv":
+        with open(output, "w", newline="", encoding="utf-8") as fh:
+            return write_csv(edges, fh)
+    raise ValueError(f"Unknown file format {file_format!r}, expected csv or parquet")
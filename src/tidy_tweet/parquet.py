@@ -0,0 +1,426 @@
+"""
+Writes the tidy_tweet tables as a Parquet dataset instead of an SQLite database, for
+analysis with columnar tools such as pyarrow, pandas, polars or DuckDB.
+
+This needs the optional pyarrow package: pip install tidy_tweet[parquet]
+"""
+
+import os
+from concurrent.futures import Executor
+from itertools import count
+from logging import getLogger
+from os import PathLike
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+from urllib.parse import quote
+from uuid import uuid4
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import tidy_tweet.tweet_mapping as mapping
+from tidy_tweet.processing import (
+    PageParsingError,
+    _map_page,
+    _map_pages,
+    _map_pages_in_parallel,
+)
+from tidy_tweet.reading import get_json_decoder, open_json_lines
+
+logger = getLogger(__name__)
+
+
+# Ways the rows of each table can be split into partitions:
+#  - source_file: the file the page of results was loaded from
+#  - retrieved_month: the month the page of results was retrieved from Twitter
+#  - created_month: the month tweets were created, for tweets and their entities,
+#    and otherwise the month the page was retrieved
+PARTITION_KEYS = ["source_file", "retrieved_month", "created_month"]
+
+# Tables which are never partitioned, as their rows are not about pages of results
+_UNPARTITIONED_TABLES = ["source_file"]
+
+# The directory name pyarrow gives partitions with no value
+_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+_ARROW_TYPES = {"text": pa.string(), "integer": pa.int64()}
+
+# Tables whose rows belong to a tweet, and the column with the tweet's id
+_TWEET_ID_COLUMNS = {
+    "tweet_by_page": "id",
+    "tweet_url": "tweet_id",
+    "tweet_hashtag": "tweet_id",
+    "tweet_mention": "tweet_id",
+}
+
+
+def arrow_schema(table_name: str) -> pa.Schema:
+    """
+    The Arrow schema of a tidy_tweet table. Columns which hold booleans are stored as
+    booleans, rather than as integers as in SQLite.
+    """
+    fields = []
+    for column in mapping.column_definitions_by_table[table_name]:
+        if column.comment == "boolean":
+            arrow_type = pa.bool_()
+        else:
+            arrow_type = _ARROW_TYPES[column.type]
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _convert(value, arrow_type: pa.DataType):
+    """
+    Converts a value to the type of its column, as SQLite's type affinity would.
+    """
+    if value is None:
+        return None
+    elif arrow_type == pa.string():
+        return str(int(value)) if isinstance(value, bool) else str(value)
+    elif arrow_type == pa.bool_():
+        return bool(value)
+    else:
+        return int(value)
+
+
+def _to_arrow(values: Sequence, arrow_type: pa.DataType) -> pa.Array:
+    try:
+        return pa.array(values, arrow_type)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        return pa.array([_convert(value, arrow_type) for value in values], arrow_type)
+
+
+def _month(timestamp: Optional[str]) -> Optional[str]:
+    # ISO 8601 timestamps, such as 2021-10-06T06:02:02+00:00
+    return timestamp[:7] if timestamp else None
+
+
+class ParquetLoader:
+    """
+    A session for loading twarc json files into a Parquet dataset.
+
+    The dataset is a directory with a subdirectory for each tidy_tweet table, split
+    into a subdirectory for each value of the `partition_by` key, in the Hive layout
+    pyarrow and other tools read partitioned datasets from::
+
+        my_dataset/tweet_by_page/source_file=search_1.jsonl/part-....parquet
+
+    Rows are buffered and written in row groups of `row_group_size` rows, and at most
+    `max_buffered_rows` rows are held in memory at a time. Each file loaded is
+    written to new Parquet files, so loading adds to an existing dataset without
+    rewriting it. Parquet files are hidden until the json file they are loaded from
+    has been completely loaded, so an interrupted load leaves no partial data behind.
+
+    Unlike SQLite, the dataset has no keys or constraints: every row mapped from the
+    json is kept, as with `tidy_tweet.iter_tidy_rows`, and the tweet and user views
+    are not created. The loader numbers files on from the ids already in the
+    dataset's `source_file` table, so only one loader should add to a dataset at a
+    time.
+
+    Use as a context manager::
+
+        with ParquetLoader("my_dataset", partition_by="created_month") as loader:
+            loader.load_file("search_1.jsonl")
+            loader.load_file("search_2.jsonl")
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, PathLike],
+        partition_by: Optional[str] = "source_file",
+        row_group_size: int = 100_000,
+        max_buffered_rows: int = 1_000_000,
+        json_encoding: str = None,
+        executor: Executor = None,
+        json_decoder: str = "auto",
+    ):
+        """
+        :param directory: The directory of the dataset, which is created if it does
+        not exist
+        :param partition_by: One of `PARTITION_KEYS`, or None to not partition
+        :param row_group_size: The number of rows in each Parquet row group
+        :param max_buffered_rows: Write every partly filled row group once this many
+        rows are buffered in total
+        :param json_encoding: The text encoding of the files, if not UTF-8
+        :param executor: Optionally, a `concurrent.futures.ProcessPoolExecutor` to
+        decode and map pages in
+        :param json_decoder: The json decoder to use, see
+        `tidy_tweet.reading.get_json_decoder`
+        """
+        if partition_by is not None and partition_by not in PARTITION_KEYS:
+            raise ValueError(
+                f"Unknown partition key {partition_by!r}, expected None or one of "
+                f"{', '.join(PARTITION_KEYS)}"
+            )
+        self.directory = Path(directory)
+        self.partition_by = partition_by
+        self.row_group_size = row_group_size
+        self.max_buffered_rows = max_buffered_rows
+        self.json_encoding = json_encoding
+        self.executor = executor
+        self.json_decoder = json_decoder
+        self._decode = get_json_decoder(json_decoder)
+
+        # Parquet files are named uniquely, so separate sessions never overwrite
+        # each other's files
+        session = uuid4().hex
+        self._file_names = (f"part-{session}-{n}.parquet" for n in count())
+        self._buffers: Dict[Tuple[str, Optional[str]], List[Tuple]] = {}
+        self._buffered_rows = 0
+        # Open Parquet files, by table and partition, with their final paths
+        self._writers: Dict[Tuple[str, Optional[str]], pq.ParquetWriter] = {}
+        self._unfinished: List[Tuple[Path, Path]] = []
+        # The id of each file in the source_file table, and the files given an id
+        # since the last finished file
+        self._file_ids: Dict[str, int] = self._read_file_ids()
+        self._unfinished_file_names: List[str] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def _read_file_ids(self) -> Dict[str, int]:
+        source_file_directory = self.directory / "source_file"
+        if not source_file_directory.exists():
+            return {}
+        source_files = pq.read_table(
+            source_file_directory, columns=["file_name", "file_id"]
+        ).to_pydict()
+        return dict(zip(source_files["file_name"], source_files["file_id"]))
+
+    def file_id(self, file_name: str) -> int:
+        """
+        The id which the pages of a file are recorded with, adding the file to the
+        `source_file` table with the next unused id if it isn't there yet.
+        """
+        if file_name not in self._file_ids:
+            file_id = max(self._file_ids.values(), default=0) + 1
+            self._file_ids[file_name] = file_id
+            self._unfinished_file_names.append(file_name)
+            self._buffers.setdefault(("source_file", None), []).append(
+                (file_id, file_name)
+            )
+            self._buffered_rows = self._buffered_rows + 1
+        return self._file_ids[file_name]
+
+    def _partition_rows(
+        self, file_name: str, page_mappings: Dict[str, List]
+    ) -> Iterator[Tuple[str, Optional[str], List[Tuple]]]:
+        """
+        Splits a page's rows by partition, giving the table, partition value and rows
+        of each.
+        """
+        if self.partition_by is None:
+            for table, rows in page_mappings.items():
+                yield table, None, rows
+            return
+        elif self.partition_by == "source_file":
+            for table, rows in page_mappings.items():
+                yield table, file_name, rows
+            return
+
+        retrieved_at = mapping.columns_by_table["results_page"].index("retrieved_at")
+        page_month = _month(page_mappings["results_page"][0][retrieved_at])
+        if self.partition_by == "retrieved_month":
+            for table, rows in page_mappings.items():
+                yield table, page_month, rows
+            return
+
+        tweet_columns = mapping.columns_by_table["tweet_by_page"]
+        tweet_id = tweet_columns.index("id")
+        created_at = tweet_columns.index("created_at")
+        tweet_months = {
+            row[tweet_id]: _month(row[created_at])
+            for row in page_mappings.get("tweet_by_page", [])
+        }
+        for table, rows in page_mappings.items():
+            if table not in _TWEET_ID_COLUMNS:
+                yield table, page_month, rows
+                continue
+            id_column = mapping.columns_by_table[table].index(_TWEET_ID_COLUMNS[table])
+            by_month: Dict[Optional[str], List[Tuple]] = {}
+            for row in rows:
+                month = tweet_months.get(row[id_column], page_month)
+                by_month.setdefault(month, []).append(row)
+            for month, month_rows in by_month.items():
+                yield table, month, month_rows
+
+    def add_page(self, file_name: str, page_num: int, page_json: Mapping):
+        """
+        Maps a page of twarc Twitter API results and buffers it for writing to the
+        dataset.
+
+        :param file_name: The file name to record as the source of the page
+        :param page_num: The page number to record for the page
+        :param page_json: A dictionary (such as parsed json) of a single page of API
+        results
+        """
+        try:
+            page_mappings = _map_page(self.file_id(file_name), page_num, page_json)
+        except Exception as e:
+            raise PageParsingError(file_name, page_num) from e
+        self._add_mappings(file_name, page_mappings)
+
+    def _add_mappings(self, file_name: str, page_mappings: Dict[str, List]):
+        for table, value, rows in self._partition_rows(file_name, page_mappings):
+            if len(rows) == 0:
+                continue
+            buffer = self._buffers.setdefault((table, value), [])
+            buffer.extend(rows)
+            self._buffered_rows = self._buffered_rows + len(rows)
+            while len(buffer) >= self.row_group_size:
+                self._write(table, value, buffer[: self.row_group_size])
+                del buffer[: self.row_group_size]
+                self._buffered_rows = self._buffered_rows - self.row_group_size
+
+        if self._buffered_rows >= self.max_buffered_rows:
+            self.flush()
+
+    def _write(self, table: str, value: Optional[str], rows: List[Tuple]):
+        writer = self._writers.get((table, value))
+        if writer is None:
+            table_directory = self.directory / table
+            if self.partition_by is not None and table not in _UNPARTITIONED_TABLES:
+                value_name = _NULL_PARTITION if value is None else quote(value, safe="")
+                table_directory = table_directory / f"{self.partition_by}={value_name}"
+            table_directory.mkdir(parents=True, exist_ok=True)
+            path = table_directory / next(self._file_names)
+            # Hidden from readers until finished, see _finish
+            hidden_path = path.with_name("." + path.name)
+            writer = pq.ParquetWriter(hidden_path, arrow_schema(table))
+            self._writers[(table, value)] = writer
+            self._unfinished.append((hidden_path, path))
+
+        schema = writer.schema
+        arrays = [
+            _to_arrow(values, field.type) for values, field in zip(zip(*rows), schema)
+        ]
+        writer.write_table(
+            pa.Table.from_arrays(arrays, schema=schema),
+            row_group_size=self.row_group_size,
+        )
+
+    def flush(self):
+        """
+        Writes all buffered rows to the dataset, as row groups which may be smaller
+        than `row_group_size`.
+        """
+        for (table, value), rows in self._buffers.items():
+            if rows:
+                self._write(table, value, rows)
+        self._buffers = {}
+        self._buffered_rows = 0
+
+    def _finish(self):
+        """
+        Writes all buffered rows and closes the Parquet files written to, making them
+        visible in the dataset.
+        """
+        self.flush()
+        for writer in self._writers.values():
+            writer.close()
+        for hidden_path, path in self._unfinished:
+            os.replace(hidden_path, path)
+        self._writers = {}
+        self._unfinished = []
+        self._unfinished_file_names = []
+
+    def _discard(self):
+        """
+        Throws away everything buffered or written since the last finished file.
+        """
+        for writer in self._writers.values():
+            writer.close()
+        for hidden_path, _ in self._unfinished:
+            hidden_path.unlink()
+        for file_name in self._unfinished_file_names:
+            del self._file_ids[file_name]
+        self._buffers = {}
+        self._buffered_rows = 0
+        self._writers = {}
+        self._unfinished = []
+        self._unfinished_file_names = []
+
+    def load_file(self, filename: Union[str, PathLike]) -> int:
+        """
+        Parses a json/jsonl file produced by a Twarc search and adds the Twitter data
+        to the dataset. Nothing from the file is visible in the dataset until it has
+        been completely loaded.
+
+        :param filename: The path to a json/jsonl file of Twitter data. The file is
+        expected to be in the format of the results of a Twarc search.
+        :return: The number of pages of Twitter results loaded from this file
+        """
+        file_name = str(filename)
+        # Anything added with add_page before this file stays separate from it
+        self._finish()
+
+        try:
+            with open_json_lines(filename, self.json_encoding) as json_lines:
+                logger.info(f"Loading {filename} into {self.directory}")
+                file_id = self.file_id(file_name)
+                if self.executor is None:
+                    mapped_pages = _map_pages(
+                        file_name, file_id, json_lines, self._decode
+                    )
+                else:
+                    mapped_pages = _map_pages_in_parallel(
+                        file_name, file_id, json_lines, self.json_decoder, self.executor
+                    )
+
+                pages_loaded = 0
+                for page_num, _, page_mappings in mapped_pages:
+                    logger.info(f"Processing page {page_num} of {file_name}")
+                    self._add_mappings(file_name, page_mappings)
+                    pages_loaded = pages_loaded + 1
+        except Exception:
+            self._discard()
+            raise
+
+        self._finish()
+        logger.info(f"All {pages_loaded} pages of {filename} processed")
+        return pages_loaded
+
+    def close(self):
+        """
+        Writes anything outstanding and closes all Parquet files.
+        """
+        self._finish()
+
+
+def load_twarc_json_to_parquet(
+    filename: Union[str, PathLike],
+    directory: Union[str, PathLike],
+    partition_by: Optional[str] = "source_file",
+    row_group_size: int = 100_000,
+    json_encoding: str = None,
+    json_decoder: str = "auto",
+) -> int:
+    """
+    Parses a json/jsonl file produced by a Twarc search and adds the Twitter data to
+    a Parquet dataset, see `ParquetLoader`.
+
+    :param filename: The path to a json/jsonl file of Twitter data. The file is expected
+    to be in the format of the results of a Twarc search.
+    :param directory: The directory of the dataset, which is created if it does not
+    exist
+    :param partition_by: One of `PARTITION_KEYS`, or None to not partition
+    :param row_group_size: The number of rows in each Parquet row group
+    :param json_encoding: The text encoding of the file, if not UTF-8
+    :param json_decoder: The json decoder to use, see
+    `tidy_tweet.reading.get_json_decoder`
+    :return: The number of pages of Twitter results loaded in this file
+    """
+    with ParquetLoader(
+        directory,
+        partition_by=partition_by,
+        row_group_size=row_group_size,
+        json_encoding=json_encoding,
+        json_decoder=json_decoder,
+    ) as loader:
+        return loader.load_file(filename)
@@ -1,43 +1,73 @@
-import sqlite3
-import json
-from typing import Union, Mapping
-from os import PathLike
+from collections import deque
+from concurrent.futures import Executor, Future
+from functools import partial
+from itertools import count, islice
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Union,
+    Mapping,
+    Dict,
+    List,
+    Iterable,
+    Iterator,
+    Tuple,
+    Optional,
+)
+from os import PathLike, cpu_count
+from time import perf_counter
 import tidy_tweet.tweet_mapping as mapping
 from logging import getLogger
 from tidy_tweet.utilities import add_mappings
+from tidy_tweet.reading import (
+    FollowedJsonLines,
+    JsonLine,
+    file_fingerprint,
+    get_json_decoder,
+    open_json_lines,
+    open_json_stream,
+    reads_as_bytes,
+)
+from tidy_tweet.database import SQLiteSink
+from tidy_tweet.sinks import Sink
+from tidy_tweet.stats import LoadStats, Stats
 
 logger = getLogger(__name__)
 
+# The page number, byte offset of the end of the page in its file (if known) and
+# mapped rows of a page
+MappedPage = Tuple[int, Optional[int], Dict[str, List]]
 
-def _load_page_object(
-    file_name: str, page_num: int, page_json: Mapping, connection: sqlite3.Connection
-):
-    """
-    Takes a page of twarc Twitter API results and loads it into the database.
+# Approximate number of characters of json sent to a worker process at a time when
+# loading in parallel
+_PARALLEL_CHUNK_SIZE = 1_000_000
 
-    If using this function to parse Twitter data from an object direct from Twarc
-    without saving the JSON Twarc output, we recommend you save the raw data Twarc json
-    output by some other means.
 
-    :param page_json: A dictionary (such as parsed json) of a single page of API results
-    :param connection: An sqlite3 Connection object
+def _map_page(file_id: int, page_num: int, page_json: Mapping) -> Dict[str, List]:
     """
-    db = connection.cursor()
+    Takes a page of twarc Twitter API results and maps it into rows for each of the
+    tidy_tweet tables, without touching the database.
+
+    This only relies on the arguments given, so it is safe to run in a worker
+    process.
 
+    :param file_id: The id of the file the page is from, see
+    `tidy_tweet.sinks.Sink.file_id`
+    :return: A dictionary from table name to a list of rows for that table
+    """
     mappings = {}
 
     # Metadata
     logger.debug("Processing metadata section of page")
-    twitter_metadata = page_json.get("meta", {})
-    twarc_metadata = page_json.get("__twarc", {})
-    # Write this first so we can get the page id
-    db.execute(
-        mapping.sql_by_table["results_page"]["insert"],
-        mapping.map_page_metadata(
-            file_name, page_num, twitter_metadata, twarc_metadata
-        ),
-    )
-    page_info = (file_name, page_num)
+    # Copied, as mapping the metadata consumes it
+    twitter_metadata = dict(page_json.get("meta", {}))
+    twarc_metadata = dict(page_json.get("__twarc", {}))
+    # Map this first so it is written before the rows which reference the page
+    mappings["results_page"] = [
+        mapping.map_page_metadata(file_id, page_num, twitter_metadata, twarc_metadata)
+    ]
+    page_info = (file_id, page_num)
 
     # Includes
     logger.debug("Processing includes section of page")
@@ -68,22 +98,779 @@ def _load_page_object(
     for tweet in tweets:
         add_mappings(mappings, mapping.map_tweet(tweet, True, *page_info))
 
+    return mappings
+
+
+def _write_mappings(mappings: Dict[str, List], sink: Sink):
+    """
+    Writes rows produced by `_map_page` to the database.
+    """
     logger.debug(f"About to write to {len(mappings)} tables")
     for table, table_mappings in mappings.items():
         if len(table_mappings) == 0:
             continue
-        elif not isinstance(table_mappings, list):
-            db.execute(mapping.sql_by_table[table]["insert"], table_mappings)
-        else:
-            db.executemany(mapping.sql_by_table[table]["insert"], table_mappings)
+        sink.append(table, table_mappings)
 
     logger.debug("Finished writing page to database.")
 
 
+def _load_page_object(file_name: str, page_num: int, page_json: Mapping, sink: Sink):
+    """
+    Takes a page of twarc Twitter API results and loads it into the database.
+
+    If using this function to parse Twitter data from an object direct from Twarc
+    without saving the JSON Twarc output, we recommend you save the raw data Twarc json
+    output by some other means.
+
+    :param page_json: A dictionary (such as parsed json) of a single page of API results
+    :param sink: The database to load into
+    """
+    _write_mappings(_map_page(sink.file_id(file_name), page_num, page_json), sink)
+
+
+def _map_page_lines(
+    file_name: str,
+    file_id: int,
+    first_page_num: int,
+    lines: List[JsonLine],
+    json_decoder: str,
+    timed: bool = False,
+) -> Union[List[Dict[str, List]], Tuple[List[Dict[str, List]], float, float]]:
+    """
+    Decodes and maps a chunk of consecutive lines of a twarc json file. This is the
+    unit of work sent to worker processes when loading in parallel.
+
+    :param json_decoder: The name of the decoder to use, see `get_json_decoder`
+    :param timed: Also return the seconds spent decoding and mapping the chunk
+    """
+    decode = get_json_decoder(json_decoder)
+    chunk_mappings = []
+    if not timed:
+        for page_num, page in enumerate(lines, start=first_page_num):
+            try:
+                chunk_mappings.append(_map_page(file_id, page_num, decode(page)))
+            except Exception as e:
+                raise PageParsingError(file_name, page_num) from e
+        return chunk_mappings
+
+    decode_seconds = 0.0
+    map_seconds = 0.0
+    for page_num, page in enumerate(lines, start=first_page_num):
+        try:
+            start = perf_counter()
+            page_json = decode(page)
+            decoded = perf_counter()
+            chunk_mappings.append(_map_page(file_id, page_num, page_json))
+            mapped = perf_counter()
+        except Exception as e:
+            raise PageParsingError(file_name, page_num) from e
+        decode_seconds = decode_seconds + decoded - start
+        map_seconds = map_seconds + mapped - decoded
+    return chunk_mappings, decode_seconds, map_seconds
+
+
+def _timed_lines(
+    json_lines: Iterable[Tuple[JsonLine, Optional[int]]], stats: Stats
+) -> Iterator[Tuple[JsonLine, Optional[int]]]:
+    """
+    Passes through the lines of a file, recording the time spent reading them and
+    their size in `stats`.
+    """
+    lines = iter(json_lines)
+    while True:
+        start = perf_counter()
+        try:
+            line, offset = next(lines)
+        except StopIteration:
+            stats.seconds["read"] = stats.seconds["read"] + perf_counter() - start
+            return
+        stats.seconds["read"] = stats.seconds["read"] + perf_counter() - start
+        stats.bytes_read = stats.bytes_read + len(line)
+        yield line, offset
+
+
+def _chunk_lines(
+    json_lines: Iterable[Tuple[JsonLine, Optional[int]]], first_page_num: int
+) -> Iterator[Tuple[int, List[JsonLine], List[Optional[int]]]]:
+    """
+    Groups the lines of a file into chunks of roughly `_PARALLEL_CHUNK_SIZE`
+    characters, yielding the page number of the first line in each chunk along with
+    the lines and their end offsets.
+    """
+    chunk = []
+    offsets = []
+    chunk_size = 0
+    for page_num, (line, offset) in enumerate(json_lines, start=first_page_num):
+        chunk.append(line)
+        offsets.append(offset)
+        chunk_size = chunk_size + len(line)
+        if chunk_size >= _PARALLEL_CHUNK_SIZE:
+            yield first_page_num, chunk, offsets
+            chunk = []
+            offsets = []
+            chunk_size = 0
+            first_page_num = page_num + 1
+    if chunk:
+        yield first_page_num, chunk, offsets
+
+
+def _map_pages_in_parallel(
+    file_name: str,
+    file_id: int,
+    json_lines: Iterable[Tuple[JsonLine, Optional[int]]],
+    json_decoder: str,
+    executor: Executor,
+    first_page_num: int = 1,
+    stats: Optional[Stats] = None,
+) -> Iterator[MappedPage]:
+    """
+    Decodes and maps the pages of a file using `executor`, yielding the page number,
+    end offset and mapped rows of each page in file order.
+
+    Only a few chunks per worker are kept in flight at once, so memory use does not
+    grow with the size of the file.
+
+    :param stats: If given, the time spent reading, waiting for workers and in the
+    workers decoding and mapping is added to these stats
+    """
+    max_in_flight = 2 * (getattr(executor, "_max_workers", None) or cpu_count() or 1)
+    in_flight = deque()
+    if stats is not None:
+        json_lines = _timed_lines(json_lines, stats)
+
+    for chunk_page_num, lines, offsets in _chunk_lines(json_lines, first_page_num):
+        in_flight.append(
+            (
+                chunk_page_num,
+                offsets,
+                executor.submit(
+                    _map_page_lines,
+                    file_name,
+                    file_id,
+                    chunk_page_num,
+                    lines,
+                    json_decoder,
+                    stats is not None,
+                ),
+            )
+        )
+        while len(in_flight) >= max_in_flight:
+            yield from _completed_chunk(*in_flight.popleft(), stats)
+
+    while in_flight:
+        yield from _completed_chunk(*in_flight.popleft(), stats)
+
+
+def _completed_chunk(
+    first_page_num: int,
+    offsets: List[Optional[int]],
+    future: Future,
+    stats: Optional[Stats] = None,
+) -> Iterator[MappedPage]:
+    if stats is None:
+        chunk_mappings = future.result()
+    else:
+        start = perf_counter()
+        chunk_mappings, decode_seconds, map_seconds = future.result()
+        stats.seconds["wait"] = stats.seconds["wait"] + perf_counter() - start
+        stats.seconds["decode"] = stats.seconds["decode"] + decode_seconds
+        stats.seconds["map"] = stats.seconds["map"] + map_seconds
+
+    for page_num, offset, page_mappings in zip(
+        count(first_page_num), offsets, chunk_mappings
+    ):
+        yield page_num, offset, page_mappings
+
+
+def _map_pages(
+    file_name: str,
+    file_id: int,
+    json_lines: Iterable[Tuple[JsonLine, Optional[int]]],
+    decode: Callable[[JsonLine], Any],
+    first_page_num: int = 1,
+    stats: Optional[Stats] = None,
+) -> Iterator[MappedPage]:
+    """
+    Decodes and maps the pages of a file in this process, yielding the page number,
+    end offset and mapped rows of each page.
+
+    :param stats: If given, the time spent reading, decoding and mapping is added to
+    these stats
+    """
+    if stats is None:
+        for page_num, (page, offset) in enumerate(json_lines, start=first_page_num):
+            try:
+                yield page_num, offset, _map_page(file_id, page_num, decode(page))
+            except Exception as e:
+                raise PageParsingError(file_name, page_num) from e
+        return
+
+    json_lines = _timed_lines(json_lines, stats)
+    for page_num, (page, offset) in enumerate(json_lines, start=first_page_num):
+        try:
+            start = perf_counter()
+            page_json = decode(page)
+            decoded = perf_counter()
+            page_mappings = _map_page(file_id, page_num, page_json)
+            mapped = perf_counter()
+        except Exception as e:
+            raise PageParsingError(file_name, page_num) from e
+        stats.seconds["decode"] = stats.seconds["decode"] + decoded - start
+        stats.seconds["map"] = stats.seconds["map"] + mapped - decoded
+        yield page_num, offset, page_mappings
+
+
+def iter_tidy_rows(
+    pages: Union[str, PathLike, Iterable[Mapping]],
+    file_name: str = None,
+    json_encoding: str = None,
+    json_decoder: str = "auto",
+    file_id: int = 1,
+) -> Iterator[Tuple[str, List[Tuple]]]:
+    """
+    Tidies pages of twarc Twitter API results into rows, without touching a database.
+
+    Pages are read and tidied lazily, one at a time, so memory use does not depend on
+    the size of the file. For each page, a `(table_name, rows)` pair is yielded for
+    each table the page has rows for. Each row is a tuple of values for the columns
+    `tidy_tweet.tweet_mapping.columns_by_table[table_name]`. The first pair is the
+    `source_file` row giving the file name for the `file_id` of the other rows.
+
+    Example::
+
+        for table, rows in iter_tidy_rows("search.jsonl"):
+            columns = columns_by_table[table]
+            ...
+
+    :param pages: The path to a json/jsonl file of Twitter data produced by Twarc, or
+    an iterable of pages of results (such as parsed json) from Twarc.
+    :param file_name: The file name recorded as the source of each page. Defaults to
+    the path of the file, or to "<pages>" if pages are given directly.
+    :param json_encoding: The text encoding of the file, if not UTF-8
+    :param json_decoder: The json decoder to use, see
+    `tidy_tweet.reading.get_json_decoder`
+    :param file_id: The id to record for the file
+    """
+    if isinstance(pages, (str, PathLike)):
+        file_name = file_name or str(pages)
+        yield "source_file", [(file_id, file_name)]
+        decode = get_json_decoder(json_decoder)
+        with open_json_lines(pages, json_encoding) as json_fh:
+            for _, _, page_mappings in _map_pages(file_name, file_id, json_fh, decode):
+                yield from _nonempty_tables(page_mappings)
+    else:
+        file_name = file_name or "<pages>"
+        yield "source_file", [(file_id, file_name)]
+        for page_num, page_json in enumerate(pages, start=1):
+            try:
+                page_mappings = _map_page(file_id, page_num, page_json)
+            except Exception as e:
+                raise PageParsingError(file_name, page_num) from e
+            yield from _nonempty_tables(page_mappings)
+
+
+def _nonempty_tables(page_mappings: Dict[str, List]) -> Iterator[Tuple[str, List]]:
+    for table, rows in page_mappings.items():
+        if len(rows) > 0:
+            yield table, rows
+
+
+class Loader:
+    """
+    A session for loading twarc json files into a tidy_tweet database.
+
+    The loader keeps one connection to the database open across all the files it
+    loads, so SQLite's cache of prepared insert statements is reused. Mapped rows are
+    buffered across pages and written in a single batch per table once
+    `batch_pages` pages or `batch_rows` rows have accumulated.
+
+    Given the path of an SQLite database, the connection is configured with one of
+    the `tidy_tweet.database.SQLITE_PROFILES` while loading, and durable settings are
+    restored when the loader is closed. Other databases, such as DuckDB, can be
+    loaded into by giving a `tidy_tweet.sinks.Sink` instead.
+
+    Completely loaded files are recorded by their contents, see `find_loaded_file`.
+
+    By default, each file is committed as a single transaction once it has been
+    completely loaded. If `commit_pages` is given, a commit is instead made
+    whenever at least that many pages have been written since the last commit, as
+    well as at the end of each file. Every commit records a checkpoint of the last
+    page committed for each file, so an interrupted load can be resumed with
+    `load_file(filename, resume=True)`.
+
+    If `stats` is true, the time spent in each stage of loading and the rows mapped
+    for each table are recorded per file in `loader.stats`, a
+    `tidy_tweet.stats.LoadStats`.
+
+    Use as a context manager::
+
+        with Loader("my_dataset.db") as loader:
+            loader.load_file("search_1.jsonl")
+            loader.load_file("search_2.jsonl")
+
+    Before using a loader, the database should already have been initialised with
+    the `tidy_tweet.initialise_sqlite()` function (or `Sink.create_schema()`).
+    """
+
+    def __init__(
+        self,
+        db_name: Union[str, PathLike, Sink],
+        json_encoding: str = None,
+        executor: Executor = None,
+        batch_pages: int = 500,
+        batch_rows: int = 100_000,
+        commit_pages: Optional[int] = None,
+        profile: str = "safe",
+        json_decoder: str = "auto",
+        stats: bool = False,
+    ):
+        """
+        :param db_name: The path to an existing sqlite database to load the data
+        into, or a `tidy_tweet.sinks.Sink`, which the loader closes when it is closed
+        :param json_encoding: The text encoding of the files, if not UTF-8
+        :param executor: Optionally, a `concurrent.futures.ProcessPoolExecutor` to
+        decode and map pages in. Pages are still written to the database by the
+        calling process, in file order.
+        :param batch_pages: Write buffered rows once this many pages are buffered
+        :param batch_rows: Write buffered rows once this many rows are buffered
+        :param commit_pages: Commit after at least this many pages have been
+        written, rather than only once per file
+        :param profile: The SQLite settings to load with, "safe" (the default) or
+        "bulk" for faster loading at the risk of corruption if the computer crashes.
+        Ignored if a sink is given.
+        :param json_decoder: The json decoder to use, see
+        `tidy_tweet.reading.get_json_decoder`
+        :param stats: Record timings and row counts in `stats`
+        """
+        self.json_encoding = json_encoding
+        self.executor = executor
+        self.batch_pages = batch_pages
+        self.batch_rows = batch_rows
+        self.commit_pages = commit_pages
+        self.json_decoder = json_decoder
+        self._decode = get_json_decoder(json_decoder)
+
+        if isinstance(db_name, Sink):
+            self.sink = db_name
+        else:
+            self.sink = SQLiteSink(db_name, profile)
+        self.db_name = self.sink.name
+        self.stats: Optional[LoadStats] = LoadStats() if stats else None
+
+        self._buffer: Dict[str, List] = {}
+        self._buffered_pages: List[Tuple[str, int, Optional[int]]] = []
+        self._buffered_rows = 0
+        self._uncommitted_pages = 0
+        # The last page (and its end offset) written for each file since the last
+        # commit
+        self._checkpoints: Dict[str, Tuple[int, Optional[int]]] = {}
+        # The file stats of writes and commits are recorded against
+        self._last_file: Optional[str] = None
+        # The id of each file in the source_file table
+        self._file_ids: Dict[str, int] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.rollback()
+            self.sink.close()
+
+    def add_page(self, file_name: str, page_num: int, page_json: Mapping):
+        """
+        Maps a page of twarc Twitter API results and buffers it for writing to the
+        database.
+
+        If using this method to parse Twitter data from an object direct from Twarc
+        without saving the JSON Twarc output, we recommend you save the raw data Twarc
+        json output by some other means.
+
+        :param file_name: The file name to record as the source of the page
+        :param page_num: The page number to record for the page
+        :param page_json: A dictionary (such as parsed json) of a single page of API
+        results
+        """
+        try:
+            page_mappings = _map_page(self.file_id(file_name), page_num, page_json)
+        except Exception as e:
+            raise PageParsingError(file_name, page_num) from e
+        self._add_mappings(file_name, page_num, None, page_mappings)
+
+    def file_id(self, file_name: str) -> int:
+        """
+        The id which the pages of a file are recorded with, see
+        `tidy_tweet.sinks.Sink.file_id`.
+        """
+        if file_name not in self._file_ids:
+            self._file_ids[file_name] = self.sink.file_id(file_name)
+        return self._file_ids[file_name]
+
+    def _add_mappings(
+        self,
+        file_name: str,
+        page_num: int,
+        end_offset: Optional[int],
+        page_mappings: Dict,
+    ):
+        logger.info(f"Processing page {page_num} of {file_name}")
+        add_mappings(self._buffer, page_mappings)
+        self._buffered_pages.append((file_name, page_num, end_offset))
+        self._buffered_rows = self._buffered_rows + sum(
+            len(rows) for rows in page_mappings.values()
+        )
+        if self.stats is not None:
+            self._last_file = file_name
+            file_stats = self.stats.file(file_name)
+            file_stats.pages = file_stats.pages + 1
+            file_stats.add_rows(page_mappings)
+            if end_offset is not None:
+                file_stats.offset = end_offset
+
+        # Also written once enough pages are waiting to be committed, so commits
+        # happen every `commit_pages` pages however large the batches
+        if (
+            len(self._buffered_pages) >= self.batch_pages
+            or self._buffered_rows >= self.batch_rows
+            or (
+                self.commit_pages is not None
+                and len(self._buffered_pages) + self._uncommitted_pages
+                >= self.commit_pages
+            )
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered rows to the database, with one batch per table.
+
+        If `commit_pages` was given and enough pages have been written since the last
+        commit, this also commits.
+        """
+        if not self._buffered_pages:
+            return
+
+        start = None if self.stats is None else perf_counter()
+        try:
+            _write_mappings(self._buffer, self.sink)
+        except Exception as e:
+            first_file, first_page, _ = self._buffered_pages[0]
+            last_file, last_page, _ = self._buffered_pages[-1]
+            raise PageParsingError(
+                first_file,
+                first_page,
+                last_page_number=last_page if last_file == first_file else None,
+            ) from e
+        if start is not None:
+            self._add_seconds("write", start)
+
+        self._uncommitted_pages = self._uncommitted_pages + len(self._buffered_pages)
+        for file_name, page_num, end_offset in self._buffered_pages:
+            self._checkpoints[file_name] = (page_num, end_offset)
+        self._buffer = {}
+        self._buffered_pages = []
+        self._buffered_rows = 0
+
+        if self.commit_pages is not None and (
+            self._uncommitted_pages >= self.commit_pages
+        ):
+            self.commit()
+
+    def commit(self):
+        """
+        Writes all buffered rows to the database and commits them, along with a
+        checkpoint for each file written to.
+        """
+        self.flush()
+        start = None if self.stats is None else perf_counter()
+        if self._checkpoints:
+            self.sink.append(
+                "load_checkpoint",
+                [
+                    (file_name, page_num, end_offset)
+                    for file_name, (page_num, end_offset) in self._checkpoints.items()
+                ],
+            )
+        self.sink.commit()
+        if start is not None:
+            self._add_seconds("commit", start)
+        self._uncommitted_pages = 0
+        self._checkpoints = {}
+
+    def rollback(self):
+        """
+        Discards everything buffered or written since the last commit.
+        """
+        self._buffer = {}
+        self._buffered_pages = []
+        self._buffered_rows = 0
+        self._uncommitted_pages = 0
+        self._checkpoints = {}
+        # Files may have been added to source_file since the last commit
+        self._file_ids = {}
+        self.sink.rollback()
+
+    def _add_seconds(self, stage: str, start: float):
+        """
+        Adds the time since `start` to a stage of the stats of the file most recently
+        added to.
+        """
+        if self._last_file is None:
+            return
+        file_stats = self.stats.file(self._last_file)
+        file_stats.seconds[stage] = file_stats.seconds[stage] + perf_counter() - start
+
+    def get_checkpoint(self, file_name: str) -> Optional[Tuple[int, Optional[int]]]:
+        """
+        Returns the last page of a file committed to the database, and the byte offset
+        of the end of that page in the file if known, or None if no pages of the file
+        have been committed.
+        """
+        return self.sink.fetch_one(
+            "select page, byte_offset from load_checkpoint where file_name = ?",
+            (file_name,),
+        )
+
+    def find_loaded_file(
+        self, filename: Union[str, PathLike], fingerprint: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Checks whether a file with the same contents as `filename` has already been
+        completely loaded into the database, even under a different name.
+
+        :param fingerprint: The file's `tidy_tweet.reading.file_fingerprint`, if
+        already known, to save reading the file again
+        :return: The name the file was loaded as, or None if it hasn't been loaded
+        """
+        if fingerprint is None:
+            fingerprint = file_fingerprint(filename)
+        result = self.sink.fetch_one(
+            "select file_name from loaded_file where fingerprint = ?", (fingerprint,)
+        )
+        if result is None:
+            return None
+        if result[0] != str(filename):
+            logger.warning(
+                f"{filename} has the same contents as {result[0]}, which has already "
+                "been loaded"
+            )
+        return result[0]
+
+    def load_file(
+        self,
+        filename: Union[str, PathLike],
+        resume: bool = False,
+        fingerprint: Optional[str] = None,
+    ) -> int:
+        """
+        Parses a json/jsonl file produced by a Twarc search and loads the Twitter data
+        into the database. The file is committed once it has been completely loaded,
+        and also every `commit_pages` pages if that was given.
+
+        :param filename: The path to a json/jsonl file of Twitter data. The file is
+        expected to be in the format of the results of a Twarc search.
+        :param resume: If part of this file has previously been committed to the
+        database, continue loading from the page after the last committed page. The
+        file is read from the byte offset of that page if known, rather than from the
+        start.
+        :param fingerprint: The file's `tidy_tweet.reading.file_fingerprint`, if
+        already known, such as from `find_loaded_file`
+        :return: The number of pages of Twitter results loaded from this file by this
+        call
+        """
+        file_name = str(filename)
+        if fingerprint is None:
+            fingerprint = file_fingerprint(filename)
+        first_page_num = 1
+        start_offset = 0
+        if resume:
+            self.commit()
+            checkpoint = self.get_checkpoint(file_name)
+            if checkpoint is not None:
+                last_page, end_offset = checkpoint
+                first_page_num = last_page + 1
+                if end_offset is not None and reads_as_bytes(self.json_encoding):
+                    start_offset = end_offset
+                logger.info(f"Resuming {filename} from page {first_page_num}")
+
+        with open_json_lines(filename, self.json_encoding, start_offset) as json_lines:
+            logger.info(f"Loading {filename} into {self.db_name}")
+
+            if first_page_num > 1 and start_offset == 0:
+                # Without an offset to seek to, skip the lines already loaded
+                json_lines = islice(json_lines, first_page_num - 1, None)
+
+            pages_loaded = self._load_lines(
+                file_name, json_lines, first_page_num, start_offset
+            )
+
+            self.sink.append(
+                "loaded_file",
+                [(fingerprint, file_name, first_page_num - 1 + pages_loaded)],
+            )
+            self.commit()
+
+        logger.info(f"All {pages_loaded} pages of {filename} processed")
+        return pages_loaded
+
+    def load_stream(self, stream: BinaryIO, file_name: str = "stdin") -> int:
+        """
+        Loads twarc json read from a binary stream, such as standard input, in the
+        same way as `load_file`. Everything read is committed once the stream ends,
+        and also every `commit_pages` pages if that was given.
+
+        :param stream: A binary stream of newline delimited json, such as
+        `sys.stdin.buffer`, which is left open
+        :param file_name: The label to record as the file name of the pages. If pages
+        have already been loaded with the same label, page numbers continue on from
+        the last page committed.
+        :return: The number of pages of Twitter results loaded from the stream
+        """
+        self.commit()
+        first_page_num = 1
+        checkpoint = self.get_checkpoint(file_name)
+        if checkpoint is not None:
+            first_page_num = checkpoint[0] + 1
+
+        with open_json_stream(stream, self.json_encoding) as json_lines:
+            logger.info(f"Loading {file_name} into {self.db_name}")
+            pages_loaded = self._load_lines(file_name, json_lines, first_page_num)
+            self.commit()
+
+        logger.info(f"All {pages_loaded} pages of {file_name} processed")
+        return pages_loaded
+
+    def _load_lines(
+        self,
+        file_name: str,
+        json_lines: Iterable[Tuple[JsonLine, Optional[int]]],
+        first_page_num: int = 1,
+        start_offset: int = 0,
+    ) -> int:
+        """
+        Decodes, maps and buffers the pages of a file, returning the number of pages.
+        """
+        file_stats = None
+        if self.stats is not None:
+            file_stats = self.stats.file(file_name)
+            file_stats.start_offset = start_offset
+            self._last_file = file_name
+
+        file_id = self.file_id(file_name)
+        if self.executor is None:
+            mapped_pages = _map_pages(
+                file_name, file_id, json_lines, self._decode, first_page_num, file_stats
+            )
+        else:
+            mapped_pages = _map_pages_in_parallel(
+                file_name,
+                file_id,
+                json_lines,
+                self.json_decoder,
+                self.executor,
+                first_page_num,
+                file_stats,
+            )
+
+        pages_loaded = 0
+        for page_num, end_offset, page_mappings in mapped_pages:
+            self._add_mappings(file_name, page_num, end_offset, page_mappings)
+            pages_loaded = pages_loaded + 1
+        return pages_loaded
+
+    def follow_file(
+        self,
+        filename: Union[str, PathLike],
+        poll_interval: float = 1.0,
+        idle_timeout: Optional[float] = None,
+    ) -> int:
+        """
+        Loads a twarc json file which is still being written to, such as the output
+        of `twarc2 stream` or `twarc2 sample`, loading pages as they are written.
+
+        Loading continues from the last page of the file committed to the database,
+        if any. Pages are committed whenever every page written so far has been
+        loaded, as well as every `commit_pages` pages if that was given, so the
+        database is kept close to up to date. If the file is rotated, the new file is
+        loaded with page numbers continuing on from the old file. See
+        `tidy_tweet.reading.FollowedJsonLines`.
+
+        As the file is never completely loaded, it is not recorded as loaded (see
+        `find_loaded_file`). Stop following with Ctrl-C, which like any other error
+        discards the pages not yet committed.
+
+        :param filename: The path to a UTF-8, uncompressed json/jsonl file
+        :param poll_interval: Seconds to wait between checks for new pages
+        :param idle_timeout: Return once no new pages have been written for this many
+        seconds. By default, the file is followed until interrupted.
+        :return: The number of pages of Twitter results loaded from this file by this
+        call
+        """
+        if not reads_as_bytes(self.json_encoding):
+            raise ValueError(f"Cannot follow {filename} as it is not encoded in UTF-8")
+        file_name = str(filename)
+        self.commit()
+        page_num = 0
+        start_offset = 0
+        checkpoint = self.get_checkpoint(file_name)
+        if checkpoint is not None:
+            page_num, start_offset = checkpoint
+            if start_offset is None:
+                raise ValueError(
+                    f"Cannot follow {filename} from page {page_num + 1} as the "
+                    f"position of that page in the file is not known"
+                )
+            logger.info(f"Following {filename} from page {page_num + 1}")
+
+        file_id = self.file_id(file_name)
+        lines = FollowedJsonLines(filename, start_offset, poll_interval, idle_timeout)
+        rotations = 0
+        pages_loaded = 0
+        for line in lines:
+            if lines.rotations != rotations:
+                # Later offsets are in the new file, so loading would resume from its
+                # start
+                rotations = lines.rotations
+                self.commit()
+                self._checkpoints[file_name] = (page_num, 0)
+                self.commit()
+            if line is None:
+                # Caught up with the file
+                self.commit()
+                continue
+
+            page, end_offset = line
+            page_num = page_num + 1
+            try:
+                page_mappings = _map_page(file_id, page_num, self._decode(page))
+            except Exception as e:
+                raise PageParsingError(file_name, page_num) from e
+            self._add_mappings(file_name, page_num, end_offset, page_mappings)
+            pages_loaded = pages_loaded + 1
+
+        self.commit()
+        logger.info(f"Stopped following {filename} after {pages_loaded} pages")
+        return pages_loaded
+
+    def close(self):
+        """
+        Commits anything outstanding, restores durable database settings and closes
+        the database connection.
+        """
+        self.commit()
+        self.sink.close()
+
+
 def load_twarc_json_to_sqlite(
     filename: Union[str, PathLike],
     db_name: Union[str, PathLike],
     json_encoding: str = None,
+    executor: Executor = None,
+    profile: str = "safe",
+    json_decoder: str = "auto",
+    stats: Optional[LoadStats] = None,
 ) -> int:
     """
     Parses a json/jsonl file produced by a Twarc search and loads the Twitter data into
@@ -92,42 +879,71 @@ def load_twarc_json_to_sqlite(
     Before calling this function, the database should already have been initialised with
     the `tidy_tweet.initialise_sqlite()` function.
 
+    To load many files, a `tidy_tweet.Loader` avoids reconnecting to the database for
+    every file.
+
     :param filename: The path to a json/jsonl file of Twitter data. The file is expected
     to be in the format of the results of a Twarc search.
     :param db_name: The path to an existing sqlite database to load the data into
+    :param json_encoding: The text encoding of the file, if not UTF-8
+    :param executor: Optionally, a `concurrent.futures.ProcessPoolExecutor` to decode
+    and map pages in. Pages are still written to the database by the calling process,
+    in file order, so the result is identical to loading without an executor.
+    :param profile: The SQLite settings to load with, "safe" (the default) or "bulk"
+    for faster loading at the risk of corruption if the computer crashes
+    :param json_decoder: The json decoder to use, see
+    `tidy_tweet.reading.get_json_decoder`
+    :param stats: Optionally, a `tidy_tweet.stats.LoadStats` to add the timings and
+    row counts of loading this file to
     :return: The number of pages of Twitter results loaded in this file
     """
-    with open(filename, "r", encoding=json_encoding) as json_fh, sqlite3.connect(
-        db_name
-    ) as connection:
-        logger.info(f"Loading {filename} into {db_name}")
-
-        page_num = 0
-        for page in json_fh:
-            page_num = page_num + 1
-            logger.info(f"Processing page {page_num} of {filename}")
-            page_json = json.loads(page)
-            try:
-                _load_page_object(str(filename), page_num, page_json, connection)
-            except Exception as e:
-                raise PageParsingError(filename, page_num) from e
-
-        logger.info(f"All {page_num} pages of {filename} processed")
-    return page_num
+    with Loader(
+        db_name,
+        json_encoding=json_encoding,
+        executor=executor,
+        profile=profile,
+        json_decoder=json_decoder,
+        stats=stats is not None,
+    ) as loader:
+        pages_loaded = loader.load_file(filename)
+    if stats is not None:
+        for file_name, file_stats in loader.stats.files.items():
+            stats.file(file_name).add(file_stats)
+    return pages_loaded
 
 
 class PageParsingError(Exception):
     file_name: str
     page_number: int
+    last_page_number: Optional[int]
 
-    def __init__(self, file_name: str, page_number: int, *args):
+    def __init__(
+        self,
+        file_name: str,
+        page_number: int,
+        *args,
+        last_page_number: Optional[int] = None,
+    ):
         self.file_name = file_name
         self.page_number = page_number
+        # Set when the error happened while writing a batch of several pages
+        self.last_page_number = last_page_number
 
         super().__init__(*args)
 
+    def __reduce__(self):
+        # Allows the exception to be passed back from a worker process
+        return (
+            partial(self.__class__, last_page_number=self.last_page_number),
+            (self.file_name, self.page_number, *self.args),
+        )
+
     def __str__(self):
+        if self.last_page_number is not None:
+            pages = f"pages {self.page_number} to {self.last_page_number}"
+        else:
+            pages = f"page {self.page_number}"
         return (
-            "tidy_tweet encountered an error while parsing page "
-            f"{self.page_number} of file {self.file_name}"
+            f"tidy_tweet encountered an error while parsing {pages} of file "
+            f"{self.file_name}"
         )
@@ -0,0 +1,445 @@
+import bz2
+import codecs
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import locale
+import re
+import time
+from contextlib import contextmanager
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Tuple,
+    Union,
+)
+from os import PathLike
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+# Decoders in order of preference for "auto". orjson decodes integers too large for
+# 64 bits as floats, so msgspec is preferred; no such integers appear in Twitter
+# API results.
+JSON_DECODERS = ["msgspec", "orjson", "json"]
+
+
+def _import_decoder(name: str) -> Callable[[Union[str, bytes]], Any]:
+    if name == "msgspec":
+        import msgspec.json
+
+        return msgspec.json.decode
+    elif name == "orjson":
+        import orjson
+
+        return orjson.loads
+    elif name == "json":
+        return json.loads
+    else:
+        raise ValueError(
+            f"Unknown JSON decoder {name!r}, expected 'auto' or one of "
+            f"{', '.join(JSON_DECODERS)}"
+        )
+
+
+def _with_stdlib_fallback(
+    decoder: Callable[[Union[str, bytes]], Any],
+) -> Callable[[Union[str, bytes]], Any]:
+    """
+    Wraps a fast JSON decoder so that anything it rejects (such as NaN, lone
+    surrogates or out of range floats, which the standard library accepts) is decoded
+    by the standard library instead. Invalid json therefore raises exactly the same
+    error as it would with the standard library.
+    """
+
+    def decode(line: Union[str, bytes]) -> Any:
+        try:
+            return decoder(line)
+        except Exception:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            return json.loads(line)
+
+    return decode
+
+
+def get_json_decoder(name: str = "auto") -> Callable[[Union[str, bytes]], Any]:
+    """
+    Returns a function which decodes a single json document from a str or from UTF-8
+    encoded bytes.
+
+    :param name: One of `JSON_DECODERS`, or "auto" (the default) for the first of
+    them which is installed. The fast decoders fall back to the standard library's
+    json module for anything they can't decode, so all give the same results.
+    """
+    if name != "auto":
+        decoder = _import_decoder(name)
+        return decoder if name == "json" else _with_stdlib_fallback(decoder)
+
+    for candidate in JSON_DECODERS:
+        try:
+            decoder = _import_decoder(candidate)
+        except ImportError:
+            continue
+        logger.debug(f"Using {candidate} to decode json")
+        return decoder if candidate == "json" else _with_stdlib_fallback(decoder)
+
+
+# Files are read this many bytes at a time to fingerprint them
+_FINGERPRINT_CHUNK_SIZE = 2**20
+
+
+def file_fingerprint(filename: Union[str, PathLike]) -> str:
+    """
+    Returns a fingerprint of a file's contents, which does not depend on the file's
+    name or location.
+
+    The fingerprint is the file's size and a hash of its whole contents, so files
+    which differ anywhere have different fingerprints. Hashing reads the file much
+    faster than it can be loaded, so this adds little to the time taken to load it.
+    """
+    size = os.stat(filename).st_size
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as fh:
+        while True:
+            chunk = fh.read(_FINGERPRINT_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return f"{size}:{digest.hexdigest()}"
+
+
+# Compression formats twarc output can be read from, each with the magic bytes its
+# files start with and the file extensions it is recognised by if those bytes don't
+# match. zstd needs the optional zstandard package.
+COMPRESSION_FORMATS = {
+    "gzip": (b"\x1f\x8b", [".gz", ".gzip"]),
+    "bz2": (b"BZh", [".bz2"]),
+    "xz": (b"\xfd7zXZ\x00", [".xz", ".lzma"]),
+    "zstd": (b"\x28\xb5\x2f\xfd", [".zst", ".zstd"]),
+}
+
+
+def detect_compression(filename: Union[str, PathLike]) -> Optional[str]:
+    """
+    Returns which of `COMPRESSION_FORMATS` a file is compressed with, from the magic
+    bytes at the start of the file or otherwise from its extension, or None if the
+    file is not compressed.
+    """
+    with open(filename, "rb") as fh:
+        start = fh.read(8)
+    for compression, (magic, _) in COMPRESSION_FORMATS.items():
+        if start.startswith(magic):
+            return compression
+
+    extension = os.path.splitext(filename)[1].lower()
+    for compression, (_, extensions) in COMPRESSION_FORMATS.items():
+        if extension in extensions:
+            return compression
+
+    return None
+
+
+def _open_zstd(filename: Union[str, PathLike]) -> BinaryIO:
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            f"{filename} is compressed with zstd, which needs the zstandard package "
+            f"(pip install tidy_tweet[zstd])"
+        ) from e
+
+    fh = open(filename, "rb")
+    # Files written in several pieces, such as by pzstd, contain several frames
+    reader = zstandard.ZstdDecompressor().stream_reader(
+        fh, read_across_frames=True, closefd=True
+    )
+    return io.BufferedReader(reader, buffer_size=2**20)
+
+
+def open_binary(filename: Union[str, PathLike]) -> BinaryIO:
+    """
+    Opens a file for reading in binary, decompressing it as it is read if it is
+    compressed in one of the `COMPRESSION_FORMATS`.
+    """
+    compression = detect_compression(filename)
+    if compression is None:
+        return open(filename, "rb", buffering=2**20)
+    logger.debug(f"Reading {filename} as {compression} compressed")
+    if compression == "gzip":
+        return gzip.open(filename, "rb")
+    elif compression == "bz2":
+        return bz2.open(filename, "rb")
+    elif compression == "xz":
+        return lzma.open(filename, "rb")
+    else:
+        return _open_zstd(filename)
+
+
+def _skip_to(fh: BinaryIO, offset: int):
+    """
+    Moves a file opened by `open_binary` to a byte offset. Compressed files are moved
+    through by decompressing everything up to the offset.
+    """
+    if fh.seekable():
+        fh.seek(offset)
+        return
+    remaining = offset
+    while remaining > 0:
+        skipped = len(fh.read(min(remaining, 2**20)))
+        if skipped == 0:
+            break
+        remaining = remaining - skipped
+
+
+# A line of a json file, as UTF-8 encoded bytes or as text
+JsonLine = Union[bytes, str]
+
+# Splits bytes into lines ending in "\r\n", "\r" or "\n"
+_universal_newline = re.compile(rb"[^\r\n]*(?:\r\n?|\n)|[^\r\n]+")
+
+
+def _universal_newline_lines(
+    fh: Iterable[bytes], start_offset: int
+) -> Iterator[Tuple[bytes, int]]:
+    """
+    Splits lines of UTF-8 bytes at "\r" as well as "\n", as reading the file in
+    text mode would, giving each line with the byte offset of the end of the line.
+    """
+    offset = start_offset
+    for line in fh:
+        if b"\r" in line and line.count(b"\r") != line.count(b"\r\n"):
+            for part in _universal_newline.findall(line):
+                offset = offset + len(part)
+                yield part, offset
+        else:
+            offset = offset + len(line)
+            yield line, offset
+
+
+def reads_as_bytes(json_encoding: str = None) -> bool:
+    """
+    Whether `open_json_lines` reads files in this encoding in binary, giving lines as
+    bytes with byte offsets.
+    """
+    encoding = json_encoding or locale.getpreferredencoding(False)
+    return codecs.lookup(encoding).name == "utf-8"
+
+
+@contextmanager
+def open_json_lines(
+    filename: Union[str, PathLike], json_encoding: str = None, start_offset: int = 0
+) -> Iterator[Iterable[Tuple[JsonLine, Optional[int]]]]:
+    """
+    Opens a newline delimited json file, giving an iterable of its lines to decode
+    with a decoder from `get_json_decoder`. Each line is given along with the byte
+    offset of the end of the line in the file, if known.
+
+    UTF-8 files (the usual case) are read in binary and the lines are given as bytes,
+    so they can be decoded without first being decoded to text. Files in other
+    encodings are read in text mode, and byte offsets are not known.
+
+    Files compressed in any of the `COMPRESSION_FORMATS` are decompressed as they
+    are read, and byte offsets are offsets in the decompressed json.
+
+    :param json_encoding: The text encoding of the file, defaulting to the same
+    encoding `open()` would use
+    :param start_offset: Byte offset to start reading from, which must be the end of
+    a line previously read. Only possible for files read in binary.
+    """
+    if reads_as_bytes(json_encoding):
+        with open_binary(filename) as fh:
+            _skip_to(fh, start_offset)
+            yield _universal_newline_lines(fh, start_offset)
+    elif start_offset:
+        raise ValueError(f"Cannot seek in {filename} as it is not encoded in UTF-8")
+    else:
+        with io.TextIOWrapper(open_binary(filename), encoding=json_encoding) as fh:
+            yield ((line, None) for line in fh)
+
+
+@contextmanager
+def open_json_stream(
+    stream: BinaryIO, json_encoding: str = None, buffer_size: int = 2**20
+) -> Iterator[Iterable[Tuple[JsonLine, None]]]:
+    """
+    Reads newline delimited json from a binary stream, such as standard input,
+    giving an iterable of its lines like `open_json_lines`. Byte offsets are not
+    given, as a stream can't be read again from an offset. The stream is read in
+    chunks of `buffer_size` bytes, and is left open.
+
+    Compressed streams are not decompressed.
+    """
+    # Standard input has a small buffer of its own, so read the underlying stream
+    fh = io.BufferedReader(getattr(stream, "raw", stream), buffer_size=buffer_size)
+    try:
+        if reads_as_bytes(json_encoding):
+            yield ((line, None) for line, _ in _universal_newline_lines(fh, 0))
+        else:
+            text = io.TextIOWrapper(fh, encoding=json_encoding)
+            try:
+                yield ((line, None) for line in text)
+            finally:
+                text.detach()
+    finally:
+        # Without closing the stream
+        fh.detach()
+
+
+# The number of bytes at the start of a followed file which are checked for changes,
+# to recognise the file being truncated and written to again
+_FOLLOW_PREFIX_SIZE = 4096
+
+
+def _read_prefix(fh: BinaryIO, length: int) -> bytes:
+    """
+    Reads the first `length` bytes of a file, leaving its position unchanged.
+    """
+    position = fh.tell()
+    fh.seek(0)
+    prefix = fh.read(length)
+    fh.seek(position)
+    return prefix
+
+
+class FollowedJsonLines:
+    """
+    The lines of a newline delimited json file which is still being written to, such
+    as the output of `twarc2 stream`, read as they are written.
+
+    Iterating gives each complete line as UTF-8 bytes, with the byte offset of the
+    end of the line, like `open_json_lines`. A partly written line at the end of the
+    file is held back until the rest of it is written. Whenever every complete line
+    written so far has been given, None is given instead, before waiting
+    `poll_interval` seconds for more to be written.
+
+    If the file is rotated (replaced by a new file of the same name), the rest of
+    the old file is read before the new file is read from the start. If the file is
+    truncated, including by a copytruncate rotation after which it has already
+    grown past where it had been read up to, it is read again from the start. This
+    is recognised by its first 4KiB changing, so a truncated file which is written
+    to again with exactly the same start isn't noticed. Either way, `rotations` is
+    incremented, and any partly written line left at the end of the old file is
+    discarded.
+
+    Compressed files and files in encodings other than UTF-8 can't be followed.
+    """
+
+    def __init__(
+        self,
+        filename: Union[str, PathLike],
+        start_offset: int = 0,
+        poll_interval: float = 1.0,
+        idle_timeout: Optional[float] = None,
+        read_size: int = 2**20,
+    ):
+        """
+        :param start_offset: Byte offset to start reading from, which must be the end
+        of a line previously read
+        :param poll_interval: Seconds to wait before checking for more lines once
+        every line written so far has been read
+        :param idle_timeout: Stop once nothing has been written for this many
+        seconds. By default, lines are waited for forever.
+        :param read_size: The number of bytes to read at a time
+        """
+        if detect_compression(filename) is not None:
+            raise ValueError(f"Cannot follow {filename} as it is compressed")
+        self.filename = filename
+        self.start_offset = start_offset
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.read_size = read_size
+        self.rotations = 0
+
+    def _replaced(self, fh: BinaryIO, prefix: bytes) -> Optional[str]:
+        """
+        Whether the file has been "rotated" (replaced by a new file) or "truncated"
+        since `fh` was opened, or None if neither.
+
+        :param prefix: The start of the file as it was read, to recognise a file
+        truncated and written to again past where it had been read up to
+        """
+        try:
+            current = os.stat(self.filename)
+        except FileNotFoundError:
+            # Between rotating the old file and creating the new one
+            return None
+        opened = os.fstat(fh.fileno())
+        if (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino):
+            return "rotated"
+        if current.st_size < fh.tell() or _read_prefix(fh, len(prefix)) != prefix:
+            return "truncated"
+        return None
+
+    def __iter__(self) -> Iterator[Optional[Tuple[bytes, int]]]:
+        fh = open(self.filename, "rb")
+        try:
+            prefix = _read_prefix(fh, min(self.start_offset, _FOLLOW_PREFIX_SIZE))
+            fh.seek(self.start_offset)
+            offset = self.start_offset
+            partial = b""
+            idle_since = time.monotonic()
+            # Whether to read the rest of the old file before switching to the file
+            # which has replaced it
+            draining = False
+            while True:
+                data = fh.read(self.read_size)
+                if data:
+                    idle_since = time.monotonic()
+                    if len(prefix) < _FOLLOW_PREFIX_SIZE:
+                        prefix = prefix + data[: _FOLLOW_PREFIX_SIZE - len(prefix)]
+                    lines = (partial + data).split(b"\n")
+                    partial = lines.pop()
+                    for line in lines:
+                        offset = offset + len(line) + 1
+                        yield line + b"\n", offset
+                    if len(data) == self.read_size:
+                        continue
+
+                replaced = "rotated" if draining else None
+                if not draining:
+                    yield None
+                    replaced = self._replaced(fh, prefix)
+                    if replaced == "rotated":
+                        # Lines may have been written to the old file since it was
+                        # last read, so read it to the end first
+                        draining = True
+                        continue
+
+                if replaced is not None:
+                    if partial:
+                        logger.warning(
+                            f"Discarding an incomplete line at the end of "
+                            f"{self.filename} before it was {replaced}"
+                        )
+                    logger.info(f"{self.filename} has been {replaced}, reading again")
+                    fh.close()
+                    fh = open(self.filename, "rb")
+                    offset = 0
+                    partial = b""
+                    prefix = b""
+                    draining = False
+                    self.rotations = self.rotations + 1
+                    continue
+
+                if (
+                    self.idle_timeout is not None
+                    and time.monotonic() - idle_since >= self.idle_timeout
+                ):
+                    if partial:
+                        logger.warning(
+                            f"Stopped following {self.filename} with an incomplete "
+                            f"line at the end"
+                        )
+                    return
+                time.sleep(self.poll_interval)
+        finally:
+            fh.close()
@@ -0,0 +1,71 @@
+"""
+Searches the full text search indexes of a tidy_tweet database, created with
+`tidy_tweet --full_text_search` or
+`tidy_tweet.initialise_sqlite(full_text_search=True)`.
+
+Queries use SQLite's FTS5 query syntax
+(https://www.sqlite.org/fts5.html#full_text_query_syntax): a query of several words
+matches text containing all of them, anywhere in a word, and words can be combined
+with OR, NOT and brackets. Put phrases, and terms with characters other than letters
+and numbers, such as hashtags and mentions, in double quotes, for example
+`'"#auspol" OR "@QUT"'`. Matching ignores case, and terms must be at least three
+characters long.
+"""
+
+import sqlite3
+from os import PathLike
+from typing import List, Optional, Union
+
+
+def _search(
+    db: Union[str, PathLike, sqlite3.Connection],
+    search_table: str,
+    query: str,
+    limit: Optional[int],
+) -> List[str]:
+    if isinstance(db, sqlite3.Connection):
+        conn = db
+    else:
+        conn = sqlite3.connect(db)
+    try:
+        rows = conn.execute(
+            f"select cast(rowid as text) from {search_table} "
+            f"where {search_table} match ? order by rank limit ?",
+            (query, -1 if limit is None else limit),
+        ).fetchall()
+    finally:
+        if conn is not db:
+            conn.close()
+    return [id for (id,) in rows]
+
+
+def search_tweets(
+    db: Union[str, PathLike, sqlite3.Connection],
+    query: str,
+    limit: Optional[int] = None,
+) -> List[str]:
+    """
+    Searches the text of the tweets in a database, returning the ids of the matching
+    tweets, most relevant first.
+
+    :param db: The path to a tidy_tweet database, or a connection to one
+    :param query: The text to search for, in FTS5 query syntax
+    :param limit: The maximum number of tweet ids to return, or None for all matches
+    """
+    return _search(db, "tweet_search", query, limit)
+
+
+def search_users(
+    db: Union[str, PathLike, sqlite3.Connection],
+    query: str,
+    limit: Optional[int] = None,
+) -> List[str]:
+    """
+    Searches the descriptions of the users in a database, returning the ids of the
+    matching users, most relevant first.
+
+    :param db: The path to a tidy_tweet database, or a connection to one
+    :param query: The text to search for, in FTS5 query syntax
+    :param limit: The maximum number of user ids to return, or None for all matches
+    """
+    return _search(db, "user_search", query, limit)
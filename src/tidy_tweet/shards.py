@@ -0,0 +1,529 @@
+"""
+Stores the tidy_tweet tables in one SQLite database per period of time, so that no
+single database file grows too large to vacuum, back up or query comfortably.
+
+A small catalogue database records the shards, along with the tables which are not
+about pages of results. Each shard is an ordinary tidy_tweet database holding the
+pages, tweets and users of its period. `connect` opens the catalogue with the
+shards for a range of dates attached, and with views of the same names as the
+tables and views of an ordinary tidy_tweet database which combine those shards.
+
+SQLite can usually attach at most 10 databases to a connection, so `connect` can
+only open a range of dates with at most that many shards. `query` runs a query over
+any number of shards, querying them one at a time if there are too many to attach.
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+from logging import getLogger
+from os import PathLike
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+import tidy_tweet.tweet_mapping as mapping
+from tidy_tweet.database import SQLiteSink
+import tidy_tweet.database as db
+from tidy_tweet.sinks import SchemaVersionMismatchError, Sink
+
+logger = getLogger(__name__)
+
+
+# Ways rows can be split into shards, with the timestamp each is split by and the
+# length of the period's prefix of that timestamp:
+#  - retrieved_month/year: when the page of results was retrieved from Twitter
+#  - created_month/year: when tweets were created, for tweets and their entities,
+#    and otherwise when the page of results was retrieved
+SHARD_KEYS = {
+    "retrieved_month": ("retrieved", 7),
+    "retrieved_year": ("retrieved", 4),
+    "created_month": ("created", 7),
+    "created_year": ("created", 4),
+}
+
+# Tables kept in the catalogue rather than split into shards, as their rows are not
+# tied to a page of results
+CATALOGUE_TABLES = ["media", "source_file", "load_checkpoint", "loaded_file"]
+
+# The shard of rows whose timestamp is missing
+UNDATED_PERIOD = "undated"
+
+# SQLite's default limit on the number of databases attached to a connection
+_DEFAULT_ATTACH_LIMIT = 10
+
+_catalogue_sql = [
+    """
+create table shard_catalogue (
+    shard_by text not null, -- one of shards.SHARD_KEYS
+    strict_mode integer not null -- boolean, whether shard tables are strict
+)
+""",
+    """
+create table shard (
+    period text primary key, -- e.g. 2021 or 2021-10
+    file_name text not null, -- relative to the directory of the catalogue
+    created_at text default current_timestamp
+)
+""",
+]
+
+# Tables whose rows belong to a tweet or a user, and the column with its id
+_OWNER_COLUMNS = {
+    table: (table.split("_")[0], mapping.columns_by_table[table].index(column))
+    for table, column in [
+        ("tweet_by_page", "id"),
+        ("tweet_url", "tweet_id"),
+        ("tweet_hashtag", "tweet_id"),
+        ("tweet_mention", "tweet_id"),
+        ("user_by_page", "id"),
+        ("user_url", "user_id"),
+        ("user_hashtag", "user_id"),
+        ("user_mention", "user_id"),
+    ]
+}
+
+_results_page_columns = mapping.columns_by_table["results_page"]
+# Results pages are written with an explicit insertion time, so the copies of a
+# page written to several shards are identical
+_results_page_insert = (
+    f"insert or ignore into results_page ({', '.join(_results_page_columns)}, "
+    f"inserted_at) values ({', '.join('?' for _ in _results_page_columns)}, ?)"
+)
+
+
+def is_sharded(db_name: Union[str, PathLike]) -> bool:
+    """
+    Whether a database is the catalogue of a sharded tidy_tweet database.
+    """
+    conn = sqlite3.connect(db_name)
+    try:
+        result = conn.execute(
+            "select 1 from sqlite_master where type = 'table' "
+            "and name = 'shard_catalogue'"
+        ).fetchone()
+    finally:
+        conn.close()
+    return result is not None
+
+
+def shard_paths(catalogue: Union[str, PathLike]) -> Dict[str, Path]:
+    """
+    The path of each shard of a sharded database, by period.
+    """
+    directory = Path(catalogue).parent
+    conn = sqlite3.connect(catalogue)
+    try:
+        shards = conn.execute("select period, file_name from shard order by period")
+        return {period: directory / file_name for period, file_name in shards}
+    finally:
+        conn.close()
+
+
+def shard_key(catalogue: Union[str, PathLike]) -> str:
+    """
+    Which of the `SHARD_KEYS` a sharded database is split by.
+    """
+    conn = sqlite3.connect(catalogue)
+    try:
+        (shard_by,) = conn.execute("select shard_by from shard_catalogue").fetchone()
+    finally:
+        conn.close()
+    return shard_by
+
+
+def _in_range(period: str, start: Optional[str], end: Optional[str]) -> bool:
+    """
+    Whether a period (such as 2021 or 2021-10) overlaps the range of ISO 8601 dates
+    from `start` to `end`, inclusive.
+    """
+    if period == UNDATED_PERIOD:
+        return start is None and end is None
+    if start is not None and period < start[: len(period)]:
+        return False
+    if end is not None and period > end[: len(period)]:
+        return False
+    return True
+
+
+def connect(
+    catalogue: Union[str, PathLike],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> sqlite3.Connection:
+    """
+    Opens a sharded database for querying, attaching the shards for the periods
+    from `start` to `end` (inclusive ISO 8601 dates or prefixes of them, such as
+    "2021-10"), or all shards if neither is given.
+
+    Temporary views with the same names as the tables and views of an ordinary
+    tidy_tweet database combine the attached shards, so queries over a range of
+    dates only read the shards for those dates. The dates are of whichever
+    timestamp the database is sharded by. SQLite can usually attach at most 10
+    databases, so a ValueError is raised if more shards than that match. Give a
+    narrower range, or use `query` to query the shards one at a time.
+    """
+    paths = _paths_in_range(catalogue, start, end)
+    limit = _attach_limit()
+    if len(paths) > limit:
+        raise ValueError(
+            f"{len(paths)} shards of {catalogue} match, but SQLite can only "
+            f"attach {limit} databases. Give a narrower range of dates, or use "
+            "tidy_tweet.shards.query to query them one at a time."
+        )
+    return _connect_paths(catalogue, paths)
+
+
+def query(
+    catalogue: Union[str, PathLike],
+    sql: str,
+    parameters: Sequence = (),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> Iterator[Tuple]:
+    """
+    Runs a query over the shards of a sharded database for the periods from `start`
+    to `end` (see `connect`), yielding its rows.
+
+    If more shards match than SQLite can attach at once, the query is instead run
+    with each shard attached in turn, and the rows from each shard are yielded one
+    after another. Rows are then not combined across shards, so give queries whose
+    rows each come from a single shard, such as selecting tweets, rather than
+    aggregates such as counts, which are then counted per shard. A tweet or user
+    seen on pages in several shards is then also yielded once per shard.
+    """
+    paths = _paths_in_range(catalogue, start, end)
+    if len(paths) <= _attach_limit():
+        groups = [paths]
+    else:
+        logger.info(
+            f"{len(paths)} shards of {catalogue} match, more than can be attached at "
+            "once, so querying them one at a time"
+        )
+        groups = [{period: path} for period, path in paths.items()]
+    for group in groups:
+        conn = _connect_paths(catalogue, group)
+        try:
+            yield from conn.execute(sql, parameters)
+        finally:
+            conn.close()
+
+
+def _paths_in_range(
+    catalogue: Union[str, PathLike], start: Optional[str], end: Optional[str]
+) -> Dict[str, Path]:
+    return {
+        period: path
+        for period, path in shard_paths(catalogue).items()
+        if _in_range(period, start, end)
+    }
+
+
+def _attach_limit() -> int:
+    """
+    The most databases SQLite can attach to a connection. Before Python 3.11 this
+    can't be looked up, so SQLite's default limit is assumed.
+    """
+    conn = sqlite3.connect(":memory:")
+    try:
+        if hasattr(conn, "getlimit"):
+            return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        return _DEFAULT_ATTACH_LIMIT
+    finally:
+        conn.close()
+
+
+def _connect_paths(
+    catalogue: Union[str, PathLike], paths: Dict[str, Path]
+) -> sqlite3.Connection:
+    """
+    Opens the catalogue with the given shards attached and views combining them.
+    """
+    conn = sqlite3.connect(catalogue)
+    try:
+        schemas = []
+        for n, path in enumerate(paths.values()):
+            conn.execute(f"attach database ? as shard_{n}", (str(path),))
+            schemas.append(f"shard_{n}")
+        if not schemas:
+            # An empty shard, so the views still have their columns
+            conn.execute("attach database ':memory:' as shard_0")
+            for create in mapping.get_create_table_statements(strict_mode=False):
+                conn.execute(create.replace("create table ", "create table shard_0."))
+            schemas.append("shard_0")
+
+        for table in mapping.sql_by_table:
+            if table in CATALOGUE_TABLES:
+                continue
+            # The same page can be copied into several shards
+            union = " union " if table == "results_page" else " union all "
+            conn.execute(
+                f"create temp view {table} as "
+                + union.join(f"select * from {schema}.{table}" for schema in schemas)
+            )
+        for view_sql in mapping.sql_views.values():
+            conn.execute(view_sql.replace("create view", "create temp view", 1))
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def build_indexes(catalogue: Union[str, PathLike]):
+    """
+    Builds the secondary indexes of every shard, see
+    `tidy_tweet.database.build_indexes`.
+    """
+    for path in shard_paths(catalogue).values():
+        db.build_indexes(path)
+
+
+def drop_indexes(catalogue: Union[str, PathLike]):
+    """
+    Drops the secondary indexes of every shard, see
+    `tidy_tweet.database.drop_indexes`.
+    """
+    for path in shard_paths(catalogue).values():
+        db.drop_indexes(path)
+
+
+class ShardedSQLiteSink(Sink):
+    """
+    Stores the tidy_tweet tables in a shard database per period, recorded in a
+    catalogue database.
+
+    Each shard is a complete tidy_tweet database, named after the catalogue and its
+    period (for example my_dataset.2021-10.db for my_dataset.db). Shards are created
+    as rows for their period are appended. The `CATALOGUE_TABLES` are stored in the
+    catalogue itself.
+
+    Rows are routed by the page they came from, so rows must be appended a batch of
+    pages at a time, starting with the batch's results_page rows, as
+    `tidy_tweet.Loader` does. When sharding by creation time, tweets and their
+    entities go to the shard of the tweet's creation time, along with a copy of the
+    results_page row of the page they came from.
+
+    Results pages are inserted ignoring pages already in a shard, as shards are
+    committed one after another and an interrupted commit may have to be repeated.
+    """
+
+    def __init__(
+        self,
+        catalogue: Union[str, PathLike],
+        shard_by: Optional[str] = None,
+        profile: Optional[str] = None,
+    ):
+        """
+        :param catalogue: The path to the catalogue database file
+        :param shard_by: One of the `SHARD_KEYS`, needed when creating the database
+        with `create_schema`, and otherwise read from the catalogue
+        :param profile: One of the `tidy_tweet.database.SQLITE_PROFILES` to
+        configure each database with for loading
+        """
+        if shard_by is not None and shard_by not in SHARD_KEYS:
+            raise ValueError(
+                f"Unknown shard key {shard_by!r}, expected one of "
+                f"{', '.join(SHARD_KEYS)}"
+            )
+        self.name = catalogue
+        self.profile = profile
+        self.catalogue = SQLiteSink(catalogue, profile)
+        self.directory = Path(catalogue).parent
+        self.shard_by = shard_by
+        self.strict_mode = True
+        self.shards: Dict[str, SQLiteSink] = {}
+
+        settings = None
+        try:
+            settings = self.catalogue.fetch_one(
+                "select shard_by, strict_mode from shard_catalogue"
+            )
+        except sqlite3.OperationalError:
+            pass  # A database without a schema yet
+        if settings is not None:
+            if shard_by is not None and shard_by != settings[0]:
+                self.catalogue.close()
+                raise ValueError(
+                    f"{catalogue} is sharded by {settings[0]}, not {shard_by}"
+                )
+            self.shard_by, self.strict_mode = settings[0], bool(settings[1])
+
+        # The current batch of pages: the shard and results_page row of each page,
+        # the shards each tweet and user was written to, and the pages copied into
+        # each shard
+        self._pages: Dict[Tuple[int, int], Tuple[str, Tuple]] = {}
+        self._owners: Dict[Tuple[str, str], Set[str]] = {}
+        self._copied: Set[Tuple[str, int, int]] = set()
+
+    def create_schema(
+        self,
+        strict_mode: bool = True,
+        materialised: bool = False,
+        record_version: bool = True,
+        snapshots: bool = False,
+        rollups: bool = False,
+    ):
+        if self.shard_by is None:
+            raise ValueError("A shard key is needed to create a sharded database")
+        if materialised:
+            raise ValueError("Sharded databases can't have materialised views")
+        if snapshots:
+            raise ValueError("Sharded databases can't store snapshots")
+        if rollups:
+            raise ValueError("Sharded databases can't have rollup tables")
+
+        self.catalogue.connection.execute("pragma journal_mode = wal")
+        create_table_statements = mapping.get_create_table_statements(strict_mode)
+        for table, create in zip(mapping.sql_by_table, create_table_statements):
+            if table in CATALOGUE_TABLES:
+                self.catalogue.connection.execute(create)
+        for create in _catalogue_sql:
+            self.catalogue.connection.execute(create)
+        self.catalogue.connection.execute(
+            "insert into shard_catalogue values (?, ?)", (self.shard_by, strict_mode)
+        )
+        if record_version:
+            self.catalogue.connection.execute(
+                "create table schema_version (schema_version text)"
+            )
+            self.catalogue.connection.execute(
+                "insert into schema_version values (?)", (mapping.SCHEMA_VERSION,)
+            )
+        self.strict_mode = strict_mode
+        logger.info(f"The sharded database {self.name} has been initialised")
+
+    def _period(self, timestamp: Optional[str]) -> str:
+        # ISO 8601 timestamps, such as 2021-10-06T06:02:02+00:00
+        if not timestamp:
+            return UNDATED_PERIOD
+        return timestamp[: SHARD_KEYS[self.shard_by][1]]
+
+    def shard(self, period: str) -> SQLiteSink:
+        """
+        The shard for a period, which is created if it doesn't exist yet.
+        """
+        if period in self.shards:
+            return self.shards[period]
+
+        result = self.catalogue.fetch_one(
+            "select file_name from shard where period = ?", (period,)
+        )
+        if result is None:
+            catalogue_path = Path(self.name)
+            file_name = f"{catalogue_path.stem}.{period}{catalogue_path.suffix}"
+        else:
+            file_name = result[0]
+        path = self.directory / file_name
+
+        # A shard may exist without being recorded if a load was interrupted
+        is_new = not path.exists()
+        shard = SQLiteSink(path, self.profile)
+        if is_new:
+            logger.info(f"Creating shard {path} for {period}")
+            shard.create_schema(self.strict_mode)
+        if result is None:
+            self.catalogue.connection.execute(
+                "insert into shard (period, file_name) values (?, ?)",
+                (period, file_name),
+            )
+        self.shards[period] = shard
+        return shard
+
+    def _write(self, period: str, table: str, rows: List[Tuple]):
+        if table == "results_page":
+            self.shard(period).connection.executemany(_results_page_insert, rows)
+        else:
+            self.shard(period).append(table, rows)
+
+    def append(self, table: str, rows: Sequence[Tuple]):
+        if table in CATALOGUE_TABLES:
+            self.catalogue.append(table, rows)
+            return
+
+        by_period: Dict[str, List[Tuple]] = {}
+        if table == "results_page":
+            # The start of a new batch of pages
+            self._pages, self._owners, self._copied = {}, {}, set()
+            inserted_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            file_id = _results_page_columns.index("file_id")
+            page = _results_page_columns.index("page")
+            retrieved_at = _results_page_columns.index("retrieved_at")
+            for row in rows:
+                period = self._period(row[retrieved_at])
+                row = (*row, inserted_at)
+                self._pages[(row[file_id], row[page])] = (period, row)
+                self._copied.add((period, row[file_id], row[page]))
+                by_period.setdefault(period, []).append(row)
+        elif table in ["tweet_by_page", "user_by_page"]:
+            columns = mapping.columns_by_table[table]
+            file_id = columns.index("file_id")
+            source_page = columns.index("source_page")
+            created_at = columns.index("created_at")
+            owner, owner_id = _OWNER_COLUMNS[table]
+            by_creation = (
+                table == "tweet_by_page" and SHARD_KEYS[self.shard_by][0] == "created"
+            )
+            for row in rows:
+                page_key = (row[file_id], row[source_page])
+                if page_key not in self._pages:
+                    raise ValueError(
+                        f"Page {row[source_page]} of file {row[file_id]} was not in "
+                        f"the results_page rows of this batch"
+                    )
+                period, page_row = self._pages[page_key]
+                if by_creation:
+                    period = self._period(row[created_at])
+                    if (period, *page_key) not in self._copied:
+                        self._copied.add((period, *page_key))
+                        self._write(period, "results_page", [page_row])
+                self._owners.setdefault((owner, row[owner_id]), set()).add(period)
+                by_period.setdefault(period, []).append(row)
+        else:
+            # Entities go wherever the tweet or user they belong to went, or if
+            # that isn't known, to every shard written to in this batch
+            owner, owner_id = _OWNER_COLUMNS[table]
+            batch_periods = {period for period, *_ in self._copied}
+            for row in rows:
+                periods = self._owners.get((owner, row[owner_id]), batch_periods)
+                for period in periods:
+                    by_period.setdefault(period, []).append(row)
+
+        for period, period_rows in by_period.items():
+            self._write(period, table, period_rows)
+
+    def fetch_one(self, query: str, parameters: Sequence = ()) -> Optional[Tuple]:
+        """
+        Runs a query on the catalogue.
+        """
+        return self.catalogue.fetch_one(query, parameters)
+
+    def commit(self):
+        # The catalogue is committed last, so load checkpoints are never ahead of
+        # the shards
+        for shard in self.shards.values():
+            shard.commit()
+        self.catalogue.commit()
+
+    def rollback(self):
+        for shard in self.shards.values():
+            shard.rollback()
+        self.catalogue.rollback()
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.close()
+        self.shards = {}
+        self.catalogue.close()
+
+    def check_version(self):
+        """
+        Checks the catalogue and every shard are valid for use with this version of
+        the tidy_tweet library, see `tidy_tweet.sinks.Sink.check_version`.
+        """
+        result = self.fetch_one("select schema_version from schema_version")
+        db_schema_version = None if result is None else result[0]
+        if db_schema_version != mapping.SCHEMA_VERSION:
+            raise SchemaVersionMismatchError(
+                mapping.SCHEMA_VERSION, db_schema_version, self.name
+            )
+        for path in shard_paths(self.name).values():
+            with SQLiteSink(path) as shard:
+                shard.check_version()
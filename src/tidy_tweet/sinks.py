@@ -0,0 +1,175 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence, Tuple
+from logging import getLogger
+from warnings import warn
+import tidy_tweet.tweet_mapping as mapping
+from tidy_tweet._version import version as library_version
+
+logger = getLogger(__name__)
+
+
+class SchemaVersionMismatchError(Exception):
+    def __init__(self, library_schema_version, db_schema_version, db_name, *args):
+        self.library_schema_version = library_schema_version
+        self.db_schema_version = db_schema_version
+        self.db_name = db_name
+        super().__init__(*args)
+
+    def message(self):
+        msg = (
+            f"Database file {self.db_name} is using tidy_tweet database schema "
+            f"version {self.db_schema_version} but the version of tidy_tweet you "
+            f"are running is using tidy_tweet database schema version "
+            f"{self.db_schema_version}. These versions are not compatible. It is "
+            f"recommended to reprocess all your json files into a fresh database."
+        )
+        return msg
+
+    def __str__(self):
+        return "Exception SchemaVersionMismatchError: " + self.message()
+
+
+class LibraryVersionMismatchWarning(Warning):
+    def __init__(self, this_library_version, db_library_version, db_name, *args):
+        self.library_version = this_library_version
+        self.db_library_version = db_library_version
+        self.db_name = db_name
+        super().__init__(*args)
+
+    def message(self):
+        msg = (
+            f"Database file {self.db_name} contains data processed with tidy_tweet "
+            f"version {self.db_library_version}, but the version of tidy_tweet you "
+            f"are currently using is version {self.library_version}. This is not "
+            f"necessarily incompatible, but if you notice any inconsistencies with "
+            f"how the data is parsed, you may wish to reprocess all your json files "
+            f"into a fresh and consistent database."
+        )
+        return msg
+
+    def __str__(self):
+        return "LibraryVersionMismatchWarning: " + self.message()
+
+
+class Sink(ABC):
+    """
+    A database the tidy_tweet tables are stored in, which a `tidy_tweet.Loader`
+    writes to.
+
+    Rows are appended to tables in batches, as tuples of values for the columns
+    `tidy_tweet.tweet_mapping.columns_by_table[table]`, and are kept once committed.
+    Implementations are `tidy_tweet.database.SQLiteSink` and
+    `tidy_tweet.duckdb_database.DuckDBSink`.
+
+    Used as a context manager, a sink is committed and closed at the end of the
+    block, or rolled back and closed if there is an error.
+    """
+
+    name: str
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        self.close()
+
+    @abstractmethod
+    def create_schema(
+        self,
+        strict_mode: bool = True,
+        materialised: bool = False,
+        record_version: bool = True,
+        snapshots: bool = False,
+        rollups: bool = False,
+    ):
+        """
+        Creates the tidy_tweet tables and views in an empty database.
+
+        :param strict_mode: Whether to create tables which reject values of the wrong
+        type, where the database supports both
+        :param materialised: Whether to create the `tweet` and `user` views as tables
+        kept up to date as each page is loaded
+        :param record_version: Whether to record the schema version, so the database
+        can be checked with `check_version`
+        :param snapshots: Whether to store a row per version of each tweet and user
+        rather than per page, see `tidy_tweet.initialise_sqlite`
+        :param rollups: Whether to create tables of daily counts kept up to date as
+        each page is loaded, see `tidy_tweet.initialise_sqlite`
+        """
+
+    @abstractmethod
+    def append(self, table: str, rows: Sequence[Tuple]):
+        """
+        Inserts a batch of rows into one of the tables in
+        `tidy_tweet.tweet_mapping.sql_by_table`, with the same handling of duplicate
+        keys as its insert statement there.
+        """
+
+    @abstractmethod
+    def fetch_one(self, query: str, parameters: Sequence = ()) -> Optional[Tuple]:
+        """
+        Runs a query with "?" parameters, returning its first row or None.
+        """
+
+    def file_id(self, file_name: str) -> int:
+        """
+        The id of a file in the `source_file` table, adding the file with the next
+        unused id if it isn't there yet. Like other rows, a file added this way is
+        only kept once committed.
+        """
+        result = self.fetch_one(
+            "select file_id from source_file where file_name = ?", (file_name,)
+        )
+        if result is not None:
+            return result[0]
+        (file_id,) = self.fetch_one(
+            "select coalesce(max(file_id), 0) + 1 from source_file"
+        )
+        self.append("source_file", [(file_id, file_name)])
+        return file_id
+
+    @abstractmethod
+    def commit(self):
+        pass
+
+    @abstractmethod
+    def rollback(self):
+        pass
+
+    @abstractmethod
+    def close(self):
+        """
+        Closes the database, without committing.
+        """
+
+    def check_version(self):
+        """
+        Checks the database is valid for use with this version of the tidy_tweet
+        library.
+
+        Raises SchemaVersionMismatchError if there is a version mismatch in the
+        database schema - mismatched database schemas are considered incompatible and
+        file processing should be aborted.
+        """
+        logger.debug(f"Checking version compatibility of {self.name}...")
+        result = self.fetch_one("select schema_version from schema_version") or []
+        db_schema_version = None if len(result) == 0 else result[0]
+        result = self.fetch_one("select max(tidy_tweet_version) from results_page")
+        db_library_version = None if result is None else result[0]
+
+        if db_schema_version != mapping.SCHEMA_VERSION:
+            raise SchemaVersionMismatchError(
+                mapping.SCHEMA_VERSION, db_schema_version, self.name
+            )
+        if db_library_version != library_version:
+            warning = LibraryVersionMismatchWarning(
+                library_version, db_library_version, self.name
+            )
+            logger.warning(warning.message())
+            warn(warning)
+        else:
+            logger.info(f"Database {self.name} matches current tidy_tweet version")
@@ -0,0 +1,102 @@
+from typing import Any, Dict, List, Optional
+
+# The stages of loading a file that time is recorded for:
+# - read: reading (and decompressing) lines from the file
+# - decode: decoding each line's json
+# - map: mapping decoded pages to rows
+# - wait: waiting for worker processes to decode and map pages, when loading in
+#   parallel (in which case decode and map are the time spent in the workers)
+# - write: inserting rows into the database
+# - commit: committing to the database
+STAGES = ["read", "decode", "map", "wait", "write", "commit"]
+
+
+class Stats:
+    """
+    Time spent in each of the `STAGES` of loading, along with the number of pages,
+    bytes and rows per table loaded.
+
+    Rows are counted as they are mapped, so rows ignored by the database as
+    duplicates are included.
+
+    For a single file, `start_offset` is the byte offset loading started from (when
+    resuming) and `offset` the byte offset of the end of the last page mapped, if
+    known.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.pages = 0
+        self.bytes_read = 0
+        self.rows: Dict[str, int] = {}
+        self.start_offset = 0
+        self.offset: Optional[int] = None
+
+    def add_rows(self, page_mappings: Dict[str, List]):
+        for table, rows in page_mappings.items():
+            self.rows[table] = self.rows.get(table, 0) + len(rows)
+
+    def add(self, other: "Stats"):
+        """
+        Adds the counts and times of another `Stats` to these.
+        """
+        # Copied, as stats may be read by another thread while a file is loading
+        for stage, seconds in list(other.seconds.items()):
+            self.seconds[stage] = self.seconds[stage] + seconds
+        self.pages = self.pages + other.pages
+        self.bytes_read = self.bytes_read + other.bytes_read
+        for table, rows in list(other.rows.items()):
+            self.rows[table] = self.rows.get(table, 0) + rows
+        if other.offset is not None:
+            self.start_offset = other.start_offset
+            self.offset = other.offset
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "seconds": dict(self.seconds),
+            "pages": self.pages,
+            "bytes_read": self.bytes_read,
+            "rows": dict(self.rows),
+        }
+
+
+class LoadStats:
+    """
+    `Stats` for each file loaded by a `tidy_tweet.Loader`, and in total.
+
+    Write and commit times are counted for the file being loaded when the write or
+    commit happens.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, Stats] = {}
+
+    def file(self, file_name: str) -> Stats:
+        """
+        The stats of a file, which are created if the file has none yet.
+        """
+        if file_name not in self.files:
+            self.files[file_name] = Stats()
+        return self.files[file_name]
+
+    @property
+    def total(self) -> Stats:
+        total = Stats()
+        for file_stats in list(self.files.values()):
+            total.add(file_stats)
+        # Offsets are positions within a single file
+        total.start_offset = 0
+        total.offset = None
+        return total
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        The stats as a dictionary that can be saved as json.
+        """
+        return {
+            "total": self.total.as_dict(),
+            "files": {
+                file_name: file_stats.as_dict()
+                for file_name, file_stats in self.files.items()
+            },
+        }
@@ -1,4 +1,4 @@
-from typing import Dict, List
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
 from tidy_tweet.utilities import add_mappings, clean_sql_statement
 from json import dumps
 from logging import getLogger
@@ -19,215 +19,247 @@ except ImportError:
 
 # --- SCHEMA VERSION ---
 # Update this every time the database schema is changed!
-SCHEMA_VERSION = "2023-06-22"
+SCHEMA_VERSION = "2026-10-16.3"
 
 
 sql_by_table: Dict[str, Dict[str, str]] = {}
 sql_views: Dict[str, str] = {}
+# Secondary indexes are not part of the schema proper: they are built in one pass
+# after loading, rather than maintained row by row (see database.build_indexes)
+sql_indexes: Dict[str, str] = {}
+# Optional replacements for some of the views: a table with one row per id, kept up
+# to date by a trigger as each page is loaded (see database.initialise_sqlite)
+sql_materialised_views: Dict[str, Dict[str, str]] = {}
+# Optional replacements for the tweet_by_page and user_by_page tables: a table with a
+# row per version of each tweet or user, which a trigger on a view of the original
+# table's name only adds to when a row differs from the last version (see
+# database.initialise_sqlite), and the views and indexes to use with them
+sql_snapshot_tables: Dict[str, Dict[str, str]] = {}
+sql_snapshot_views: Dict[str, str] = {}
+sql_snapshot_indexes: Dict[str, str] = {}
+# Optional full text search indexes, filled in bulk with the rows added since they
+# were last updated, whenever a load is committed (see database.update_search_tables)
+sql_search_tables: Dict[str, Dict[str, str]] = {}
+# Optional tables of daily counts, kept up to date by triggers as each page is loaded
+# (see database.initialise_sqlite), and the triggers to use with snapshots instead
+sql_rollup_tables: Dict[str, str] = {}
+sql_rollup_triggers: Dict[str, str] = {}
+sql_snapshot_rollup_triggers: Dict[str, str] = {}
+# The columns of each table, in the order of the values in its mapped rows
+columns_by_table: Dict[str, List[str]] = {}
+
+
+# --- Table definitions ---
+class Column(NamedTuple):
+    """
+    A column of a tidy_tweet table.
+
+    `value` is a Python expression for the column's value, in terms of the arguments
+    of the table's extractor. Columns with no value (such as those with a default) are
+    not inserted by tidy_tweet.
+    """
+
+    name: str
+    type: str
+    value: Optional[str]
+    constraints: str = ""
+    comment: str = ""
+
+
+# The definitions of the columns in columns_by_table, for storage other than SQLite
+column_definitions_by_table: Dict[str, List[Column]] = {}
+
+
+def _create_table_sql(
+    table_name: str, columns: Sequence[Column], table_constraints: Sequence[str] = ()
+) -> str:
+    column_lines = []
+    for column in columns:
+        line = f"    {column.name} {column.type}"
+        if column.constraints:
+            line = line + " " + column.constraints
+        column_lines.append((line, column.comment))
+    column_lines.extend(("    " + constraint, "") for constraint in table_constraints)
+
+    create = f"\ncreate table {table_name} (\n"
+    for i, (line, comment) in enumerate(column_lines):
+        if i < len(column_lines) - 1:
+            line = line + ","
+        if comment:
+            line = line + " -- " + comment
+        create = create + line + "\n"
+    return create + ")\n"
+
+
+def define_table(
+    table_name: str,
+    extractor_arguments: str,
+    columns: Sequence[Column],
+    table_constraints: Sequence[str] = (),
+    insert: str = "insert",
+) -> Callable[..., Tuple]:
+    """
+    Generates the create and insert statements for a table from its columns, adding
+    them to `sql_by_table`, and compiles an extractor for the table's rows.
+
+    The extractor is a function taking `extractor_arguments` and returning a tuple of
+    the values of the table's inserted columns, which binds to the positional
+    parameters of the insert statement.
+
+    :param insert: The insert verb, e.g. "insert or ignore"
+    """
+    create = _create_table_sql(table_name, columns, table_constraints)
+
+    inserted = [column for column in columns if column.value is not None]
+    names = [column.name for column in inserted]
+    sql_by_table[table_name] = {
+        "create": create,
+        "insert": f"{insert} into {table_name} ({', '.join(names)}) "
+        f"values ({', '.join('?' for _ in inserted)})",
+    }
+    columns_by_table[table_name] = names
+    column_definitions_by_table[table_name] = inserted
+
+    values = ", ".join(column.value for column in inserted)
+    return eval(
+        compile(
+            f"lambda {extractor_arguments}: ({values},)",
+            f"<tidy_tweet {table_name} extractor>",
+            "eval",
+        ),
+        {},
+    )
+
 
 # --- Entities tables ---
+def _define_entity_table(
+    source_type: str,
+    entity: str,
+    entity_description: str,
+    entity_columns: Sequence[Column],
+    key: str,
+) -> Callable[..., Tuple]:
+    """
+    Entity tables are the same for tweets and users apart from the source id column.
+    """
+    source_id = f"{source_type}_id"
+    return define_table(
+        f"{source_type}_{entity}",
+        "entity, source_id, field",
+        [
+            Column(source_id, "text", "source_id", f"references {source_type} (id)"),
+            Column(
+                "field",
+                "text",
+                "field",
+                "not null",
+                'e.g. "description", "text" - which field of the source object the '
+                f"{entity_description} is in",
+            ),
+            *entity_columns,
+        ],
+        [f"primary key ({source_id}, {key}) on conflict ignore"],
+    )
+
+
 # URLs
+url_columns = [
+    Column("url", "text", 'entity["url"]', "not null", "t.co shortened URL"),
+    # These fields are not guaranteed to be present - if a user copies and pastes a
+    # shortened url into a profile, it won't be expanded - eg
+    # https://twitter.com/SAHU_Finance
+    Column("expanded_url", "text", 'entity.get("expanded_url")'),
+    Column("display_url", "text", 'entity.get("display_url")'),
+]
 # URLs from tweets
-sql_by_table["tweet_url"] = {
-    "create": """
-create table tweet_url (
-    tweet_id text references tweet (id),
-    field text not null, -- e.g. "description", "text" - which field of the source
-                         -- object the URL is in
-    url text not null, -- t.co shortened URL
-    expanded_url text,
-    display_url text,
-    primary key (tweet_id, url) on conflict ignore
-)
-    """,
-    "insert": """
-insert into tweet_url (
-    tweet_id, field,
-    url, expanded_url, display_url
-) values (
-    :source_id, :field,
-    :url, :expanded_url, :display_url
-)
-    """,
-}
+_extract_tweet_url = _define_entity_table("tweet", "url", "URL", url_columns, "url")
 # URLs from user profiles
-sql_by_table["user_url"] = {
-    "create": """
-create table user_url (
-    user_id text references user (id),
-    field text not null, -- e.g. "description", "text" - which field of the source
-                         -- object the URL is in
-    url text not null, -- t.co shortened URL
-    expanded_url text,
-    display_url text,
-    primary key (user_id, url) on conflict ignore
-)
-    """,
-    "insert": """
-insert into user_url (
-    user_id, field,
-    url, expanded_url, display_url
-) values (
-    :source_id, :field,
-    :url, :expanded_url, :display_url
-)
-    """,
-}
+_extract_user_url = _define_entity_table("user", "url", "URL", url_columns, "url")
 
 
 def map_urls(
     source_id: str, source_type: str, field: str, url_json_list: List[Dict]
-) -> Dict[str, List[Dict]]:
-    table_name = "tweet_url" if source_type == "tweet" else "user_url"
-
-    url_maps = []
-    for url_json in url_json_list:
-        url_maps.append(
-            {
-                "source_id": source_id,
-                "field": field,
-                "url": url_json["url"],
-                # These fields are not guaranteed to be present - if a user
-                # copies and pastes a shortened url into a profile, it won't
-                # be expanded - eg https://twitter.com/SAHU_Finance
-                "expanded_url": url_json.get("expanded_url", None),
-                "display_url": url_json.get("display_url", None),
-            }
-        )
+) -> Dict[str, List[Tuple]]:
+    if source_type == "tweet":
+        table_name, extract = "tweet_url", _extract_tweet_url
+    else:
+        table_name, extract = "user_url", _extract_user_url
 
-    return {table_name: url_maps}
+    return {table_name: [extract(u, source_id, field) for u in url_json_list]}
 
 
 # Hashtags
+hashtag_columns = [
+    Column("hashtag", "text", 'entity["tag"]', "not null"),
+    # Note that lower() could be done in SQLite by making hashtag_lower a generated
+    # column, however the SQLite lower() only handles ASCII while the python
+    # str.lower() handles Unicode
+    Column(
+        "hashtag_lower",
+        "text",
+        'entity["tag"].lower()',
+        comment="Normalised, as hashtags are case-insensitive on Twitter",
+    ),
+]
 # Hashtags from tweets
-sql_by_table["tweet_hashtag"] = {
-    "create": """
-create table tweet_hashtag (
-    tweet_id text references tweet (id),
-    field text not null, -- e.g. "description", "text" - which field of the source
-                         -- object the hashtag is in
-    hashtag text not null,
-    hashtag_lower text, -- Normalised, as hashtags are case-insensitive on Twitter
-    primary key (tweet_id, hashtag) on conflict ignore
-)
-    """,
-    "insert": """
-insert into tweet_hashtag (
-    tweet_id, field,
-    hashtag, hashtag_lower
-) values (
-    :source_id, :field,
-    :hashtag, :hashtag_lower
+_extract_tweet_hashtag = _define_entity_table(
+    "tweet", "hashtag", "hashtag", hashtag_columns, "hashtag"
 )
-    """,
-}
+sql_indexes[
+    "tweet_hashtag_hashtag_lower"
+] = "create index tweet_hashtag_hashtag_lower on tweet_hashtag (hashtag_lower)"
 # Hashtags from user profiles
-sql_by_table["user_hashtag"] = {
-    "create": """
-create table user_hashtag (
-    user_id text references user (id),
-    field text not null, -- e.g. "description", "text" - which field of the source
-                         -- object the hashtag is in
-    hashtag text not null,
-    hashtag_lower text, -- Normalised, as hashtags are case-insensitive on Twitter
-    primary key (user_id, hashtag) on conflict ignore
+_extract_user_hashtag = _define_entity_table(
+    "user", "hashtag", "hashtag", hashtag_columns, "hashtag"
 )
-    """,
-    "insert": """
-insert into user_hashtag (
-    user_id, field,
-    hashtag, hashtag_lower
-) values (
-    :source_id, :field,
-    :hashtag, :hashtag_lower
-)
-    """,
-}
 
 
 def map_hashtags(
     source_id: str, source_type: str, field: str, tag_json_list: List[Dict]
-) -> Dict[str, List[Dict]]:
-    table_name = "tweet_hashtag" if source_type == "tweet" else "user_hashtag"
-
-    tag_mappings = [
-        {
-            "source_id": source_id,
-            "field": field,
-            "hashtag": t["tag"],
-            # Note that lower() could be done in SQLite by making hashtag_lower a
-            # generated column, however the SQLite lower() only handles ASCII while
-            # the python str.lower() handles Unicode
-            "hashtag_lower": t["tag"].lower(),
-        }
-        for t in tag_json_list
-    ]
-    return {table_name: tag_mappings}
+) -> Dict[str, List[Tuple]]:
+    if source_type == "tweet":
+        table_name, extract = "tweet_hashtag", _extract_tweet_hashtag
+    else:
+        table_name, extract = "user_hashtag", _extract_user_hashtag
+
+    return {table_name: [extract(t, source_id, field) for t in tag_json_list]}
 
 
 # Mentions
+mention_columns = [
+    Column(
+        "username",
+        "text",
+        'entity["username"]',
+        "not null",
+        "username of mentioned user",
+    ),
+]
 # Mentions in tweets
-sql_by_table["tweet_mention"] = {
-    "create": """
-create table tweet_mention (
-    tweet_id text references tweet (id),
-    field text not null, -- e.g. "description", "text" - which field of the source
-                         -- object the mention is in
-    username text not null, -- username of mentioned user
-    primary key (tweet_id, username) on conflict ignore
+_extract_tweet_mention = _define_entity_table(
+    "tweet", "mention", "mention", mention_columns, "username"
 )
-    """,
-    "insert": """
-insert into tweet_mention (
-    tweet_id, field,
-    username
-) values (
-    :source_id, :field,
-    :username
-)
-    """,
-}
 # Mentions in user profiles
-sql_by_table["user_mention"] = {
-    "create": """
-create table user_mention (
-    user_id text references user (id),
-    field text not null, -- e.g. "description", "text" - which field of the source
-                         -- object the mention is in
-    username text not null, -- username of mentioned user
-    primary key (user_id, username) on conflict ignore
+_extract_user_mention = _define_entity_table(
+    "user", "mention", "mention", mention_columns, "username"
 )
-    """,
-    "insert": """
-insert into user_mention (
-    user_id, field,
-    username
-) values (
-    :source_id, :field,
-    :username
-)
-    """,
-}
 
 
 def map_mentions(
     source_id: str, source_type: str, field: str, mention_json_list: List[Dict]
-) -> Dict[str, List[Dict]]:
-    table_name = "tweet_mention" if source_type == "tweet" else "user_mention"
-
-    mention_mappings = [
-        {
-            "source_id": source_id,
-            "field": field,
-            "username": t["username"],
-        }
-        for t in mention_json_list
-    ]
-    return {table_name: mention_mappings}
+) -> Dict[str, List[Tuple]]:
+    if source_type == "tweet":
+        table_name, extract = "tweet_mention", _extract_tweet_mention
+    else:
+        table_name, extract = "user_mention", _extract_user_mention
+
+    return {table_name: [extract(m, source_id, field) for m in mention_json_list]}
 
 
 # Entities objects
-def map_entities(source_id, source_type, field, entities_json) -> Dict[str, List[Dict]]:
+def map_entities(
+    source_id, source_type, field, entities_json
+) -> Dict[str, List[Tuple]]:
     mappings = {}
 
     for entity_type, entity_data in entities_json.items():
@@ -248,56 +280,30 @@ def map_entities(source_id, source_type, field, entities_json) -> Dict[str, List
 # --- Includes tables ---
 
 # media
-sql_by_table["media"] = {
-    "create": """
-create table media (
-    url text,
-    preview_image_url text,
-    height integer,
-    width integer,
-    type text,
-    duration_ms integer,
-    view_count integer,
-    alt_text text,
-    media_key text primary key
-)
-    """,
-    "insert": """
-insert or replace into media (
-    media_key, url, type,
-    height, width, preview_image_url, alt_text,
-    duration_ms, view_count
-) values (
-    :media_key, :url, :type,
-    :height, :width, :preview_image_url, :alt_text,
-    :duration_ms, :view_count
+_extract_media = define_table(
+    "media",
+    "media",
+    [
+        Column("url", "text", 'media.get("url")'),
+        Column("preview_image_url", "text", 'media.get("preview_image_url")'),
+        Column("height", "integer", 'media.get("height")'),
+        Column("width", "integer", 'media.get("width")'),
+        Column("type", "text", 'media.get("type")'),
+        Column("duration_ms", "integer", 'media.get("duration_ms")'),
+        Column(
+            "view_count",
+            "integer",
+            'media.get("public_metrics", {}).get("view_count")',
+        ),
+        Column("alt_text", "text", 'media.get("alt_text")'),
+        Column("media_key", "text", 'media["media_key"]', "primary key"),
+    ],
+    insert="insert or replace",
 )
-    """,
-}
 
 
-def map_media(media_list_json) -> Dict[str, List[Dict]]:
-    mapped_media = []
-    for media_json in media_list_json:
-        try:
-            view_count = media_json["public_metrics"]["view_count"]
-        except KeyError:
-            view_count = None
-
-        mapped_media.append(
-            {
-                "media_key": media_json["media_key"],
-                "url": media_json.get("url", None),
-                "type": media_json.get("type", None),
-                "height": media_json.get("height", None),
-                "width": media_json.get("width", None),
-                "preview_image_url": media_json.get("preview_image_url", None),
-                "alt_text": media_json.get("alt_text", None),
-                "duration_ms": media_json.get("duration_ms", None),
-                "view_count": view_count,
-            }
-        )
-    return {"media": mapped_media}
+def map_media(media_list_json) -> Dict[str, List[Tuple]]:
+    return {"media": [_extract_media(media) for media in media_list_json]}
 
 
 # places - TODO
@@ -305,45 +311,33 @@ def map_media(media_list_json) -> Dict[str, List[Dict]]:
 # users
 # TODO: Fields not included yet:
 # - public_metrics
-sql_by_table["user_by_page"] = {
-    "create": """
-create table user_by_page (
-    name text,
-    profile_image_url text,
-    id text,
-    created_at text,
-    protected text,
-    description text,
-    location text,
-    pinned_tweet_id text,
-    verified integer, -- boolean
-    url text,
-    username text,
-    source_page integer references results_page (page),
-    source_file text references results_page (file_name),
-    primary key (id, source_file, source_page)
+_extract_user_by_page = define_table(
+    "user_by_page",
+    "user, file_id, page_num",
+    [
+        Column("name", "text", 'user["name"]'),
+        Column("profile_image_url", "text", 'user["profile_image_url"]'),
+        Column("id", "text", 'user["id"]'),
+        Column("created_at", "text", 'user["created_at"]'),
+        Column("protected", "text", 'user["protected"]'),
+        Column("description", "text", 'user.get("description")'),
+        Column("location", "text", 'user.get("location")'),
+        Column("pinned_tweet_id", "text", 'user.get("pinned_tweet_id")'),
+        Column("verified", "integer", 'user["verified"]', comment="boolean"),
+        Column("url", "text", 'user.get("url")'),
+        Column("username", "text", 'user["username"]'),
+        Column("source_page", "integer", "page_num", "references results_page (page)"),
+        Column("file_id", "integer", "file_id", "references source_file (file_id)"),
+    ],
+    ["primary key (id, file_id, source_page)"],
+    insert="insert or ignore",
 )
-    """,
-    "insert": """
-insert or ignore into user_by_page (
-    id, username, name, url,
-    profile_image_url, description,
-    created_at,
-    protected, verified,
-    location,
-    pinned_tweet_id,
-    source_page, source_file
-) values (
-    :id, :username, :name, :url,
-    :profile_image_url, :description,
-    :created_at,
-    :protected, :verified,
-    :location,
-    :pinned_tweet_id,
-    :page_num, :source_file
+# Usernames are case-insensitive on Twitter, and mentions may not match the case of
+# the username (see network.py)
+sql_indexes["user_by_page_username"] = (
+    "create index user_by_page_username on user_by_page (username collate nocase)"
 )
-    """,
-}
+
 sql_views[
     "user"
 ] = """
@@ -359,29 +353,70 @@ select
 from user_by_page
 left join results_page on
     user_by_page.source_page = results_page.page
-    and user_by_page.source_file = results_page.file_name
+    and user_by_page.file_id = results_page.file_id
 group by user_by_page.id
 """
+sql_materialised_views["user"] = {
+    "create": """
+create table user (
+    id text primary key,
+    username text,
+    name text,
+    url text,
+    profile_image_url text,
+    description text,
+    created_at text,
+    protected text,
+    verified integer, -- boolean
+    location text,
+    pinned_tweet_id text,
+    retrieved_at text -- time of the most recent page the user was retrieved in
+)
+    """,
+    "trigger": """
+create trigger user_by_page_materialise after insert on user_by_page
+begin
+    insert into user (
+        id, username, name, url,
+        profile_image_url, description,
+        created_at,
+        protected, verified,
+        location,
+        pinned_tweet_id,
+        retrieved_at
+    )
+    select
+        new.id, new.username, new.name, new.url,
+        new.profile_image_url, new.description,
+        new.created_at,
+        new.protected, new.verified,
+        new.location,
+        new.pinned_tweet_id,
+        results_page.retrieved_at
+    from results_page
+    where
+        results_page.page = new.source_page
+        and results_page.file_id = new.file_id
+    on conflict (id) do update set
+        username = excluded.username,
+        name = excluded.name,
+        url = excluded.url,
+        profile_image_url = excluded.profile_image_url,
+        description = excluded.description,
+        created_at = excluded.created_at,
+        protected = excluded.protected,
+        verified = excluded.verified,
+        location = excluded.location,
+        pinned_tweet_id = excluded.pinned_tweet_id,
+        retrieved_at = excluded.retrieved_at
+    where excluded.retrieved_at >= user.retrieved_at;
+end
+    """,
+}
 
 
-def map_user(user_json, source_file, page_num) -> Dict[str, List[Dict]]:
-    user_map = {
-        "id": user_json["id"],
-        "username": user_json["username"],
-        "name": user_json["name"],
-        "url": user_json.get("url", None),
-        "profile_image_url": user_json["profile_image_url"],
-        "description": user_json.get("description", None),
-        "created_at": user_json["created_at"],
-        "protected": user_json["protected"],
-        "verified": user_json["verified"],
-        "location": user_json.get("location", None),
-        "pinned_tweet_id": user_json.get("pinned_tweet_id", None),
-        "source_file": source_file,
-        "page_num": page_num,
-    }
-
-    mappings = {"user_by_page": [user_map]}
+def map_user(user_json, file_id: int, page_num) -> Dict[str, List[Tuple]]:
+    mappings = {"user_by_page": [_extract_user_by_page(user_json, file_id, page_num)]}
 
     # Entities
     if "entities" in user_json:
@@ -398,60 +433,69 @@ def map_user(user_json, source_file, page_num) -> Dict[str, List[Dict]]:
 # - entities
 # - context_annotations
 
-sql_by_table["tweet_by_page"] = {
-    "create": """
-create table tweet_by_page (
-    id text,
-    source_page integer references results_page (page),
-    reply_settings text,
-    conversation_id text,
-    created_at text,
-    retweeted_tweet_id text references tweet (id),
-    quoted_tweet_id text references tweet (id),
-    replied_to_tweet_id text references tweet (id),
-    in_reply_to_user_id text references user (id),
-    author_id text references user (id),
-    text text,
-    lang text,
-    source text,
-    possibly_sensitive integer, -- boolean
-    like_count integer,
-    quote_count integer,
-    reply_count integer,
-    retweet_count integer,
-    source_file text references results_page (file_name),
-    directly_collected integer, -- boolean
-    primary key (id, source_file, source_page)
+# `references` maps each type of referenced tweet to the referenced tweet's id
+_extract_tweet_by_page = define_table(
+    "tweet_by_page",
+    "tweet, directly_collected, file_id, page_num, references",
+    [
+        Column("id", "text", 'tweet["id"]'),
+        Column("source_page", "integer", "page_num", "references results_page (page)"),
+        Column("reply_settings", "text", 'tweet["reply_settings"]'),
+        Column("conversation_id", "text", 'tweet["conversation_id"]'),
+        Column("created_at", "text", 'tweet["created_at"]'),
+        Column(
+            "retweeted_tweet_id",
+            "text",
+            'references.get("retweeted")',
+            "references tweet (id)",
+        ),
+        Column(
+            "quoted_tweet_id",
+            "text",
+            'references.get("quoted")',
+            "references tweet (id)",
+        ),
+        Column(
+            "replied_to_tweet_id",
+            "text",
+            'references.get("replied_to")',
+            "references tweet (id)",
+        ),
+        Column(
+            "in_reply_to_user_id",
+            "text",
+            'tweet.get("in_reply_to_user_id")',
+            "references user (id)",
+        ),
+        Column("author_id", "text", 'tweet["author_id"]', "references user (id)"),
+        Column("text", "text", 'tweet["text"]'),
+        Column("lang", "text", 'tweet["lang"]'),
+        Column("source", "text", 'tweet.get("source")'),
+        Column(
+            "possibly_sensitive",
+            "integer",
+            'tweet["possibly_sensitive"]',
+            comment="boolean",
+        ),
+        Column("like_count", "integer", 'tweet["public_metrics"]["like_count"]'),
+        Column("quote_count", "integer", 'tweet["public_metrics"]["quote_count"]'),
+        Column("reply_count", "integer", 'tweet["public_metrics"]["reply_count"]'),
+        Column("retweet_count", "integer", 'tweet["public_metrics"]["retweet_count"]'),
+        Column("file_id", "integer", "file_id", "references source_file (file_id)"),
+        Column(
+            "directly_collected",
+            "integer",
+            "directly_collected",
+            comment="boolean",
+        ),
+    ],
+    ["primary key (id, file_id, source_page)"],
+    insert="insert or ignore",
 )
-    """,
-    "insert": """
-insert or ignore into tweet_by_page (
-    id, author_id,
-    text, lang, source,
-    possibly_sensitive, reply_settings,
-    created_at,
-    conversation_id,
-    retweeted_tweet_id,
-    quoted_tweet_id,
-    replied_to_tweet_id,
-    in_reply_to_user_id,
-    like_count, quote_count, reply_count, retweet_count,
-    directly_collected, source_file, source_page
-) values (
-    :id, :author_id,
-    :text, :lang, :source,
-    :possibly_sensitive, :reply_settings,
-    :created_at,
-    :conversation_id,
-    :retweeted_tweet_id,
-    :quoted_tweet_id,
-    :replied_to_tweet_id,
-    :in_reply_to_user_id,
-    :like_count, :quote_count, :reply_count, :retweet_count,
-    :directly_collected, :source_file, :source_page
-)
-    """,
-}
+for column in ["author_id", "conversation_id", "retweeted_tweet_id", "created_at"]:
+    sql_indexes[
+        f"tweet_by_page_{column}"
+    ] = f"create index tweet_by_page_{column} on tweet_by_page ({column})"
 sql_views[
     "tweet"
 ] = """
@@ -471,57 +515,104 @@ select
 from tweet_by_page
 left join results_page on
     tweet_by_page.source_page = results_page.page
-    and tweet_by_page.source_file = results_page.file_name
+    and tweet_by_page.file_id = results_page.file_id
 group by tweet_by_page.id
 """
+sql_materialised_views["tweet"] = {
+    "create": """
+create table tweet (
+    id text primary key,
+    author_id text,
+    text text,
+    lang text,
+    source text,
+    possibly_sensitive integer, -- boolean
+    reply_settings text,
+    created_at text,
+    conversation_id text,
+    retweeted_tweet_id text,
+    quoted_tweet_id text,
+    replied_to_tweet_id text,
+    in_reply_to_user_id text,
+    like_count integer,
+    quote_count integer,
+    reply_count integer,
+    retweet_count integer,
+    retrieved_at text -- time of the most recent page the tweet was retrieved in
+)
+    """,
+    "trigger": """
+create trigger tweet_by_page_materialise after insert on tweet_by_page
+begin
+    insert into tweet (
+        id, author_id,
+        text, lang, source,
+        possibly_sensitive, reply_settings,
+        created_at,
+        conversation_id,
+        retweeted_tweet_id,
+        quoted_tweet_id,
+        replied_to_tweet_id,
+        in_reply_to_user_id,
+        like_count, quote_count, reply_count, retweet_count,
+        retrieved_at
+    )
+    select
+        new.id, new.author_id,
+        new.text, new.lang, new.source,
+        new.possibly_sensitive, new.reply_settings,
+        new.created_at,
+        new.conversation_id,
+        new.retweeted_tweet_id,
+        new.quoted_tweet_id,
+        new.replied_to_tweet_id,
+        new.in_reply_to_user_id,
+        new.like_count, new.quote_count, new.reply_count, new.retweet_count,
+        results_page.retrieved_at
+    from results_page
+    where
+        results_page.page = new.source_page
+        and results_page.file_id = new.file_id
+    on conflict (id) do update set
+        author_id = excluded.author_id,
+        text = excluded.text,
+        lang = excluded.lang,
+        source = excluded.source,
+        possibly_sensitive = excluded.possibly_sensitive,
+        reply_settings = excluded.reply_settings,
+        created_at = excluded.created_at,
+        conversation_id = excluded.conversation_id,
+        retweeted_tweet_id = excluded.retweeted_tweet_id,
+        quoted_tweet_id = excluded.quoted_tweet_id,
+        replied_to_tweet_id = excluded.replied_to_tweet_id,
+        in_reply_to_user_id = excluded.in_reply_to_user_id,
+        like_count = excluded.like_count,
+        quote_count = excluded.quote_count,
+        reply_count = excluded.reply_count,
+        retweet_count = excluded.retweet_count,
+        retrieved_at = excluded.retrieved_at
+    where excluded.retrieved_at >= tweet.retrieved_at;
+end
+    """,
+}
 
 
 def map_tweet(
-    tweet_json, directly_collected: bool, source_file: str, page_num
-) -> Dict[str, List[Dict]]:
-    tweet_map = {
-        "id": tweet_json["id"],
-        "author_id": tweet_json["author_id"],
-        "text": tweet_json["text"],
-        "lang": tweet_json["lang"],
-        "source": tweet_json.get("source", None),
-        "possibly_sensitive": tweet_json["possibly_sensitive"],
-        "reply_settings": tweet_json["reply_settings"],
-        "created_at": tweet_json["created_at"],
-        "conversation_id": tweet_json["conversation_id"],
-        "in_reply_to_user_id": None,
-        "like_count": tweet_json["public_metrics"]["like_count"],
-        "quote_count": tweet_json["public_metrics"]["quote_count"],
-        "reply_count": tweet_json["public_metrics"]["reply_count"],
-        "retweet_count": tweet_json["public_metrics"]["retweet_count"],
-        "directly_collected": directly_collected,
-        "source_file": source_file,
-        "source_page": page_num,
-    }
-
-    if "in_reply_to_user_id" in tweet_json:
-        tweet_map["in_reply_to_user_id"] = tweet_json["in_reply_to_user_id"]
-
+    tweet_json, directly_collected: bool, file_id: int, page_num
+) -> Dict[str, List[Tuple]]:
     # A tweet can have no more than one referenced tweet per type, but may have
     # multiple references of different types.
     # e.g. a tweet may have both a quoted tweet and a replied to tweet, but can't
     # have two replied_to tweets.
-    rt_id = None
-    qt_id = None
-    replied_to_id = None
-    if "referenced_tweets" in tweet_json and len(tweet_json["referenced_tweets"]) > 0:
-        for t in tweet_json["referenced_tweets"]:
-            if t["type"] == "retweeted":
-                rt_id = t["id"]
-            elif t["type"] == "quoted":
-                qt_id = t["id"]
-            elif t["type"] == "replied_to":
-                replied_to_id = t["id"]
-    tweet_map["retweeted_tweet_id"] = rt_id
-    tweet_map["quoted_tweet_id"] = qt_id
-    tweet_map["replied_to_tweet_id"] = replied_to_id
-
-    mappings = {"tweet_by_page": [tweet_map]}
+    references = {t["type"]: t["id"] for t in tweet_json.get("referenced_tweets", [])}
+
+    mappings = {
+        "tweet_by_page": [
+            _extract_tweet_by_page(
+                tweet_json, directly_collected, file_id, page_num, references
+            )
+        ]
+    }
 
     # Entities
     if "entities" in tweet_json:
@@ -535,44 +626,79 @@ def map_tweet(
 
 # --- Metadata ---
 # --- Results files
-sql_by_table["results_page"] = {
-    "create": """
-create table results_page (
-    page integer,  -- page number within the file
-    file_name text,
-    oldest_id text,  -- oldest tweet id in page
-    newest_id text,  -- newest tweet id in page
-    result_count integer,  -- count given in API response
-    inserted_at text default current_timestamp,
-    twarc_version text,
-    tidy_tweet_version text,
-    retrieved_at text, -- time response from twitter was recorded
-    request_url text,
-    additional_metadata text, -- extra metadata from twarc and twitter
-    primary key (file_name, page)
+# Files are referred to by an integer id everywhere else, so the name of each file is
+# only stored once (see sinks.Sink.file_id)
+define_table(
+    "source_file",
+    "file_id, file_name",
+    [
+        Column("file_id", "integer", "file_id", "primary key"),
+        Column(
+            "file_name",
+            "text",
+            "file_name",
+            "not null unique",
+            "name the file was loaded as",
+        ),
+    ],
+    insert="insert or ignore",
 )
-    """,
-    "insert": """
-insert into results_page (
-    page, file_name,
-    oldest_id, newest_id, result_count,
-    retrieved_at, request_url,
-    twarc_version, tidy_tweet_version,
-    additional_metadata
-) values (
-    :page, :file_name,
-    :oldest_id, :newest_id, :result_count,
-    :retrieved_at, :request_url,
-    :twarc_version, :tidy_tweet_version,
-    :additional_metadata
+_extract_results_page = define_table(
+    "results_page",
+    "metadata",
+    [
+        Column(
+            "page", "integer", 'metadata["page"]', comment="page number within the file"
+        ),
+        Column(
+            "file_id",
+            "integer",
+            'metadata["file_id"]',
+            "references source_file (file_id)",
+        ),
+        Column(
+            "oldest_id",
+            "text",
+            'metadata["oldest_id"]',
+            comment="oldest tweet id in page",
+        ),
+        Column(
+            "newest_id",
+            "text",
+            'metadata["newest_id"]',
+            comment="newest tweet id in page",
+        ),
+        Column(
+            "result_count",
+            "integer",
+            'metadata["result_count"]',
+            comment="count given in API response",
+        ),
+        Column("inserted_at", "text", None, "default current_timestamp"),
+        Column("twarc_version", "text", 'metadata["twarc_version"]'),
+        Column("tidy_tweet_version", "text", 'metadata["tidy_tweet_version"]'),
+        Column(
+            "retrieved_at",
+            "text",
+            'metadata["retrieved_at"]',
+            comment="time response from twitter was recorded",
+        ),
+        Column("request_url", "text", 'metadata["request_url"]'),
+        Column(
+            "additional_metadata",
+            "text",
+            'metadata["additional_metadata"]',
+            comment="extra metadata from twarc and twitter",
+        ),
+    ],
+    ["primary key (file_id, page)"],
 )
-    """,
-}
 sql_views[
     "results_file"
 ] = """
 create view results_file as
 select
+    results_page.file_id,
     file_name,
     min(oldest_id) as oldest_id,  -- oldest tweet id in file
     max(newest_id) as newest_id,  -- newest tweet id in file
@@ -583,14 +709,15 @@ select
     min(retrieved_at) as retrieved_at_min, -- earliest retrieval time for pages in file
     max(retrieved_at) as retrieved_at_max -- latest retrieval time for pages in file
 from results_page
-group by file_name
+left join source_file on results_page.file_id = source_file.file_id
+group by results_page.file_id
 """
 
 
 def map_page_metadata(
-    filename: str, page_num: int, page_metadata_json: Dict, twarc_metadata_json: Dict
-) -> Dict:
-    metadata = {"file_name": filename, "page": page_num}
+    file_id: int, page_num: int, page_metadata_json: Dict, twarc_metadata_json: Dict
+) -> Tuple:
+    metadata = {"file_id": file_id, "page": page_num}
 
     # Tidy tweet metadata
     metadata["tidy_tweet_version"] = version
@@ -616,7 +743,396 @@ def map_page_metadata(
 
     metadata["additional_metadata"] = dumps(extras, ensure_ascii=False)
 
-    return metadata
+    return _extract_results_page(metadata)
+
+
+# --- Loading progress ---
+# The last page of each file committed to the database, so loading can be resumed
+define_table(
+    "load_checkpoint",
+    "file_name, page, byte_offset",
+    [
+        Column("file_name", "text", "file_name", "primary key"),
+        Column(
+            "page",
+            "integer",
+            "page",
+            comment="last page of the file committed to the database",
+        ),
+        Column(
+            "byte_offset",
+            "integer",
+            "byte_offset",
+            comment="offset of the end of that page in the file, if known",
+        ),
+        Column("updated_at", "text", None, "default current_timestamp"),
+    ],
+    insert="insert or replace",
+)
+
+
+# Files which have been completely loaded, identified by their contents so they are
+# recognised even if renamed or moved (see reading.file_fingerprint)
+define_table(
+    "loaded_file",
+    "fingerprint, file_name, page_count",
+    [
+        Column(
+            "fingerprint",
+            "text",
+            "fingerprint",
+            "primary key",
+            "size and hash of the file contents",
+        ),
+        Column(
+            "file_name", "text", "file_name", comment="name the file was loaded as"
+        ),
+        Column("page_count", "integer", "page_count"),
+        Column("loaded_at", "text", None, "default current_timestamp"),
+    ],
+    insert="insert or replace",
+)
+
+
+# --- Snapshots ---
+def _define_snapshot_table(table_name: str, source_type: str):
+    """
+    Generates the SQL for storing a by-page table as snapshots, adding it to
+    `sql_snapshot_tables`, `sql_snapshot_views` and `sql_snapshot_indexes`.
+
+    The snapshot table has the same columns as the by-page table, but only a row for
+    each version of a tweet or user, numbered in the order they were loaded,
+    recording the earliest and latest retrieved pages each version was seen on and
+    how many pages it was seen on. Inserting into the view of the by-page table's name
+    updates the most recently retrieved version if the row is the same apart from its
+    page, or otherwise adds a new version, so a tweet which changes and changes back
+    has three versions. Pages are compared by when they were retrieved rather than
+    when they were loaded, so the latest version is the same whatever order files are
+    loaded in.
+    """
+    snapshot_table = f"{source_type}_snapshot"
+    columns = column_definitions_by_table[table_name]
+    names = [column.name for column in columns]
+    page_columns = ["file_id", "source_page"]
+    # Not part of the content of a tweet, so merged rather than compared
+    merged_columns = ["directly_collected"]
+    content_columns = [
+        column
+        for column in columns
+        if column.name not in ["id", *page_columns, *merged_columns]
+    ]
+    merged = [column for column in columns if column.name in merged_columns]
+    for column in content_columns + merged:
+        assert "primary key" not in column.constraints
+
+    snapshot_columns = [
+        Column("id", "text", None, "not null"),
+        Column(
+            "snapshot",
+            "integer",
+            None,
+            "not null",
+            f"1 for the first version of the {source_type} loaded, 2 for the next, "
+            "and so on",
+        ),
+        *content_columns,
+        *merged,
+        Column(
+            "file_id",
+            "integer",
+            None,
+            "references source_file (file_id)",
+            "file of the earliest retrieved page this version was seen on",
+        ),
+        Column("source_page", "integer", None, comment="that earliest page"),
+        Column(
+            "last_file_id",
+            "integer",
+            None,
+            "references source_file (file_id)",
+            "file of the latest retrieved page this version was seen on",
+        ),
+        Column("last_page", "integer", None, comment="that latest page"),
+        Column(
+            "page_count",
+            "integer",
+            None,
+            comment="number of pages this version was seen on",
+        ),
+    ]
+    snapshot_names = [column.name for column in snapshot_columns]
+
+    merge = "".join(
+        f",\n        {name} = max({name}, new.{name})"
+        for name in (column.name for column in merged)
+    )
+    same_content = "".join(
+        f"\n        and {column.name} is new.{column.name}"
+        for column in content_columns
+    )
+    new_values = ",\n        ".join(
+        [
+            "new.id",
+            f"coalesce((select max(snapshot) from {snapshot_table} "
+            "where id = new.id), 0) + 1",
+            *(f"new.{column.name}" for column in content_columns + merged),
+            "new.file_id, new.source_page, new.file_id, new.source_page, 1",
+        ]
+    )
+    # The latest version is the one most recently retrieved, as in the tweet and user
+    # views, rather than the last one loaded
+    latest_snapshot = f"""(
+            select snapshot
+            from {snapshot_table} as latest
+            left join results_page on
+                latest.last_page = results_page.page
+                and latest.last_file_id = results_page.file_id
+            where latest.id = new.id
+            order by retrieved_at desc, snapshot desc
+            limit 1
+        )"""
+    # When the new row's page and a version's earliest and latest pages were retrieved.
+    # Like the tweet and user views, pages with no retrieval time are only the latest
+    # if no page the version was seen on has one.
+    retrieved_at = (
+        "(select retrieved_at from results_page "
+        "where file_id = {file_id} and page = {page})"
+    )
+    new_retrieved_at = retrieved_at.format(
+        file_id="new.file_id", page="new.source_page"
+    )
+    first_retrieved_at = retrieved_at.format(
+        file_id=f"{snapshot_table}.file_id", page=f"{snapshot_table}.source_page"
+    )
+    last_retrieved_at = retrieved_at.format(
+        file_id=f"{snapshot_table}.last_file_id", page=f"{snapshot_table}.last_page"
+    )
+    is_earlier = f"{new_retrieved_at} < {first_retrieved_at}"
+    is_latest = (
+        f"coalesce(\n            {new_retrieved_at} >= {last_retrieved_at},"
+        f"\n            {new_retrieved_at} is not null or {last_retrieved_at} is null"
+        "\n        )"
+    )
+
+    sql_snapshot_tables[table_name] = {
+        "create": _create_table_sql(
+            snapshot_table, snapshot_columns, ["primary key (id, snapshot)"]
+        ),
+        "view": f"""
+create view {table_name} as
+select {', '.join(names)}
+from {snapshot_table}
+""",
+        # changes() is the number of rows updated by the first statement
+        "trigger": f"""
+create trigger {table_name}_snapshot instead of insert on {table_name}
+begin
+    update {snapshot_table} set
+        file_id = case when {is_earlier} then new.file_id else file_id end,
+        source_page = case when {is_earlier} then new.source_page else source_page end,
+        last_file_id = case when {is_latest} then new.file_id else last_file_id end,
+        last_page = case when {is_latest} then new.source_page else last_page end,
+        page_count = page_count + (
+            (file_id is not new.file_id or source_page is not new.source_page)
+            and (last_file_id is not new.file_id or last_page is not new.source_page)
+        ){merge}
+    where
+        id = new.id
+        and snapshot = {latest_snapshot}{same_content};
+    insert into {snapshot_table} (
+        {', '.join(snapshot_names)}
+    )
+    select
+        {new_values}
+    where changes() = 0;
+end
+""",
+    }
+
+    # The tweet and user views, with the most recently retrieved version of each
+    view = sql_views[source_type]
+    for old, new in [
+        (f"{table_name}.id", f"{snapshot_table}.id"),
+        (f"{table_name}.source_page", f"{snapshot_table}.last_page"),
+        (f"{table_name}.file_id", f"{snapshot_table}.last_file_id"),
+        (f"from {table_name}", f"from {snapshot_table}"),
+    ]:
+        assert old in view
+        view = view.replace(old, new)
+    sql_snapshot_views[source_type] = view
+
+    for index_name, index_sql in sql_indexes.items():
+        if f" on {table_name} (" in index_sql:
+            sql_snapshot_indexes[index_name] = index_sql.replace(
+                f" on {table_name} (", f" on {snapshot_table} ("
+            )
+
+
+_define_snapshot_table("user_by_page", "user")
+_define_snapshot_table("tweet_by_page", "tweet")
+
+
+# --- Full text search ---
+# The trigram tokenizer indexes every three character sequence, so like a
+# `like '%term%'` query, any part of a word, hashtag or mention matches, in any
+# script, including those not written with spaces between words
+SEARCH_TOKENIZER = "trigram"
+
+sql_search_progress = """
+create table search_index_progress (
+    search_table text primary key,
+    last_rowid integer not null -- of the rows already indexed from the source table
+)
+"""
+
+
+def _define_search_table(search_table: str, view: str, column: str):
+    """
+    Generates the SQL for a full text search index of a column of the tweet or user
+    view, adding it to `sql_search_tables`.
+
+    Rows of the index have the tweet or user id as their rowid. The update statements
+    add or replace the rows of the tweets or users with rows in the by-page table (or
+    snapshot table) with a rowid greater than :last_rowid, using the most recently
+    retrieved version of each.
+    """
+    # Looks up the most recently retrieved version of each id, rather than using the
+    # view, which SQLite would aggregate in full before filtering by id. Ordering the
+    # new ids by rowid makes SQLite read only the new rows, rather than scanning the
+    # whole primary key index for distinct ids.
+    update = f"""
+insert or replace into {search_table} (rowid, {column})
+select
+    cast(id as integer),
+    (
+        select {column}
+        from {{source_table}} as version
+        left join results_page on
+            version.{{page_column}} = results_page.page
+            and version.{{file_column}} = results_page.file_id
+        where version.id = changed.id
+        order by retrieved_at desc
+        limit 1
+    )
+from (
+    select distinct id from {{source_table}} where rowid > :last_rowid order by rowid
+) as changed
+"""
+    sql_search_tables[search_table] = {
+        "create": f"""
+create virtual table {search_table} using fts5 (
+    {column},
+    tokenize = '{SEARCH_TOKENIZER}'
+)
+""",
+        "source": f"{view}_by_page",
+        "update": update.format(
+            source_table=f"{view}_by_page",
+            page_column="source_page",
+            file_column="file_id",
+        ),
+        "snapshot_source": f"{view}_snapshot",
+        "snapshot_update": update.format(
+            source_table=f"{view}_snapshot",
+            page_column="last_page",
+            file_column="last_file_id",
+        ),
+    }
+
+
+_define_search_table("tweet_search", "tweet", "text")
+_define_search_table("user_search", "user", "description")
+
+
+# --- Rollups ---
+# Counts of tweets per day (of when the tweet was created, in UTC), each tweet only
+# counted the first time it is loaded, however many pages it is seen on
+def _define_rollup_table(table_name: str, key: Column):
+    sql_rollup_tables[table_name] = _create_table_sql(
+        table_name,
+        [
+            Column("day", "text", None, "not null", "YYYY-MM-DD"),
+            key,
+            Column("tweet_count", "integer", None, "not null"),
+        ],
+        [f"primary key (day, {key.name})"],
+    )
+
+
+def _rollup_count(table_name: str, key: str, day: str, value: str) -> str:
+    return f"""
+    insert into {table_name} (day, {key}, tweet_count)
+    values ({day}, {value}, 1)
+    on conflict (day, {key}) do update set tweet_count = tweet_count + 1;"""
+
+
+_define_rollup_table("daily_author_count", Column("author_id", "text", None))
+_define_rollup_table("daily_lang_count", Column("lang", "text", None))
+_define_rollup_table("daily_hashtag_count", Column("hashtag_lower", "text", None))
+_define_rollup_table(
+    "daily_mention_count",
+    Column("username_lower", "text", None, comment="lower case username mentioned"),
+)
+
+_tweet_rollup_counts = "".join(
+    _rollup_count(table_name, key, "substr(new.created_at, 1, 10)", f"new.{key}")
+    for table_name, key in [
+        ("daily_author_count", "author_id"),
+        ("daily_lang_count", "lang"),
+    ]
+)
+sql_rollup_triggers[
+    "tweet_by_page_rollup"
+] = f"""
+create trigger tweet_by_page_rollup after insert on tweet_by_page
+when not exists (
+    select 1 from tweet_by_page where id = new.id and rowid <> new.rowid
+)
+begin{_tweet_rollup_counts}
+end
+"""
+sql_snapshot_rollup_triggers[
+    "tweet_by_page_rollup"
+] = f"""
+create trigger tweet_by_page_rollup after insert on tweet_snapshot
+when new.snapshot = 1
+begin{_tweet_rollup_counts}
+end
+"""
+
+# Entities are only inserted the first time a tweet is loaded, always after the tweet
+# (see map_tweet). Hashtags and usernames are case-insensitive, so a tweet
+# mentioning one twice with different cases is only counted once.
+_tweet_day = (
+    "(select substr(created_at, 1, 10) from tweet_by_page where id = new.tweet_id)"
+)
+for entity_table, rollup_table, key, compared, value in [
+    (
+        "tweet_hashtag",
+        "daily_hashtag_count",
+        "hashtag_lower",
+        "hashtag_lower",
+        "new.hashtag_lower",
+    ),
+    (
+        "tweet_mention",
+        "daily_mention_count",
+        "username_lower",
+        "lower(username)",
+        "lower(new.username)",
+    ),
+]:
+    sql_rollup_triggers[
+        f"{entity_table}_rollup"
+    ] = f"""
+create trigger {entity_table}_rollup after insert on {entity_table}
+when not exists (
+    select 1 from {entity_table}
+    where tweet_id = new.tweet_id and {compared} = {value} and rowid <> new.rowid
+)
+begin{_rollup_count(rollup_table, key, _tweet_day, value)}
+end
+"""
 
 
 # --- Validation ---
@@ -625,12 +1141,27 @@ def map_page_metadata(
 for table_sql in sql_by_table.values():
     assert {"create", "insert"} <= table_sql.keys()
 
+# Materialised views replace a view of the same name
+for view_name, view_sql in sql_materialised_views.items():
+    assert view_name in sql_views
+    assert {"create", "trigger"} <= view_sql.keys()
+
+# Snapshot tables replace a table, and their views and indexes a view or index, of
+# the same name
+assert sql_snapshot_tables.keys() <= sql_by_table.keys()
+assert sql_snapshot_views.keys() <= sql_views.keys()
+assert sql_snapshot_indexes.keys() <= sql_indexes.keys()
+assert sql_snapshot_rollup_triggers.keys() <= sql_rollup_triggers.keys()
+
 
 # --- Convenience lists ---
 
 
-def get_create_table_statements(strict_mode=True):
+def get_create_table_statements(strict_mode=True, snapshots=False):
     strict = " strict" if strict_mode else ""
     return [
-        clean_sql_statement(tbl["create"] + strict) for tbl in sql_by_table.values()
+        clean_sql_statement(
+            (sql_snapshot_tables if snapshots else {}).get(name, tbl)["create"] + strict
+        )
+        for name, tbl in sql_by_table.items()
     ]
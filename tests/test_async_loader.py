@@ -0,0 +1,84 @@
+from tidy_tweet import initialise_sqlite, Loader, AsyncLoader
+from tidy_tweet.processing import PageParsingError
+from pathlib import Path
+import asyncio
+import json
+import sqlite3
+import pytest
+
+data_directory = Path(__file__).parent.resolve() / "data"
+
+timeline_json_file = data_directory / "ObservatoryTeam.jsonl"
+
+
+def _pages():
+    with open(timeline_json_file) as fh:
+        return [json.loads(line) for line in fh]
+
+
+def _results_pages(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            "select file_name, page from results_page natural join source_file "
+            "order by file_name, page"
+        ).fetchall()
+
+
+def test_async_loader(tmp_path):
+    """
+    Pages put into an AsyncLoader are written just as a Loader would write them,
+    even with a queue too short to hold them all.
+    """
+    pages = _pages()
+
+    expected_db = tmp_path / "expected.db"
+    initialise_sqlite(expected_db)
+    with Loader(expected_db) as loader:
+        for page_num, page in enumerate(pages, start=1):
+            loader.add_page("stream", page_num, page)
+
+    async def collect(db_path):
+        async with AsyncLoader(db_path, max_queued_pages=1, batch_pages=2) as loader:
+            for page in pages:
+                await loader.put(page)
+            await loader.commit()
+            return len(_results_pages(db_path))
+
+    db_path = tmp_path / "async.db"
+    initialise_sqlite(db_path)
+    assert asyncio.run(collect(db_path)) == 3
+
+    with sqlite3.connect(expected_db) as expected, sqlite3.connect(db_path) as actual:
+        for table in ["tweet", "user", "tweet_hashtag", "media"]:
+            query = f"select * from {table} order by 1, 2"
+            assert actual.execute(query).fetchall() == (
+                expected.execute(query).fetchall()
+            )
+
+    # Page numbers continue on from those already in the database
+    assert asyncio.run(collect(db_path)) == 6
+    assert _results_pages(db_path) == [("stream", n) for n in range(1, 7)]
+
+
+def test_async_loader_errors(tmp_path):
+    pages = _pages()
+    db_path = tmp_path / "errors.db"
+    initialise_sqlite(db_path)
+
+    async def put_unparseable():
+        async with AsyncLoader(db_path) as loader:
+            await loader.put({"not": "a page"}, "bad", 1)
+
+    with pytest.raises(PageParsingError):
+        asyncio.run(put_unparseable())
+
+    async def put_duplicate():
+        async with AsyncLoader(db_path) as loader:
+            await loader.put(pages[0], "duplicate", 1)
+            await loader.put(pages[1], "duplicate", 1)
+
+    # Raised once the writer tries to write the duplicate page
+    with pytest.raises(PageParsingError) as error:
+        asyncio.run(put_duplicate())
+    assert isinstance(error.value.__cause__, sqlite3.IntegrityError)
+    assert _results_pages(db_path) == []
@@ -1,5 +1,14 @@
+import json
+import sqlite3
+import pytest
 from click.testing import CliRunner
-from tidy_tweet.__main__ import tidy_twarc_jsons
+from pathlib import Path
+from tidy_tweet.__main__ import tidy_twarc_jsons, cli
+from tidy_tweet import reading
+import tidy_tweet.__main__
+import tidy_tweet.database
+import tidy_tweet.processing
+from tidy_tweet.tweet_mapping import sql_indexes
 
 
 def test_no_args():
@@ -26,3 +35,309 @@ def test_one_arg(tmp_path):
     assert result.exit_code == 0
 
     # Just a json file - should fail
+
+
+def test_workers(tmp_path):
+    db_path = tmp_path / "workers.db"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+    runner = CliRunner()
+
+    result = runner.invoke(
+        tidy_twarc_jsons, [str(db_path), str(json_file), "--workers", "2"]
+    )
+    assert result.exit_code == 0
+    assert "3 pages of tweets loaded" in result.output
+
+
+def test_bulk_profile(tmp_path):
+    db_path = tmp_path / "bulk.db"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+    runner = CliRunner()
+
+    result = runner.invoke(
+        tidy_twarc_jsons, [str(db_path), str(json_file), "--profile", "bulk"]
+    )
+    assert result.exit_code == 0
+
+    with sqlite3.connect(db_path) as conn:
+        # Databases use write-ahead logging whichever profile was used
+        assert conn.execute("pragma journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("select count(*) from results_page").fetchone()[0] == 3
+
+    result = runner.invoke(tidy_twarc_jsons, [str(db_path), "--profile", "reckless"])
+    assert result.exit_code != 0
+
+
+def test_bulk_profile_indexes(tmp_path, monkeypatch):
+    """
+    With the bulk profile, indexes are only dropped and rebuilt when loading files
+    larger than the database.
+    """
+    db_path = tmp_path / "bulk.db"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+    small_file = tmp_path / "small.jsonl"
+    with open(json_file, "rb") as fh:
+        small_file.write_bytes(fh.readline())
+
+    dropped = []
+    monkeypatch.setattr(tidy_tweet.database, "drop_indexes", dropped.append)
+
+    runner = CliRunner()
+    bulk = ["--profile", "bulk"]
+
+    # An empty database
+    result = runner.invoke(cli, [str(db_path), "--no_index"])
+    assert result.exit_code == 0
+    result = runner.invoke(cli, [str(db_path), str(json_file), *bulk])
+    assert result.exit_code == 0
+    assert dropped == [db_path]
+    assert _index_names(db_path) == set(sql_indexes)
+
+    # A small file added to a larger database
+    result = runner.invoke(cli, [str(db_path), str(small_file), *bulk])
+    assert result.exit_code == 0
+    assert dropped == [db_path]
+    assert _index_names(db_path) == set(sql_indexes)
+
+
+def test_stats(tmp_path):
+    db_path = tmp_path / "stats.db"
+    stats_path = tmp_path / "stats.json"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+    runner = CliRunner()
+    result = runner.invoke(
+        tidy_twarc_jsons, [str(db_path), str(json_file), "--stats", str(stats_path)]
+    )
+    assert result.exit_code == 0
+
+    with open(stats_path) as fh:
+        report = json.load(fh)
+    assert report["total"]["pages"] == 3
+    assert report["files"][str(json_file)]["rows"]["results_page"] == 3
+    assert set(report["total"]["seconds"]) >= {"read", "decode", "map", "write"}
+    assert report["elapsed_seconds"]["load"] > 0
+
+    # Written to standard output, progress messages don't get mixed into the report
+    result = runner.invoke(
+        tidy_twarc_jsons, [str(tmp_path / "stdout.db"), str(json_file), "--stats", "-"]
+    )
+    assert result.exit_code == 0
+    assert json.loads(result.stdout)["total"]["pages"] == 3
+    assert "All done!" in result.stderr
+
+
+def test_metrics_file(tmp_path):
+    db_path = tmp_path / "metrics.db"
+    metrics_path = tmp_path / "tidy_tweet.prom"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+    runner = CliRunner()
+    result = runner.invoke(
+        tidy_twarc_jsons,
+        [str(db_path), str(json_file), "--metrics_file", str(metrics_path)],
+    )
+    assert result.exit_code == 0
+
+    metrics = {}
+    for line in metrics_path.read_text().splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            metrics[name] = float(value)
+    assert metrics["tidy_tweet_pages_total"] == 3
+    assert metrics["tidy_tweet_files_finished"] == 1
+    assert metrics['tidy_tweet_rows_total{table="results_page"}'] == 3
+    assert metrics["tidy_tweet_progress_ratio"] == 1
+    assert metrics["tidy_tweet_remaining_bytes"] == 0
+
+    # Loading the same file again skips it
+    result = runner.invoke(
+        tidy_twarc_jsons,
+        [str(db_path), str(json_file), "--metrics_file", str(metrics_path)],
+    )
+    assert result.exit_code == 0
+    assert "tidy_tweet_files_skipped 1\n" in metrics_path.read_text()
+
+
+def test_follow(tmp_path):
+    db_path = tmp_path / "follow.db"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+    runner = CliRunner()
+    result = runner.invoke(
+        tidy_twarc_jsons,
+        [str(db_path), str(json_file), "--follow", "--idle_timeout", "0"],
+    )
+    assert result.exit_code == 0
+    assert "3 pages of Twitter results loaded" in result.output
+
+    # Following continues from the last page loaded
+    result = runner.invoke(
+        tidy_twarc_jsons,
+        [str(db_path), str(json_file), "--follow", "--idle_timeout", "0"],
+    )
+    assert result.exit_code == 0
+    assert "0 pages of Twitter results loaded" in result.output
+
+    result = runner.invoke(
+        tidy_twarc_jsons, [str(db_path), str(json_file), str(json_file), "--follow"]
+    )
+    assert result.exit_code != 0
+
+
+def test_stdin(tmp_path):
+    db_path = tmp_path / "stdin.db"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+    runner = CliRunner()
+    for _ in range(2):
+        result = runner.invoke(
+            tidy_twarc_jsons,
+            [str(db_path), "-", "--stdin_label", "timeline"],
+            input=json_file.read_bytes(),
+        )
+        assert result.exit_code == 0
+        assert "3 pages of Twitter results loaded" in result.output
+
+    with sqlite3.connect(db_path) as conn:
+        pages = conn.execute(
+            "select file_name, page from results_page natural join source_file "
+            "order by page"
+        ).fetchall()
+    # Loading with the same label again continues the page numbers
+    assert pages == [("timeline", page) for page in range(1, 7)]
+
+    result = runner.invoke(tidy_twarc_jsons, [str(db_path), "-", "-"])
+    assert result.exit_code != 0
+
+
+def _index_names(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {
+            name
+            for (name,) in conn.execute(
+                "select name from sqlite_master where type = 'index' "
+                "and name not like 'sqlite_autoindex%'"
+            )
+        }
+
+
+def test_indexes(tmp_path):
+    db_path = tmp_path / "indexes.db"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+    runner = CliRunner()
+
+    # Loading without indexing leaves only the primary keys
+    result = runner.invoke(cli, [str(db_path), str(json_file), "--no_index"])
+    assert result.exit_code == 0
+    assert _index_names(db_path) == set()
+
+    result = runner.invoke(cli, ["index", str(db_path)])
+    assert result.exit_code == 0
+    assert _index_names(db_path) == set(sql_indexes)
+
+    with sqlite3.connect(db_path) as conn:
+        plan = conn.execute(
+            "explain query plan select * from tweet_by_page where author_id = '1'"
+        ).fetchall()
+        assert "tweet_by_page_author_id" in str(plan)
+
+
+def test_skip_loaded_files(tmp_path, monkeypatch):
+    db_path = tmp_path / "skip.db"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+    renamed_file = tmp_path / "renamed.jsonl"
+    renamed_file.write_bytes(json_file.read_bytes())
+
+    # Each file is only read to fingerprint it once
+    fingerprinted = []
+
+    def file_fingerprint(filename):
+        fingerprinted.append(filename)
+        return reading.file_fingerprint(filename)
+
+    monkeypatch.setattr(tidy_tweet.__main__, "file_fingerprint", file_fingerprint)
+    monkeypatch.setattr(tidy_tweet.processing, "file_fingerprint", file_fingerprint)
+
+    runner = CliRunner()
+
+    result = runner.invoke(cli, [str(db_path), str(json_file)])
+    assert result.exit_code == 0
+    assert fingerprinted == [str(json_file)]
+
+    # The same contents under a different name are recognised and skipped
+    result = runner.invoke(cli, [str(db_path), str(json_file), str(renamed_file)])
+    assert result.exit_code == 0
+    assert "Skipped 2 files which had already been loaded" in result.output
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("select count(*) from results_page").fetchone()[0] == 3
+
+
+def test_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    directory = tmp_path / "dataset"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        ["parquet", "--partition_by", "created_month", str(directory), str(json_file)],
+    )
+    assert result.exit_code == 0
+    assert "3 pages of tweets loaded" in result.output
+    assert list(directory.glob("tweet_by_page/created_month=2021-*/*.parquet"))
+
+
+def test_snapshots(tmp_path):
+    db_path = tmp_path / "snapshots.db"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+    runner = CliRunner()
+
+    result = runner.invoke(
+        cli, [str(db_path), str(json_file), "--snapshots", "--materialise"]
+    )
+    assert result.exit_code != 0
+
+    result = runner.invoke(cli, [str(db_path), str(json_file), "--snapshots"])
+    assert result.exit_code == 0
+
+    with sqlite3.connect(db_path) as conn:
+        (snapshots,) = conn.execute("select count(*) from user_snapshot").fetchone()
+        (users,) = conn.execute("select count(*) from user").fetchone()
+        assert snapshots == users
+
+
+def test_full_text_search(tmp_path):
+    db_path = tmp_path / "search.db"
+    json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+    runner = CliRunner()
+
+    result = runner.invoke(cli, [str(db_path), str(json_file)])
+    assert result.exit_code == 0
+    with sqlite3.connect(db_path) as conn:
+        assert (
+            conn.execute(
+                "select 1 from sqlite_master where name = 'tweet_search'"
+            ).fetchone()
+            is None
+        )
+
+    # Added to an existing database
+    result = runner.invoke(cli, ["index", "--full_text_search", str(db_path)])
+    assert result.exit_code == 0
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("select count(*) from tweet_search").fetchone() == (
+            conn.execute("select count(*) from tweet").fetchone()
+        )
+
+    result = runner.invoke(
+        cli,
+        [str(tmp_path / "search.duckdb"), "--engine", "duckdb", "--full_text_search"],
+    )
+    assert result.exit_code != 0
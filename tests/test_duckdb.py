@@ -0,0 +1,101 @@
+from tidy_tweet import initialise_sqlite, Loader
+from tidy_tweet.tweet_mapping import sql_by_table, sql_views
+from click.testing import CliRunner
+from pathlib import Path
+import json
+import sqlite3
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+from tidy_tweet.__main__ import cli  # noqa: E402
+from tidy_tweet.duckdb_database import DuckDBSink  # noqa: E402
+
+data_directory = Path(__file__).parent.resolve() / "data"
+
+timeline_json_file = data_directory / "ObservatoryTeam.jsonl"
+
+# Timestamps filled in by the database, which are formatted differently by each
+_DEFAULT_TIMESTAMPS = ["inserted_at", "updated_at", "loaded_at"]
+
+
+def _contents(connection, names):
+    contents = {}
+    for name in names:
+        rows = connection.execute(f"select * from {name}")
+        columns = [description[0] for description in rows.description]
+        keep = [
+            i for i, column in enumerate(columns) if column not in _DEFAULT_TIMESTAMPS
+        ]
+        contents[name] = sorted(
+            (tuple(row[i] for i in keep) for row in rows.fetchall()), key=repr
+        )
+    return contents
+
+
+def test_load_matches_sqlite(tmp_path):
+    """
+    Loading into DuckDB gives the same tables and views as loading into SQLite.
+    """
+    sqlite_path = tmp_path / "timeline.db"
+    initialise_sqlite(sqlite_path)
+    with Loader(sqlite_path) as loader:
+        loader.load_file(timeline_json_file)
+
+    duckdb_path = tmp_path / "timeline.duckdb"
+    with DuckDBSink(duckdb_path) as sink:
+        sink.create_schema()
+    # Small batches, so rows with the same key are in different batches as well as
+    # the same batch
+    with Loader(DuckDBSink(duckdb_path), batch_pages=2) as loader:
+        assert loader.load_file(timeline_json_file) == 3
+        assert loader.find_loaded_file(timeline_json_file) == str(timeline_json_file)
+
+    names = [*sql_by_table, *sql_views]
+    with sqlite3.connect(sqlite_path) as conn:
+        expected = _contents(conn, names)
+    conn = duckdb.connect(str(duckdb_path))
+    assert _contents(conn, names) == expected
+    conn.close()
+
+    with DuckDBSink(duckdb_path) as sink:
+        sink.check_version()
+
+
+def test_uncommitted_rows_discarded(tmp_path):
+    duckdb_path = tmp_path / "rollback.duckdb"
+    with DuckDBSink(duckdb_path) as sink:
+        sink.create_schema()
+        with pytest.raises(ValueError):
+            sink.create_schema(materialised=True)
+
+    with pytest.raises(RuntimeError):
+        with Loader(DuckDBSink(duckdb_path)) as loader:
+            loader.load_file(timeline_json_file)
+            with open(timeline_json_file, "rb") as fh:
+                loader.add_page("extra.jsonl", 1, json.loads(fh.readline()))
+            loader.flush()
+            raise RuntimeError()
+
+    with DuckDBSink(duckdb_path) as sink:
+        assert sink.fetch_one("select count(*) from results_page") == (3,)
+
+
+def test_cli(tmp_path):
+    duckdb_path = tmp_path / "cli.duckdb"
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli, ["--engine", "duckdb", str(duckdb_path), str(timeline_json_file)]
+    )
+    assert result.exit_code == 0
+    result = runner.invoke(
+        cli, ["--engine", "duckdb", str(duckdb_path), str(timeline_json_file)]
+    )
+    assert result.exit_code == 0
+    assert "Skipped 1 files" in result.output
+
+    # An SQLite database is not a DuckDB database
+    sqlite_path = tmp_path / "cli.db"
+    initialise_sqlite(sqlite_path)
+    result = runner.invoke(cli, ["--engine", "duckdb", str(sqlite_path)])
+    assert result.exit_code != 0
@@ -0,0 +1,34 @@
+from tidy_tweet import tweet_mapping as mapping
+from pathlib import Path
+import json
+
+data_directory = Path(__file__).parent.resolve() / "data"
+
+timeline_json_file = data_directory / "ObservatoryTeam.jsonl"
+
+
+def test_rows_match_columns():
+    """
+    Mapped rows are tuples with one value per inserted column, in the order of
+    `columns_by_table`, matching the placeholders of the insert statement.
+    """
+    with open(timeline_json_file, "r", encoding="utf-8") as fh:
+        page = json.loads(fh.readline())
+
+    tweet = page["data"][0]
+    mappings = mapping.map_tweet(tweet, True, "ObservatoryTeam.jsonl", 1)
+
+    for table, rows in mappings.items():
+        columns = mapping.columns_by_table[table]
+        assert mapping.sql_by_table[table]["insert"].count("?") == len(columns)
+        for row in rows:
+            assert isinstance(row, tuple)
+            assert len(row) == len(columns)
+
+    tweet_row = dict(
+        zip(mapping.columns_by_table["tweet_by_page"], *mappings["tweet_by_page"])
+    )
+    assert tweet_row["id"] == tweet["id"]
+    assert tweet_row["retweeted_tweet_id"] == tweet["referenced_tweets"][0]["id"]
+    assert tweet_row["like_count"] == tweet["public_metrics"]["like_count"]
+    assert tweet_row["source_page"] == 1
@@ -0,0 +1,155 @@
+from tidy_tweet import initialise_sqlite, load_twarc_json_to_sqlite, build_indexes
+from tidy_tweet.network import EDGE_COLUMNS, iter_edges
+from tidy_tweet.__main__ import cli
+from tidy_tweet.processing import Loader
+from tidy_tweet.shards import ShardedSQLiteSink, shard_paths
+from click.testing import CliRunner
+from collections import Counter
+from pathlib import Path
+import csv
+import sqlite3
+import pytest
+
+timeline_json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = tmp_path / "network.db"
+    initialise_sqlite(db_path)
+    load_twarc_json_to_sqlite(timeline_json_file, db_path)
+    # Loading the same pages again doesn't add to the weights
+    copied_file = tmp_path / "copy.jsonl"
+    copied_file.write_bytes(timeline_json_file.read_bytes())
+    load_twarc_json_to_sqlite(copied_file, db_path)
+    build_indexes(db_path)
+    return db_path
+
+
+def _expected_weights(db_path, interaction, window=None):
+    """
+    Edge weights for an interaction, counted by joining the tweet and user views.
+    """
+    created = "tweet.created_at" if window is None else "substr(tweet.created_at, 1, 7)"
+    if interaction == "mention":
+        query = f"""
+            select {created}, tweet.author_id, user.id, lower(tweet_mention.username)
+            from tweet_mention
+            join tweet on tweet.id = tweet_mention.tweet_id
+            left join user on lower(user.username) = lower(tweet_mention.username)
+            group by tweet.id, lower(tweet_mention.username)
+        """
+    elif interaction == "reply":
+        query = f"""
+            select {created}, author_id, in_reply_to_user_id, null from tweet
+            where in_reply_to_user_id is not null
+        """
+    else:
+        column = {"retweet": "retweeted_tweet_id", "quote": "quoted_tweet_id"}
+        query = f"""
+            select {created}, tweet.author_id, referenced.author_id, null from tweet
+            join tweet as referenced on referenced.id = tweet.{column[interaction]}
+        """
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(query).fetchall()
+    return Counter(
+        (created if window is not None else None, source, target, username)
+        for created, source, target, username in rows
+    )
+
+
+@pytest.mark.parametrize("interaction", ["retweet", "quote", "reply", "mention"])
+def test_edges(db_path, interaction):
+    edges = list(iter_edges(db_path, [interaction]))
+    assert len(edges) > 0
+    assert {edge[0] for edge in edges} == {interaction}
+    # Deduplicated
+    assert len({edge[1:6] for edge in edges}) == len(edges)
+
+    weights = {
+        (window, source_id, target_id, None if target_id else target_username): weight
+        for _, window, source_id, _, target_id, target_username, weight in edges
+    }
+    expected = _expected_weights(db_path, interaction)
+    if interaction == "mention":
+        expected = Counter(
+            {
+                (window, source, target, None if target else username): weight
+                for (window, source, target, username), weight in expected.items()
+            }
+        )
+    assert weights == expected
+
+    with sqlite3.connect(db_path) as conn:
+        usernames = dict(conn.execute("select id, username from user"))
+    for edge in edges:
+        assert edge[3] == usernames[edge[2]]
+        # Users replied to aren't always in the database
+        if edge[4] in usernames:
+            assert edge[5] == usernames[edge[4]]
+
+
+def test_windows(db_path):
+    edges = list(iter_edges(db_path, ["retweet"], window="month"))
+    assert Counter(
+        {(edge[1], edge[2], edge[4], None): edge[6] for edge in edges}
+    ) == _expected_weights(db_path, "retweet", window="month")
+
+    edges = list(iter_edges(db_path, start="2020-10", end="2021-01-15"))
+    assert len(edges) > 0
+    assert sum(edge[6] for edge in edges) < sum(edge[6] for edge in iter_edges(db_path))
+
+    with pytest.raises(ValueError):
+        list(iter_edges(db_path, window="fortnight"))
+
+
+def test_sharded(db_path, tmp_path):
+    """
+    Exporting a range of dates from a database with more shards than can be
+    attached at once only attaches the shards for those dates.
+    """
+    catalogue_path = tmp_path / "sharded.db"
+    with ShardedSQLiteSink(catalogue_path, "created_month") as sink:
+        sink.create_schema()
+    with Loader(ShardedSQLiteSink(catalogue_path)) as loader:
+        loader.load_file(timeline_json_file)
+    assert len(shard_paths(catalogue_path)) > 10
+
+    with pytest.raises(ValueError):
+        list(iter_edges(catalogue_path))
+    dates = {"start": "2020-10", "end": "2020-12"}
+    edges = list(iter_edges(catalogue_path, ["reply"], **dates))
+    assert len(edges) > 0
+    # Users are in the shards of when they were retrieved, so only the ids are known
+    assert [edge[:3] + edge[4:5] + edge[6:] for edge in edges] == [
+        edge[:3] + edge[4:5] + edge[6:]
+        for edge in iter_edges(db_path, ["reply"], **dates)
+    ]
+
+
+def test_cli(db_path, tmp_path):
+    runner = CliRunner()
+
+    result = runner.invoke(
+        cli, ["network", str(db_path), "-", "--interaction", "reply"]
+    )
+    assert result.exit_code == 0
+    rows = list(csv.reader(result.stdout.splitlines()))
+    assert rows[0] == EDGE_COLUMNS
+    assert len(rows) == len(list(iter_edges(db_path, ["reply"]))) + 1
+
+    # Lines end as the csv module writes them, without newlines translated
+    output = tmp_path / "edges.csv"
+    result = runner.invoke(cli, ["network", str(db_path), str(output)])
+    assert result.exit_code == 0
+    contents = output.read_bytes()
+    assert contents.count(b"\r\n") == len(list(iter_edges(db_path))) + 1
+    assert b"\r\r\n" not in contents
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    output = tmp_path / "edges.parquet"
+    result = runner.invoke(cli, ["network", str(db_path), str(output)])
+    assert result.exit_code == 0
+    table = pq.read_table(output)
+    assert table.column_names == EDGE_COLUMNS
+    assert table.num_rows == len(list(iter_edges(db_path)))
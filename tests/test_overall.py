@@ -1,6 +1,16 @@
-from tidy_tweet import initialise_sqlite, load_twarc_json_to_sqlite
+from tidy_tweet import (
+    initialise_sqlite,
+    load_twarc_json_to_sqlite,
+    Loader,
+    iter_tidy_rows,
+)
+from tidy_tweet.tweet_mapping import sql_by_table
+from tidy_tweet.processing import PageParsingError
 from pathlib import Path
 import sqlite3
+import gzip
+import json
+import pytest
 
 
 data_directory = Path(__file__).parent.resolve() / "data"
@@ -37,3 +47,517 @@ def test_load_timeline(tmp_path):
                 assert num_tweets == 177
             else:
                 assert num_tweets == 204
+
+
+def _table_contents(db_path):
+    """
+    Returns the sorted contents of every tidy_tweet table, ignoring the times pages
+    were inserted and checkpoints updated.
+    """
+    contents = {}
+    with sqlite3.connect(db_path) as conn:
+        for (table,) in conn.execute(
+            "select name from sqlite_master where type = 'table'"
+        ).fetchall():
+            columns = [
+                row[1]
+                for row in conn.execute(f"pragma table_info({table})")
+                if row[1] not in ("inserted_at", "updated_at", "loaded_at")
+            ]
+            rows = conn.execute(f"select {', '.join(columns)} from {table}")
+            contents[table] = sorted(rows, key=repr)
+    return contents
+
+
+def test_load_timeline_in_parallel(tmp_path, monkeypatch):
+    """
+    Loading with a process pool should produce exactly the same database as
+    loading in a single process.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import tidy_tweet.processing
+
+    serial_db = tmp_path / "serial.db"
+    initialise_sqlite(serial_db)
+    load_twarc_json_to_sqlite(timeline_json_file, serial_db)
+
+    # Small chunks, so the three pages are spread across workers
+    monkeypatch.setattr(tidy_tweet.processing, "_PARALLEL_CHUNK_SIZE", 1)
+    parallel_db = tmp_path / "parallel.db"
+    initialise_sqlite(parallel_db)
+    with ProcessPoolExecutor(2) as executor:
+        pages = load_twarc_json_to_sqlite(
+            timeline_json_file, parallel_db, executor=executor
+        )
+
+    assert pages == 3
+    assert _table_contents(parallel_db) == _table_contents(serial_db)
+
+
+def test_load_stats(tmp_path, monkeypatch):
+    """
+    Stats count the pages, bytes and rows loaded, whether loading in one process or
+    in parallel.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import tidy_tweet.processing
+    from tidy_tweet.stats import LoadStats, STAGES
+
+    db_path = tmp_path / "stats.db"
+    initialise_sqlite(db_path)
+    with Loader(db_path) as loader:
+        assert loader.stats is None
+        loader.load_file(timeline_json_file)
+
+    serial_db = tmp_path / "serial.db"
+    initialise_sqlite(serial_db)
+    serial_stats = LoadStats()
+    load_twarc_json_to_sqlite(timeline_json_file, serial_db, stats=serial_stats)
+
+    file_stats = serial_stats.files[str(timeline_json_file)]
+    assert file_stats.pages == 3
+    assert file_stats.bytes_read == timeline_json_file.stat().st_size
+    with sqlite3.connect(serial_db) as conn:
+        for table in ["results_page", "user_by_page", "media"]:
+            count = conn.execute(f"select count(*) from {table}").fetchone()[0]
+            assert file_stats.rows.get(table, 0) == count
+    for stage in ["read", "decode", "map", "write", "commit"]:
+        assert file_stats.seconds[stage] > 0
+    assert serial_stats.total.as_dict() == file_stats.as_dict()
+    json.dumps(serial_stats.as_dict())
+
+    monkeypatch.setattr(tidy_tweet.processing, "_PARALLEL_CHUNK_SIZE", 1)
+    parallel_db = tmp_path / "parallel.db"
+    initialise_sqlite(parallel_db)
+    with ProcessPoolExecutor(2) as executor:
+        with Loader(parallel_db, executor=executor, stats=True) as loader:
+            loader.load_file(timeline_json_file)
+    parallel_stats = loader.stats.files[str(timeline_json_file)]
+    assert parallel_stats.rows == file_stats.rows
+    assert parallel_stats.bytes_read == file_stats.bytes_read
+    assert set(parallel_stats.seconds) == set(STAGES)
+    assert parallel_stats.seconds["map"] > 0
+
+
+def test_metrics_server(tmp_path):
+    """
+    Metrics are served over HTTP while loading, including the progress through the
+    file being loaded.
+    """
+    from urllib.request import urlopen
+    from tidy_tweet.metrics import LoadProgress, MetricsReporter
+
+    with open(timeline_json_file) as fh:
+        pages = [json.loads(line) for line in fh]
+
+    db_path = tmp_path / "metrics.db"
+    initialise_sqlite(db_path)
+    with Loader(db_path, stats=True) as loader:
+        progress = LoadProgress(loader.stats, [timeline_json_file])
+        with MetricsReporter(progress, port=0) as reporter:
+            url = f"http://localhost:{reporter.port}/metrics"
+            progress.start_file(timeline_json_file)
+            for page_num, page in enumerate(pages, start=1):
+                loader.add_page(str(timeline_json_file), page_num, page)
+                loader.stats.file(str(timeline_json_file)).offset = 10
+                with urlopen(url) as response:
+                    metrics = response.read().decode("utf-8")
+                assert f"tidy_tweet_pages_total {page_num}\n" in metrics
+                assert "tidy_tweet_loaded_bytes 10\n" in metrics
+                assert "tidy_tweet_current_file_info{file=" in metrics
+
+
+def test_loader_batching(tmp_path):
+    """
+    A Loader writing one page per batch and committing every page should produce
+    the same database as the default of one batch and commit per file, and can load
+    several files over one connection.
+    """
+    default_db = tmp_path / "default.db"
+    initialise_sqlite(default_db)
+    load_twarc_json_to_sqlite(timeline_json_file, default_db)
+
+    small_batch_db = tmp_path / "small_batch.db"
+    initialise_sqlite(small_batch_db)
+    with Loader(small_batch_db, batch_pages=1, commit_pages=1) as loader:
+        assert loader.load_file(timeline_json_file) == 3
+
+    assert _table_contents(small_batch_db) == _table_contents(default_db)
+
+    # Loading the same file twice is an error, and the second load is rolled back
+    with pytest.raises(PageParsingError):
+        with Loader(small_batch_db) as loader:
+            loader.load_file(timeline_json_file)
+
+    assert _table_contents(small_batch_db) == _table_contents(default_db)
+
+
+def test_file_ids(tmp_path):
+    """
+    Each file is recorded once in source_file, and referred to by its id.
+    """
+    db_path = tmp_path / "file_ids.db"
+    copied_file = tmp_path / "copy.jsonl"
+    copied_file.write_bytes(timeline_json_file.read_bytes())
+    initialise_sqlite(db_path)
+
+    with Loader(db_path) as loader:
+        # Ids given to files which are rolled back are reused
+        assert loader.file_id("discarded") == 1
+        loader.rollback()
+        loader.load_file(timeline_json_file)
+        loader.load_file(copied_file)
+        assert loader.file_id(str(copied_file)) == 2
+
+    with sqlite3.connect(db_path) as conn:
+        files = conn.execute("select * from source_file order by file_id").fetchall()
+        assert files == [(1, str(timeline_json_file)), (2, str(copied_file))]
+        assert conn.execute(
+            "select file_id, file_name, result_count from results_file"
+        ).fetchall() == [
+            (1, str(timeline_json_file), 218),
+            (2, str(copied_file), 218),
+        ]
+        for table in ["results_page", "tweet_by_page", "user_by_page"]:
+            assert conn.execute(
+                f"select distinct file_id from {table} order by file_id"
+            ).fetchall() == [(1,), (2,)]
+
+
+def test_materialised_views(tmp_path):
+    """
+    Materialised tweet and user tables should hold the same rows as the views.
+    """
+    views_db = tmp_path / "views.db"
+    initialise_sqlite(views_db)
+    load_twarc_json_to_sqlite(timeline_json_file, views_db)
+
+    materialised_db = tmp_path / "materialised.db"
+    initialise_sqlite(materialised_db, materialised=True)
+    load_twarc_json_to_sqlite(timeline_json_file, materialised_db)
+
+    for view in ["tweet", "user"]:
+        with sqlite3.connect(views_db) as conn:
+            from_view = conn.execute(f"select * from {view} order by id").fetchall()
+        with sqlite3.connect(materialised_db) as conn:
+            from_table = conn.execute(f"select * from {view} order by id").fetchall()
+        assert len(from_view) > 0
+        assert from_table == from_view
+
+
+def test_snapshots(tmp_path):
+    """
+    Storing snapshots gives the same tweet and user views with fewer rows, and
+    loading the same pages again only records the pages they were seen on.
+    """
+    from tidy_tweet.database import build_indexes
+
+    pages_db = tmp_path / "pages.db"
+    initialise_sqlite(pages_db)
+    load_twarc_json_to_sqlite(timeline_json_file, pages_db)
+
+    snapshots_db = tmp_path / "snapshots.db"
+    initialise_sqlite(snapshots_db, snapshots=True)
+    load_twarc_json_to_sqlite(timeline_json_file, snapshots_db)
+    build_indexes(snapshots_db)
+
+    for view in ["tweet", "user"]:
+        with sqlite3.connect(pages_db) as conn:
+            from_pages = conn.execute(f"select * from {view} order by id").fetchall()
+        with sqlite3.connect(snapshots_db) as conn:
+            query = f"select * from {view} order by id"
+            from_snapshots = conn.execute(query).fetchall()
+        assert len(from_pages) > 0
+        assert from_snapshots == from_pages
+
+    with sqlite3.connect(snapshots_db) as conn:
+        snapshot_rows = conn.execute("select count(*) from user_snapshot").fetchone()
+        assert snapshot_rows == (len(from_pages),)
+        assert conn.execute("select sum(page_count) from user_snapshot").fetchone() == (
+            110,
+        )
+
+    copied_file = tmp_path / "copy.jsonl"
+    copied_file.write_bytes(timeline_json_file.read_bytes())
+    load_twarc_json_to_sqlite(copied_file, snapshots_db)
+    with sqlite3.connect(snapshots_db) as conn:
+        assert conn.execute("select count(*) from user_snapshot").fetchone() == (
+            snapshot_rows
+        )
+        seen_again = conn.execute(
+            "select count(*) from tweet_snapshot where last_file_id = 2"
+        ).fetchone()
+        assert seen_again == conn.execute("select count(*) from tweet").fetchone()
+
+    # A changed tweet is a new version, which is the most recently retrieved
+    with open(timeline_json_file, "r", encoding="utf-8") as fh:
+        page = json.loads(fh.readline())
+    tweet_id = page["data"][0]["id"]
+    page["data"][0]["public_metrics"]["like_count"] += 1
+    page["__twarc"]["retrieved_at"] = "2030-01-01T00:00:00+00:00"
+    with Loader(snapshots_db) as loader:
+        loader.add_page("changed", 1, page)
+    with sqlite3.connect(snapshots_db) as conn:
+        versions = conn.execute(
+            "select snapshot, like_count, page_count from tweet_snapshot "
+            "where id = ? order by snapshot",
+            (tweet_id,),
+        ).fetchall()
+        assert [(version[0], version[2]) for version in versions] == [(1, 2), (2, 1)]
+        assert versions[1][1] == versions[0][1] + 1
+        assert conn.execute(
+            "select like_count from tweet where id = ?", (tweet_id,)
+        ).fetchone() == (versions[1][1],)
+
+
+def test_snapshots_changed_back(tmp_path):
+    """
+    A tweet which changes and then changes back is stored as three versions, each
+    only recording the pages it was seen on.
+    """
+    with open(timeline_json_file, "r", encoding="utf-8") as fh:
+        page = json.loads(fh.readline())
+    tweet_id = page["data"][0]["id"]
+    like_count = page["data"][0]["public_metrics"]["like_count"]
+
+    db_path = tmp_path / "snapshots.db"
+    initialise_sqlite(db_path, snapshots=True)
+    with Loader(db_path) as loader:
+        for page_num, likes in enumerate([like_count, like_count + 1, like_count], 1):
+            page["data"][0]["public_metrics"]["like_count"] = likes
+            page["__twarc"]["retrieved_at"] = f"2030-01-0{page_num}T00:00:00+00:00"
+            loader.add_page("changes.jsonl", page_num, page)
+
+    with sqlite3.connect(db_path) as conn:
+        versions = conn.execute(
+            "select snapshot, like_count, source_page, last_page, page_count "
+            "from tweet_snapshot where id = ? order by snapshot",
+            (tweet_id,),
+        ).fetchall()
+        assert versions == [
+            (1, like_count, 1, 1, 1),
+            (2, like_count + 1, 2, 2, 1),
+            (3, like_count, 3, 3, 1),
+        ]
+        assert conn.execute(
+            "select like_count from tweet where id = ?", (tweet_id,)
+        ).fetchone() == (like_count,)
+
+
+def test_snapshots_out_of_order(tmp_path):
+    """
+    Loading later pages before earlier ones gives the same tweet and user views with
+    snapshots as without, as the latest version is the latest retrieved.
+    """
+    lines = timeline_json_file.read_text(encoding="utf-8").splitlines(keepends=True)
+    earlier_file = tmp_path / "earlier.jsonl"
+    earlier_file.write_text("".join(lines[: len(lines) // 2]), encoding="utf-8")
+    later_file = tmp_path / "later.jsonl"
+    later_file.write_text("".join(lines[len(lines) // 2 :]), encoding="utf-8")
+
+    dbs = {}
+    for snapshots in [False, True]:
+        dbs[snapshots] = tmp_path / f"snapshots_{snapshots}.db"
+        initialise_sqlite(dbs[snapshots], snapshots=snapshots)
+        load_twarc_json_to_sqlite(later_file, dbs[snapshots])
+        load_twarc_json_to_sqlite(earlier_file, dbs[snapshots])
+
+    for view in ["tweet", "user"]:
+        with sqlite3.connect(dbs[False]) as conn:
+            from_pages = conn.execute(f"select * from {view} order by id").fetchall()
+        with sqlite3.connect(dbs[True]) as conn:
+            query = f"select * from {view} order by id"
+            from_snapshots = conn.execute(query).fetchall()
+        assert len(from_pages) > 0
+        assert from_snapshots == from_pages
+
+    # Each version's first page is its earliest retrieved, from the earlier file
+    with sqlite3.connect(dbs[True]) as conn:
+        query = (
+            "select count(*) from user_snapshot "
+            "where file_id = 2 and last_file_id = 1"
+        )
+        assert conn.execute(query).fetchone()[0] > 0
+
+
+def test_iter_tidy_rows(tmp_path):
+    """
+    Rows yielded without a database should be the rows loaded into a database,
+    whether read from the file or given as already parsed pages.
+    """
+    db_path = tmp_path / "ObservatoryTeam.db"
+    initialise_sqlite(db_path)
+    load_twarc_json_to_sqlite(timeline_json_file, db_path)
+
+    from_file = {}
+    for table, rows in iter_tidy_rows(timeline_json_file):
+        from_file.setdefault(table, []).extend(rows)
+
+    # Writing the rows into a database ourselves gives the same tables
+    rows_db_path = tmp_path / "rows.db"
+    initialise_sqlite(rows_db_path)
+    with sqlite3.connect(rows_db_path) as conn:
+        for table, rows in from_file.items():
+            conn.executemany(sql_by_table[table]["insert"], rows)
+    rows_db_contents = _table_contents(rows_db_path)
+    db_contents = _table_contents(db_path)
+    for table in from_file:
+        assert rows_db_contents[table] == db_contents[table]
+
+    with open(timeline_json_file, "r", encoding="utf-8") as fh:
+        pages = [json.loads(line) for line in fh]
+    from_pages = {}
+    for table, rows in iter_tidy_rows(pages, file_name=str(timeline_json_file)):
+        from_pages.setdefault(table, []).extend(rows)
+    assert from_pages == from_file
+
+
+# commit_pages commits that often, however large the batches of pages written
+@pytest.mark.parametrize(
+    "loader_options", [{"commit_pages": 1, "batch_pages": 1}, {"commit_pages": 1}]
+)
+def test_resume(tmp_path, loader_options):
+    """
+    After a load fails part way through a file, resuming loads only the pages after
+    the last commit, giving the same result as loading the whole file.
+    """
+    with open(timeline_json_file, "rb") as fh:
+        lines = fh.readlines()
+
+    json_file = tmp_path / "timeline.jsonl"
+
+    expected_db = tmp_path / "expected.db"
+    initialise_sqlite(expected_db)
+    json_file.write_bytes(b"".join(lines))
+    load_twarc_json_to_sqlite(json_file, expected_db)
+
+    # The last page is cut off part way through being written
+    json_file.write_bytes(b"".join(lines[:2]) + lines[2][:1000])
+    db_path = tmp_path / "resumed.db"
+    initialise_sqlite(db_path)
+    with pytest.raises(PageParsingError):
+        with Loader(db_path, **loader_options) as loader:
+            loader.load_file(json_file)
+
+    with Loader(db_path) as loader:
+        assert loader.get_checkpoint(str(json_file)) == (2, len(lines[0] + lines[1]))
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("select count(*) from results_page").fetchone() == (2,)
+
+    json_file.write_bytes(b"".join(lines))
+    with Loader(db_path) as loader:
+        assert loader.load_file(json_file, resume=True) == 1
+        # Nothing left to load
+        assert loader.load_file(json_file, resume=True) == 0
+
+    assert _table_contents(db_path) == _table_contents(expected_db)
+
+
+def test_follow(tmp_path):
+    """
+    Following a file loads the pages written so far, continues from there when
+    followed again, and carries on through the file being rotated.
+    """
+    import threading
+
+    with open(timeline_json_file, "rb") as fh:
+        pages = fh.readlines()
+    stream_file = tmp_path / "stream.jsonl"
+    # The third page is only partly written
+    stream_file.write_bytes(b"".join(pages[:2]) + pages[2][:100])
+
+    db_path = tmp_path / "follow.db"
+    initialise_sqlite(db_path)
+    with Loader(db_path) as loader:
+        assert loader.follow_file(stream_file, 0.01, idle_timeout=0.1) == 2
+        assert loader.find_loaded_file(stream_file) is None
+
+    with open(stream_file, "ab") as fh:
+        fh.write(pages[2][100:])
+
+    def rotate():
+        stream_file.rename(tmp_path / "stream.1.jsonl")
+        stream_file.write_bytes(pages[0])
+
+    rotation = threading.Timer(0.2, rotate)
+    rotation.start()
+    with Loader(db_path) as loader:
+        assert loader.follow_file(stream_file, 0.01, idle_timeout=0.5) == 2
+        assert loader.get_checkpoint(str(stream_file)) == (4, len(pages[0]))
+    rotation.join()
+
+    expected_db = tmp_path / "expected.db"
+    initialise_sqlite(expected_db)
+    with Loader(expected_db) as loader:
+        for page_num, page in enumerate([*pages, pages[0]], start=1):
+            loader.add_page(str(stream_file), page_num, json.loads(page))
+    expected = _table_contents(expected_db)
+    actual = _table_contents(db_path)
+    del expected["load_checkpoint"], actual["load_checkpoint"]
+    assert actual == expected
+
+
+def test_load_compressed(tmp_path):
+    """
+    Compressed files load the same rows as the uncompressed file.
+    """
+    compressed_file = tmp_path / "ObservatoryTeam.jsonl.gz"
+    compressed_file.write_bytes(gzip.compress(timeline_json_file.read_bytes()))
+
+    expected_db = tmp_path / "expected.db"
+    initialise_sqlite(expected_db)
+    load_twarc_json_to_sqlite(timeline_json_file, expected_db)
+
+    db_path = tmp_path / "compressed.db"
+    initialise_sqlite(db_path)
+    load_twarc_json_to_sqlite(compressed_file, db_path)
+
+    with sqlite3.connect(expected_db) as expected, sqlite3.connect(db_path) as conn:
+        for table in ["tweet", "user", "tweet_hashtag", "media"]:
+            query = f"select * from {table}"
+            assert sorted(conn.execute(query), key=repr) == sorted(
+                expected.execute(query), key=repr
+            )
+
+
+@pytest.mark.parametrize(
+    "materialised, snapshots", [(False, False), (True, False), (False, True)]
+)
+def test_rollups(tmp_path, materialised, snapshots):
+    """
+    The rollup tables count each tweet once, however many times it is loaded.
+    """
+    db_path = tmp_path / "rollups.db"
+    initialise_sqlite(
+        db_path, materialised=materialised, snapshots=snapshots, rollups=True
+    )
+    load_twarc_json_to_sqlite(timeline_json_file, db_path)
+    copied_file = tmp_path / "copy.jsonl"
+    copied_file.write_bytes(timeline_json_file.read_bytes())
+    load_twarc_json_to_sqlite(copied_file, db_path)
+
+    day = "substr(created_at, 1, 10)"
+    for rollup, query in [
+        (
+            "select day, author_id, tweet_count from daily_author_count",
+            f"select {day}, author_id, count(*) from tweet group by 1, 2",
+        ),
+        (
+            "select day, lang, tweet_count from daily_lang_count",
+            f"select {day}, lang, count(*) from tweet group by 1, 2",
+        ),
+        (
+            "select day, hashtag_lower, tweet_count from daily_hashtag_count",
+            f"select {day}, hashtag_lower, count(distinct tweet_id) from tweet_hashtag "
+            "join tweet on tweet.id = tweet_id group by 1, 2",
+        ),
+        (
+            "select day, username_lower, tweet_count from daily_mention_count",
+            f"select {day}, lower(username), count(distinct tweet_id) "
+            "from tweet_mention join tweet on tweet.id = tweet_id group by 1, 2",
+        ),
+    ]:
+        with sqlite3.connect(db_path) as conn:
+            counts = conn.execute(rollup).fetchall()
+            assert len(counts) > 0
+            assert sorted(counts) == sorted(conn.execute(query).fetchall())
@@ -0,0 +1,120 @@
+from tidy_tweet import iter_tidy_rows
+from tidy_tweet.processing import PageParsingError
+from tidy_tweet.tweet_mapping import columns_by_table
+from pathlib import Path
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.dataset as ds  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+from tidy_tweet.parquet import (  # noqa: E402
+    ParquetLoader,
+    load_twarc_json_to_parquet,
+    arrow_schema,
+    _convert,
+)
+
+data_directory = Path(__file__).parent.resolve() / "data"
+
+timeline_json_file = data_directory / "ObservatoryTeam.jsonl"
+
+
+def _dataset_rows(directory):
+    """
+    Reads back every table of a dataset, as sorted lists of rows.
+    """
+    contents = {}
+    for table_directory in Path(directory).iterdir():
+        table = table_directory.name
+        rows = (
+            ds.dataset(table_directory, partitioning="hive")
+            .to_table(columns=columns_by_table[table])
+            .to_pylist()
+        )
+        contents[table] = sorted((tuple(row.values()) for row in rows), key=repr)
+    return contents
+
+
+def _expected_rows(json_file):
+    """
+    The rows iter_tidy_rows gives for a file, with values of the types stored in
+    Parquet.
+    """
+    expected = {}
+    for table, rows in iter_tidy_rows(json_file):
+        types = [field.type for field in arrow_schema(table)]
+        expected.setdefault(table, []).extend(
+            tuple(_convert(value, t) for value, t in zip(row, types)) for row in rows
+        )
+    return {table: sorted(rows, key=repr) for table, rows in expected.items()}
+
+
+@pytest.mark.parametrize(
+    "partition_by", [None, "source_file", "retrieved_month", "created_month"]
+)
+def test_load_timeline(tmp_path, partition_by):
+    directory = tmp_path / "dataset"
+    pages = load_twarc_json_to_parquet(
+        timeline_json_file, directory, partition_by=partition_by, row_group_size=50
+    )
+    assert pages == 3
+
+    assert _dataset_rows(directory) == _expected_rows(timeline_json_file)
+
+    parquet_files = list(directory.glob("**/*.parquet"))
+    for parquet_file in parquet_files:
+        metadata = pq.read_metadata(parquet_file)
+        for i in range(metadata.num_row_groups):
+            assert metadata.row_group(i).num_rows <= 50
+    if partition_by is not None:
+        assert all(
+            parquet_file.parent.name.startswith(partition_by + "=")
+            for parquet_file in parquet_files
+            if parquet_file.parent.name != "source_file"
+        )
+
+    if partition_by == "created_month":
+        months = ds.dataset(directory / "tweet_by_page", partitioning="hive").to_table(
+            columns=["created_at", "created_month"]
+        )
+        for created_at, month in zip(*months.to_pydict().values()):
+            assert created_at.startswith(month)
+
+
+def test_append(tmp_path):
+    """
+    Loading another file adds new Parquet files, leaving the existing files as they
+    were.
+    """
+    directory = tmp_path / "dataset"
+    copied_file = tmp_path / "copy.jsonl"
+    copied_file.write_bytes(timeline_json_file.read_bytes())
+
+    load_twarc_json_to_parquet(timeline_json_file, directory)
+    before = {path: path.stat().st_mtime_ns for path in directory.glob("**/*.parquet")}
+
+    load_twarc_json_to_parquet(copied_file, directory)
+    after = {path: path.stat().st_mtime_ns for path in directory.glob("**/*.parquet")}
+    assert len(after) == 2 * len(before)
+    assert all(after[path] == mtime for path, mtime in before.items())
+
+    results_pages = ds.dataset(directory / "results_page", partitioning="hive")
+    assert results_pages.count_rows() == 6
+
+
+def test_interrupted_load(tmp_path):
+    """
+    Nothing is added to the dataset from a file which fails part way through.
+    """
+    directory = tmp_path / "dataset"
+    lines = timeline_json_file.read_bytes().splitlines(keepends=True)
+    broken_file = tmp_path / "broken.jsonl"
+    broken_file.write_bytes(b"".join(lines[:2]) + lines[2][:1000])
+
+    with ParquetLoader(directory, row_group_size=1) as loader:
+        loader.load_file(timeline_json_file)
+        with pytest.raises(PageParsingError):
+            loader.load_file(broken_file)
+
+    assert _dataset_rows(directory) == _expected_rows(timeline_json_file)
+    assert not any(path.name.startswith(".") for path in directory.glob("**/*"))
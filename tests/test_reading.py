@@ -0,0 +1,241 @@
+from tidy_tweet.reading import (
+    get_json_decoder,
+    open_json_lines,
+    open_json_stream,
+    file_fingerprint,
+    detect_compression,
+    FollowedJsonLines,
+    JSON_DECODERS,
+)
+from pathlib import Path
+import bz2
+import gzip
+import json
+import lzma
+import pytest
+
+data_directory = Path(__file__).parent.resolve() / "data"
+
+timeline_json_file = data_directory / "ObservatoryTeam.jsonl"
+
+
+def _installed_decoders():
+    decoders = []
+    for name in JSON_DECODERS:
+        try:
+            get_json_decoder(name)
+        except ImportError:
+            continue
+        decoders.append(name)
+    return decoders
+
+
+@pytest.mark.parametrize("decoder_name", _installed_decoders())
+def test_decoders_match_stdlib(decoder_name):
+    decode = get_json_decoder(decoder_name)
+
+    with open(timeline_json_file, "r", encoding="utf-8") as fh:
+        expected = [json.loads(line) for line in fh]
+    with open_json_lines(timeline_json_file) as lines:
+        assert [decode(line) for line, _ in lines] == expected
+
+    # Values the fast decoders reject, but the standard library accepts
+    for document in [b'{"a": NaN}', b'"\\ud800"', b"1e400"]:
+        assert repr(decode(document)) == repr(json.loads(document))
+
+    with pytest.raises(json.JSONDecodeError):
+        decode(b"\n")
+
+
+def test_line_endings(tmp_path):
+    """
+    Lines are split at "\\r" and "\\r\\n" as well as "\\n", as in text mode.
+    """
+    json_file = tmp_path / "line_endings.jsonl"
+    json_file.write_bytes(b'{"a": 1}\r\n{"a": 2}\r{"a": 3}\n{"a": "\xc3\xa9"}')
+
+    decode = get_json_decoder()
+    with open_json_lines(json_file) as lines:
+        lines = list(lines)
+    assert [decode(line) for line, _ in lines] == [
+        {"a": 1},
+        {"a": 2},
+        {"a": 3},
+        {"a": "é"},
+    ]
+    # Offsets are of the end of each line in bytes
+    assert [offset for _, offset in lines] == [10, 19, 28, 39]
+
+    # Reading can start from the end of any line
+    with open_json_lines(json_file, start_offset=19) as lines:
+        assert [decode(line) for line, _ in lines] == [{"a": 3}, {"a": "é"}]
+
+    # Other encodings are read as text, without offsets
+    json_file.write_text('{"a": "é"}\n', encoding="utf-16")
+    with open_json_lines(json_file, "utf-16") as lines:
+        assert list(lines) == [('{"a": "é"}\n', None)]
+
+
+def _zstd_compress(data):
+    zstandard = pytest.importorskip("zstandard")
+    # Two frames, as written by pzstd or by appending to a file
+    middle = len(data) // 2
+    compressor = zstandard.ZstdCompressor()
+    return compressor.compress(data[:middle]) + compressor.compress(data[middle:])
+
+
+@pytest.mark.parametrize(
+    "compression, compress, extension",
+    [
+        ("gzip", gzip.compress, ".gz"),
+        ("bz2", bz2.compress, ".bz2"),
+        ("xz", lzma.compress, ".xz"),
+        ("zstd", _zstd_compress, ".zst"),
+    ],
+)
+def test_compressed_files(tmp_path, compression, compress, extension):
+    """
+    Compressed files are recognised whatever they are named, and read as if they
+    had been decompressed first.
+    """
+    data = timeline_json_file.read_bytes()
+    with open_json_lines(timeline_json_file) as lines:
+        expected = list(lines)
+
+    # Named without the extension, so recognised by the magic bytes
+    json_file = tmp_path / "timeline.jsonl"
+    json_file.write_bytes(compress(data))
+    assert detect_compression(json_file) == compression
+    with open_json_lines(json_file) as lines:
+        assert list(lines) == expected
+
+    # Starting part way through
+    start_offset = expected[0][1]
+    with open_json_lines(json_file, start_offset=start_offset) as lines:
+        assert list(lines) == expected[1:]
+
+    # Other encodings are decompressed then decoded as text
+    json_file.write_bytes(compress(data.decode("utf-8").encode("utf-16")))
+    with open_json_lines(json_file, "utf-16") as lines:
+        assert [json.loads(line) for line, _ in lines] == [
+            json.loads(line) for line, _ in expected
+        ]
+
+    # Too short for the magic bytes to be recognised, but named for the format
+    short_file = tmp_path / f"short.jsonl{extension}"
+    short_file.write_bytes(b"")
+    assert detect_compression(short_file) == compression
+
+
+def test_follow_json_lines(tmp_path):
+    """
+    Lines are given as they are completely written, and the file is read again from
+    the start once it is rotated.
+    """
+    json_file = tmp_path / "stream.jsonl"
+    json_file.write_bytes(b'{"a": 1}\n{"a": ')
+    lines = FollowedJsonLines(json_file, poll_interval=0.01)
+    followed = iter(lines)
+    assert next(followed) == (b'{"a": 1}\n', 9)
+    assert next(followed) is None
+
+    with open(json_file, "ab") as fh:
+        fh.write(b"2}\n")
+    assert next(followed) == (b'{"a": 2}\n', 18)
+    assert next(followed) is None
+
+    json_file.rename(tmp_path / "stream.1.jsonl")
+    json_file.write_bytes(b'{"a": 3}\n')
+    assert next(followed) == (b'{"a": 3}\n', 9)
+    assert lines.rotations == 1
+    followed.close()
+
+    # Stopping once nothing more is written
+    lines = FollowedJsonLines(json_file, start_offset=9, idle_timeout=0)
+    assert list(lines) == [None]
+
+    gzip_file = tmp_path / "stream.jsonl.gz"
+    gzip_file.write_bytes(gzip.compress(b'{"a": 1}\n'))
+    with pytest.raises(ValueError):
+        FollowedJsonLines(gzip_file)
+
+
+def test_follow_rotations(tmp_path):
+    """
+    Lines written to a file just before it is rotated are read before the new file,
+    and a file truncated and written past where it had been read is read again.
+    """
+    json_file = tmp_path / "stream.jsonl"
+    json_file.write_bytes(b'{"a": 1}\n')
+    lines = FollowedJsonLines(json_file, poll_interval=0.01)
+    followed = iter(lines)
+    assert next(followed) == (b'{"a": 1}\n', 9)
+    assert next(followed) is None
+
+    with open(json_file, "ab") as fh:
+        fh.write(b'{"a": 2}\n')
+    json_file.rename(tmp_path / "stream.1.jsonl")
+    json_file.write_bytes(b'{"b": 3}\n')
+    assert next(followed) == (b'{"a": 2}\n', 18)
+    assert next(followed) == (b'{"b": 3}\n', 9)
+    assert next(followed) is None
+    assert lines.rotations == 1
+
+    # copytruncate, with more written since than had been read
+    with open(json_file, "r+b") as fh:
+        fh.truncate(0)
+        fh.write(b'{"c": 4}\n{"c": 5}\n')
+    assert next(followed) == (b'{"c": 4}\n', 9)
+    assert next(followed) == (b'{"c": 5}\n', 18)
+    assert lines.rotations == 2
+    followed.close()
+
+
+def test_json_stream(tmp_path):
+    """
+    Streams are read in the same way as files, and are left open.
+    """
+    import io
+
+    stream = io.BytesIO(timeline_json_file.read_bytes())
+    with open_json_lines(timeline_json_file) as lines:
+        expected = [line for line, _ in lines]
+    with open_json_stream(stream, buffer_size=100) as lines:
+        assert list(lines) == [(line, None) for line in expected]
+    assert not stream.closed
+
+    stream = io.BytesIO('{"a": "é"}\n'.encode("latin-1"))
+    with open_json_stream(stream, "latin-1") as lines:
+        assert list(lines) == [('{"a": "é"}\n', None)]
+    assert not stream.closed
+
+
+def test_unknown_decoder():
+    with pytest.raises(ValueError):
+        get_json_decoder("simdjson")
+
+
+def test_file_fingerprint(tmp_path, monkeypatch):
+    import tidy_tweet.reading
+
+    # Read a few bytes at a time, so the test file is read in many chunks
+    monkeypatch.setattr(tidy_tweet.reading, "_FINGERPRINT_CHUNK_SIZE", 4)
+
+    original = tmp_path / "original.jsonl"
+    original.write_bytes(timeline_json_file.read_bytes())
+    moved = tmp_path / "moved" / "renamed.jsonl"
+    moved.parent.mkdir()
+    moved.write_bytes(original.read_bytes())
+    assert file_fingerprint(moved) == file_fingerprint(original)
+
+    # Appending changes the size, changing the last bytes changes the hash
+    with open(moved, "ab") as fh:
+        fh.write(b"\n")
+    assert file_fingerprint(moved) != file_fingerprint(original)
+    moved.write_bytes(original.read_bytes()[:-1] + b" ")
+    assert file_fingerprint(moved) != file_fingerprint(original)
+    # As does changing a byte anywhere else, without changing the size
+    contents = bytearray(original.read_bytes())
+    contents[len(contents) // 3] ^= 1
+    moved.write_bytes(bytes(contents))
+    assert file_fingerprint(moved) != file_fingerprint(original)
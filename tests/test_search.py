@@ -0,0 +1,97 @@
+from tidy_tweet import initialise_sqlite, load_twarc_json_to_sqlite, Loader
+from tidy_tweet.database import build_indexes
+from tidy_tweet.search import search_tweets, search_users
+from pathlib import Path
+import sqlite3
+import json
+import pytest
+
+timeline_json_file = Path(__file__).parent.resolve() / "data" / "ObservatoryTeam.jsonl"
+
+
+def _like(db_path, query):
+    with sqlite3.connect(db_path) as conn:
+        return {id for (id,) in conn.execute(query).fetchall()}
+
+
+@pytest.mark.parametrize("snapshots", [False, True])
+def test_search(tmp_path, snapshots):
+    """
+    Searching finds the same tweets and users as the like queries it replaces, and
+    the search indexes follow the most recently retrieved version of each user.
+    """
+    db_path = tmp_path / "search.db"
+    initialise_sqlite(db_path, snapshots=snapshots, full_text_search=True)
+    load_twarc_json_to_sqlite(timeline_json_file, db_path)
+    build_indexes(db_path)
+
+    found = search_tweets(db_path, "digital")
+    assert len(found) > 0
+    assert set(found) == _like(
+        db_path, "select id from tweet where text like '%digital%'"
+    )
+    assert search_tweets(db_path, "digital", limit=2) == found[:2]
+    # Hashtags and mentions are matched with their # and @
+    assert set(search_tweets(db_path, '"#digital"')) == _like(
+        db_path, "select id from tweet where text like '%#digital%'"
+    )
+    with sqlite3.connect(db_path) as conn:
+        assert set(search_users(conn, "research")) == _like(
+            db_path, "select id from user where description like '%research%'"
+        )
+
+    # A newer description replaces the old one as soon as it is committed
+    with open(timeline_json_file, "r", encoding="utf-8") as fh:
+        page = json.loads(fh.readline())
+    user = page["includes"]["users"][0]
+    user["description"] = "Now studying Ελληνικά and 日本語のテキスト"
+    page["__twarc"]["retrieved_at"] = "2030-01-01T00:00:00+00:00"
+    with Loader(db_path) as loader:
+        loader.add_page("changed", 1, page)
+        assert search_users(db_path, "ελληνικά") == []
+    assert search_users(db_path, "ελληνικά") == [user["id"]]
+    assert search_users(db_path, "のテキ") == [user["id"]]
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("select count(*) from user_search").fetchone() == (
+            conn.execute("select count(*) from user").fetchone()
+        )
+
+
+def test_add_search_index(tmp_path):
+    """
+    The search indexes can be added to a database which was created without them.
+    """
+    db_path = tmp_path / "search.db"
+    initialise_sqlite(db_path)
+    load_twarc_json_to_sqlite(timeline_json_file, db_path)
+    build_indexes(db_path)
+    with pytest.raises(sqlite3.OperationalError):
+        search_tweets(db_path, "digital")
+
+    build_indexes(db_path, full_text_search=True)
+    assert len(search_tweets(db_path, "digital")) > 0
+
+
+@pytest.mark.parametrize("loader_options", [{}, {"commit_pages": 1}])
+def test_search_follows_loads(tmp_path, loader_options):
+    """
+    Files loaded through a Loader are searchable once committed, without building
+    the indexes again.
+    """
+    db_path = tmp_path / "search.db"
+    initialise_sqlite(db_path, full_text_search=True)
+    load_twarc_json_to_sqlite(timeline_json_file, db_path)
+    assert search_tweets(db_path, "kookaburra") == []
+
+    with open(timeline_json_file, "r", encoding="utf-8") as fh:
+        page = json.loads(fh.readline())
+    tweet = page["data"][0]
+    tweet["id"] = "1"
+    tweet["text"] = "A kookaburra laughing in the gum tree"
+    second_file = tmp_path / "second.jsonl"
+    second_file.write_text(json.dumps(page) + "\n", encoding="utf-8")
+
+    with Loader(db_path, **loader_options) as loader:
+        loader.load_file(second_file)
+    assert search_tweets(db_path, "kookaburra") == ["1"]
+    assert search_tweets(db_path, '"gum tree"') == ["1"]
@@ -0,0 +1,141 @@
+from tidy_tweet import initialise_sqlite, load_twarc_json_to_sqlite, Loader
+from tidy_tweet.shards import ShardedSQLiteSink, connect, query, shard_paths
+from tidy_tweet.tweet_mapping import sql_by_table, sql_views
+from tidy_tweet.__main__ import cli
+from click.testing import CliRunner
+from pathlib import Path
+import sqlite3
+import pytest
+
+data_directory = Path(__file__).parent.resolve() / "data"
+
+timeline_json_file = data_directory / "ObservatoryTeam.jsonl"
+
+
+def _contents(connection, names):
+    contents = {}
+    for name in names:
+        rows = connection.execute(f"select * from {name}")
+        columns = [description[0] for description in rows.description]
+        keep = [
+            i
+            for i, column in enumerate(columns)
+            if column not in ["inserted_at", "updated_at", "loaded_at"]
+        ]
+        contents[name] = sorted(
+            (tuple(row[i] for i in keep) for row in rows.fetchall()), key=repr
+        )
+    return contents
+
+
+@pytest.mark.parametrize("shard_by", ["retrieved_month", "created_year"])
+def test_load_matches_unsharded(tmp_path, shard_by):
+    """
+    The views over all shards of a sharded database have the same contents as the
+    tables and views of an ordinary database.
+    """
+    sqlite_path = tmp_path / "timeline.db"
+    initialise_sqlite(sqlite_path)
+    with Loader(sqlite_path) as loader:
+        loader.load_file(timeline_json_file)
+
+    catalogue_path = tmp_path / "sharded.db"
+    with ShardedSQLiteSink(catalogue_path, shard_by) as sink:
+        sink.create_schema()
+    with Loader(ShardedSQLiteSink(catalogue_path), batch_pages=2) as loader:
+        assert loader.load_file(timeline_json_file) == 3
+        assert loader.find_loaded_file(timeline_json_file) == str(timeline_json_file)
+
+    expected_shards = {
+        "retrieved_month": ["2021-10"],
+        "created_year": ["2019", "2020", "2021"],
+    }
+    assert list(shard_paths(catalogue_path)) == expected_shards[shard_by]
+
+    names = [*sql_by_table, *sql_views]
+    with sqlite3.connect(sqlite_path) as conn:
+        expected = _contents(conn, names)
+    conn = connect(catalogue_path)
+    assert _contents(conn, names) == expected
+    conn.close()
+
+    with ShardedSQLiteSink(catalogue_path) as sink:
+        sink.check_version()
+        with pytest.raises(ValueError):
+            ShardedSQLiteSink(catalogue_path, "created_month")
+
+
+def test_connect_date_range(tmp_path):
+    catalogue_path = tmp_path / "sharded.db"
+    with ShardedSQLiteSink(catalogue_path, "created_year") as sink:
+        sink.create_schema()
+    with Loader(ShardedSQLiteSink(catalogue_path)) as loader:
+        loader.load_file(timeline_json_file)
+
+    conn = connect(catalogue_path, start="2020-03-01", end="2020-12-31")
+    attached = [name for _, name, _ in conn.execute("pragma database_list")]
+    assert attached == ["main", "temp", "shard_0"]
+    first, last = conn.execute(
+        "select min(created_at), max(created_at) from tweet"
+    ).fetchone()
+    assert first.startswith("2020") and last.startswith("2020")
+    conn.close()
+
+    # No shards in range
+    conn = connect(catalogue_path, start="2022")
+    assert conn.execute("select count(*) from tweet").fetchone() == (0,)
+    conn.close()
+
+
+def test_cli(tmp_path):
+    catalogue_path = tmp_path / "cli.db"
+
+    runner = CliRunner()
+    result = runner.invoke(
+        cli,
+        [
+            "--shard_by",
+            "created_month",
+            "--profile",
+            "bulk",
+            str(catalogue_path),
+            str(timeline_json_file),
+        ],
+    )
+    assert result.exit_code == 0
+    assert len(shard_paths(catalogue_path)) > 10
+
+    # Shards are recognised and indexed without --shard_by
+    result = runner.invoke(cli, [str(catalogue_path), str(timeline_json_file)])
+    assert result.exit_code == 0
+    assert "Skipped 1 files" in result.output
+    for path in shard_paths(catalogue_path).values():
+        with sqlite3.connect(path) as conn:
+            indexes = conn.execute(
+                "select count(*) from sqlite_master where type = 'index' "
+                "and name = 'tweet_by_page_created_at'"
+            ).fetchone()
+            assert indexes == (1,)
+
+    # More shards than can be attached at once
+    with pytest.raises(ValueError):
+        connect(catalogue_path)
+    result = runner.invoke(cli, ["network", str(catalogue_path), "-"])
+    assert result.exit_code == 2
+    assert "--start and --end" in result.output
+
+    # Which can still be queried one at a time
+    db_path = tmp_path / "unsharded.db"
+    initialise_sqlite(db_path)
+    load_twarc_json_to_sqlite(timeline_json_file, db_path)
+    with sqlite3.connect(db_path) as conn:
+        tweets = conn.execute("select id, text from tweet").fetchall()
+    assert sorted(query(catalogue_path, "select id, text from tweet")) == sorted(tweets)
+
+    # Or together, if few enough are in range
+    count = "select count(*) from tweet"
+    conn = connect(catalogue_path, start="2020-10", end="2020-12")
+    assert list(query(catalogue_path, count, start="2020-10", end="2020-12")) == [
+        conn.execute(count).fetchone()
+    ]
+    conn.close()